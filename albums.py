@@ -0,0 +1,93 @@
+"""Сборка альбомов (media group) из отдельных сообщений.
+
+Альбом Telegram доставляет как N отдельных апдейтов с общим media_group_id.
+AlbumCollector.collect() задерживает первое сообщение альбома, пока новые
+части приходят чаще, чем раз в ALBUM_DEBOUNCE секунд, и возвращает весь альбом
+целиком; для остальных частей возвращает None. Обработчик в итоге выполняется
+один раз на альбом: одна запись в FSM и один ответ.
+
+Собирает альбом AlbumMiddleware до планировщика (scheduler): пока идёт
+ожидание, первая часть не занимает слот UPDATE_WORKERS, а остальные части не
+стоят в очереди за слотом и успевают попасть в альбом. Обработчик получает
+части в аргументе album. О частях, пришедших уже после сборки, пользователю
+сообщается один раз на альбом.
+"""
+import asyncio
+import time
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+ALBUM_DEBOUNCE = 0.8     # сек тишины, после которых альбом считается полученным
+CLOSED_ALBUM_TTL = 30    # сек, в течение которых опоздавшие части альбома отбрасываются
+LATE_PART_TEXT = ("⚠️ Часть файлов альбома пришла после того, как он был принят, и не сохранена. "
+                  "Отправьте эти файлы ещё раз отдельным сообщением.")
+
+LATE = "late"  # collect(): часть пришла после сборки альбома, об этом ещё не сказано
+
+
+class AlbumCollector:
+    def __init__(self, debounce: float = ALBUM_DEBOUNCE):
+        self.debounce = debounce
+        self._albums = {}  # media_group_id -> [сообщения]
+        self._last = {}    # media_group_id -> время последней части
+        self._closed = {}  # media_group_id -> [время сборки, об опоздавших уже сказано]
+
+    async def collect(self, message) -> list | str | None:
+        key = message.media_group_id
+        if not key:
+            return [message]
+        now = time.monotonic()
+        closed = self._closed.get(key)
+        if closed is not None:
+            if now - closed[0] < CLOSED_ALBUM_TTL:
+                warned, closed[1] = closed[1], True
+                return None if warned else LATE
+            del self._closed[key]
+        album = self._albums.get(key)
+        self._last[key] = now
+        if album is not None:
+            album.append(message)
+            return None
+
+        album = self._albums[key] = [message]
+        while True:
+            await asyncio.sleep(self.debounce)
+            if time.monotonic() - self._last[key] >= self.debounce:
+                break
+        del self._albums[key]
+        del self._last[key]
+        self._close(key)
+        return sorted(album, key=lambda m: m.message_id)
+
+    def _close(self, key):
+        now = time.monotonic()
+        for old in [k for k, (t, _) in self._closed.items() if now - t >= CLOSED_ALBUM_TTL]:
+            del self._closed[old]
+        self._closed[key] = [now, False]
+
+
+albums = AlbumCollector()
+
+
+class AlbumMiddleware(BaseMiddleware):
+    """Outer-middleware апдейтов: пропускает альбом к обработчикам одним апдейтом."""
+
+    def __init__(self, collector: AlbumCollector = albums):
+        self.collector = collector
+
+    async def __call__(self, handler, event: Update, data: dict):
+        message = event.message
+        if message is None or not message.media_group_id:
+            return await handler(event, data)
+        album = await self.collector.collect(message)
+        if album is LATE:
+            try:
+                await message.answer(LATE_PART_TEXT)
+            except Exception:
+                pass
+            return None
+        if album is None:
+            return None
+        data["album"] = album
+        return await handler(event, data)
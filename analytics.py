@@ -0,0 +1,325 @@
+"""Аналитика по заявкам: выручка, средние цены, сроки выполнения, отказы.
+
+Заявки из памяти storage перекладываются в столбцы NumPy: целые массивы для
+номеров, цен и времени (секунды от эпохи, MISSING — значения нет) и
+категориальные коды для статуса, предмета, типа работы, вуза и исполнителя
+(предмет и вуз — по каноническому написанию из autocomplete).
+Агрегаты считаются группировкой через np.bincount по кодам, без циклов по
+словарям, поэтому отчёт по 100k+ заявок строится за доли секунды. Снимок
+собирается в потоке (run_blocking): в цикле событий берутся только ссылки на
+неизменяемые модели Order.
+
+Время в orders.json записано без часового пояса («ДД.ММ.ГГГГ ЧЧ:ММ») и так и
+хранится: дни считаются по этим значениям, без перевода в UTC. Выручка —
+сумма final_price оплаченных заявок по дню создания.
+
+    python analytics.py report --days 30
+    python analytics.py bench --count 100000
+"""
+import argparse
+import calendar
+import os
+import random
+import re
+import time
+from datetime import datetime, timezone
+from html import escape
+
+import autocomplete
+import storage
+from models import Order, OrderStatus as S, WorkType
+from optional_deps import require
+from scheduler import run_blocking
+
+ANALYTICS_DAYS = int(os.getenv("ANALYTICS_DAYS", "14"))  # дней в выручке по дням
+TOP = 10  # строк в таблицах по предметам и исполнителям
+MISSING = -1
+
+_PAID = (S.ACCEPTED, S.IN_WORK, S.SUBMITTED, S.APPROVED, S.REVISION, S.DONE)
+_DATE_RE = re.compile(r"(\d{2})\.(\d{2})\.(\d{4})")
+_TIME_RE = re.compile(r"(\d{2}):(\d{2})")
+_CATEGORIES = ("status", "subject", "work_type", "university", "executor")
+
+
+class Snapshot:
+    """Заявки по столбцам; labels[столбец] — значения категорий по их кодам."""
+    __slots__ = ("order_id", "price", "created", "submitted", "refusals",
+                 "status", "subject", "work_type", "university", "executor",
+                 "refused_executor", "labels")
+
+    def __len__(self):
+        return len(self.order_id)
+
+
+def _epoch(value, days: dict) -> int:
+    """«ДД.ММ.ГГГГ[ ЧЧ:ММ]» -> секунды; дни разбираются один раз (кэш days)."""
+    if not isinstance(value, str):
+        return MISSING
+    date = value[:10]
+    result = days.get(date)
+    if result is None:
+        result = MISSING
+        match = _DATE_RE.fullmatch(date)
+        if match:
+            day, month, year = match.groups()
+            try:
+                result = calendar.timegm(datetime(int(year), int(month), int(day)).timetuple())
+            except ValueError:
+                pass
+        days[date] = result
+    if result == MISSING or len(value) == 10:
+        return result
+    match = _TIME_RE.fullmatch(value, 11)
+    if match is None or value[10] != " ":
+        return MISSING
+    return result + int(match.group(1)) * 3600 + int(match.group(2)) * 60
+
+
+def _price(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return MISSING
+
+
+def build(orders: list) -> Snapshot:
+    """Столбцы по списку Order."""
+    np = require("numpy")
+    codes = {name: {} for name in _CATEGORIES}
+
+    def encode(name, values):
+        labels = codes[name]
+        return np.fromiter((labels.setdefault(v, len(labels)) for v in values), np.int32, len(orders))
+
+    dates = {}
+    snapshot = Snapshot()
+    snapshot.order_id = np.fromiter((o.order_id or 0 for o in orders), np.int64, len(orders))
+    snapshot.price = np.fromiter((_price(o.final_price) for o in orders), np.int64, len(orders))
+    snapshot.created = np.fromiter((_epoch(o.creation_date, dates) for o in orders), np.int64, len(orders))
+    snapshot.submitted = np.fromiter((_epoch(o.submitted_at, dates) for o in orders), np.int64, len(orders))
+    snapshot.status = encode("status", (o.status for o in orders))
+    snapshot.subject = encode("subject", (o.subject for o in orders))
+    snapshot.work_type = encode("work_type", (o.work_type for o in orders))
+    snapshot.university = encode("university", (o.university_name for o in orders))
+    snapshot.executor = encode("executor", (o.executor_id for o in orders))
+    refused = [o.extra.get('refused_executors') or () if o.extra else () for o in orders]
+    snapshot.refusals = np.fromiter(map(len, refused), np.int32, len(orders))
+    executors = codes["executor"]
+    snapshot.refused_executor = np.fromiter(
+        (executors.setdefault(i, len(executors)) for ids in refused for i in ids), np.int32)
+    snapshot.labels = {name: list(labels) for name, labels in codes.items()}
+    # «АПЭТ» и «апэт » — один вуз: коды сливаются по каноническому написанию
+    for name, field in (("subject", "subject"), ("university", "university_name")):
+        column, snapshot.labels[name] = _merge(np, getattr(snapshot, name), snapshot.labels[name], field)
+        setattr(snapshot, name, column)
+    return snapshot
+
+
+def _merge(np, column, labels: list, field: str) -> tuple:
+    merged = {}
+    remap = np.fromiter((merged.setdefault(autocomplete.canonical(field, label), len(merged)) for label in labels),
+                        np.int32, len(labels))
+    return remap[column], list(merged)
+
+
+async def take() -> Snapshot:
+    """Снимок текущих заявок; столбцы собираются в потоке."""
+    orders = [entry[2] for entry in storage.snapshot_index()]
+    autocomplete.vocabulary("university_name")  # словари строятся в цикле событий, не в потоке
+    return await run_blocking(build, orders)
+
+
+def _codes_of(snapshot: Snapshot, name: str, values) -> list:
+    labels = snapshot.labels[name]
+    return [i for i, label in enumerate(labels) if label in values]
+
+
+def _group_mean(np, codes, values, size):
+    counts = np.bincount(codes, minlength=size)
+    sums = np.bincount(codes, weights=values, minlength=size)
+    means = np.divide(sums, counts, out=np.zeros(size), where=counts > 0)
+    return means, counts
+
+
+def _top_codes(counts, limit=TOP) -> list:
+    """Коды самых частых категорий."""
+    return [int(i) for i in counts.argsort(kind="stable")[::-1][:limit] if counts[i]]
+
+
+def _top(labels, means, counts) -> list:
+    return [(labels[i], float(means[i]), int(counts[i])) for i in _top_codes(counts)]
+
+
+def compute(snapshot: Snapshot, days: int = ANALYTICS_DAYS, now: float | None = None) -> dict:
+    np = require("numpy")
+    labels = snapshot.labels
+    paid = np.isin(snapshot.status, _codes_of(snapshot, "status", _PAID))
+    priced = paid & (snapshot.price >= 0)
+    result = {
+        "total": len(snapshot),
+        "paid": int(paid.sum()),
+        "revenue": int(snapshot.price[priced].sum()),
+    }
+
+    # Выручка по дням за последние days дней (по локальному времени заявок)
+    if now is None:
+        now = calendar.timegm(time.localtime())
+    today = int(now) // 86400
+    day = snapshot.created // 86400
+    recent = priced & (snapshot.created >= 0) & (day > today - days) & (day <= today)
+    offset = (day[recent] - (today - days + 1)).astype(np.int64)
+    revenue = np.bincount(offset, weights=snapshot.price[recent], minlength=days)
+    orders_per_day = np.bincount(offset, minlength=days)
+    result["revenue_by_day"] = [
+        (datetime.fromtimestamp((today - days + 1 + i) * 86400, timezone.utc).strftime("%d.%m.%Y"),
+         int(revenue[i]), int(orders_per_day[i]))
+        for i in range(days)
+    ]
+
+    # Средняя цена по предмету, типу работы и их паре
+    prices = snapshot.price[priced].astype(np.float64)
+    for name in ("subject", "work_type", "university"):
+        means, counts = _group_mean(np, getattr(snapshot, name)[priced], prices, len(labels[name]))
+        result[f"price_by_{name}"] = _top(labels[name], means, counts)
+    width = len(labels["work_type"])
+    pair = snapshot.subject[priced].astype(np.int64) * width + snapshot.work_type[priced]
+    means, counts = _group_mean(np, pair, prices, len(labels["subject"]) * width)
+    result["price_by_pair"] = [
+        ((labels["subject"][code // width], labels["work_type"][code % width]), mean, count)
+        for code, mean, count in _top(range(len(means)), means, counts)
+    ]
+
+    # Срок выполнения в днях: от дня создания заявки до дня отправки работы
+    # (submitted_at записывается без времени)
+    created_day = snapshot.created // 86400
+    submitted_day = snapshot.submitted // 86400
+    done = (snapshot.created >= 0) & (snapshot.submitted >= 0) & (submitted_day >= created_day)
+    turnaround = (submitted_day[done] - created_day[done]).astype(np.float64)
+    result["turnaround"] = {
+        "count": int(done.sum()),
+        "mean": float(turnaround.mean()) if turnaround.size else None,
+        "median": float(np.median(turnaround)) if turnaround.size else None,
+    }
+    size = len(labels["executor"])
+    no_executor = labels["executor"].index(None) if None in labels["executor"] else None
+    means, counts = _group_mean(np, snapshot.executor[done], turnaround, size)
+    if no_executor is not None:
+        counts[no_executor] = 0
+    result["turnaround_by_executor"] = _top(labels["executor"], means, counts)
+
+    # Отказы: сколько заказов исполнитель вернул из всех, что ему достались
+    refusals = np.bincount(snapshot.refused_executor, minlength=size)
+    taken = refusals + np.bincount(snapshot.executor, minlength=size)
+    if no_executor is not None:
+        taken[no_executor] = 0
+    rates = np.divide(refusals, taken, out=np.zeros(size), where=taken > 0)
+    result["refusal_by_executor"] = [
+        (labels["executor"][i], float(rates[i]), int(refusals[i])) for i in _top_codes(taken)
+    ]
+    result["refused_orders"] = int((snapshot.refusals > 0).sum())
+    return result
+
+
+def _label(value) -> str:
+    if value is None:
+        return "Не указан"
+    if isinstance(value, WorkType):
+        return "Другое" if value is WorkType.OTHER else value.title
+    return str(value)
+
+
+def render(result: dict, executor_names: dict | None = None, html: bool = True) -> str:
+    """Текст отчёта для /analytics (html=True) или для консоли."""
+    names = executor_names or {}
+    bold = (lambda s: f"<b>{s}</b>") if html else (lambda s: s)
+    # предметы, вузы и имена вводятся пользователями — в HTML их нужно экранировать
+    label = (lambda value: escape(_label(value))) if html else _label
+
+    def executor(value):
+        return label(names.get(value) or value)
+
+    lines = [
+        bold("📈 Аналитика"),
+        f"Заявок: {result['total']}, оплачено: {result['paid']}",
+        f"Выручка: {result['revenue']} ₽",
+        f"Заявок с отказом исполнителя: {result['refused_orders']}",
+        "",
+        bold(f"Выручка по дням ({len(result['revenue_by_day'])} дн.)"),
+    ]
+    lines += [f"{day}: {revenue} ₽ ({count})" for day, revenue, count in result["revenue_by_day"] if count]
+    for key, title in (("price_by_subject", "Средняя цена по предметам"),
+                       ("price_by_work_type", "Средняя цена по типам работ"),
+                       ("price_by_university", "Средняя цена по вузам")):
+        lines += ["", bold(title)]
+        lines += [f"{label(value)}: {mean:.0f} ₽ ({count})" for value, mean, count in result[key]]
+    lines += ["", bold("Средняя цена: предмет и тип работы")]
+    lines += [f"{label(s)} / {label(w)}: {mean:.0f} ₽ ({count})" for (s, w), mean, count in result["price_by_pair"]]
+    turnaround = result["turnaround"]
+    lines += ["", bold("Срок выполнения")]
+    if turnaround["count"]:
+        lines.append(f"Среднее {turnaround['mean']:.1f} дн., медиана {turnaround['median']:.1f} дн. ({turnaround['count']})")
+    lines += [f"{executor(value)}: {mean:.1f} дн. ({count})" for value, mean, count in result["turnaround_by_executor"]]
+    lines += ["", bold("Доля отказов исполнителей")]
+    lines += [f"{executor(value)}: {rate:.0%} ({refusals})" for value, rate, refusals in result["refusal_by_executor"]]
+    return "\n".join(lines)
+
+
+def executor_names() -> dict:
+    return {ex['id']: ex.get('name') for ex in storage.get_executors_list()}
+
+
+# --- CLI ---
+
+def _sample_orders(count: int) -> list:
+    rnd = random.Random(1)
+    statuses = list(S)
+    subjects = ["Математический анализ", "История России", "Философия", "Программирование", "Физика"]
+    universities = ["АПЭТ", "МГУ", "СПбГУ", "НГУ"]
+    orders = []
+    for i in range(count):
+        created = datetime(2025, 1, 1).timestamp() + rnd.randrange(180 * 86400)
+        d = {
+            "order_id": i + 1,
+            "status": rnd.choice(statuses).value,
+            "subject": rnd.choice(subjects),
+            "work_type": rnd.choice(list(WorkType)).value,
+            "university_name": rnd.choice(universities),
+            "creation_date": datetime.fromtimestamp(created).strftime("%d.%m.%Y %H:%M"),
+            "final_price": rnd.randrange(1000, 20000, 500),
+            "executor_id": rnd.randrange(100, 150),
+        }
+        if rnd.random() < 0.5:
+            d["submitted_at"] = datetime.fromtimestamp(created + rnd.randrange(14 * 86400)).strftime("%d.%m.%Y")
+        if rnd.random() < 0.1:
+            d["refused_executors"] = [rnd.randrange(100, 150)]
+        orders.append(Order.from_dict(d))
+    return orders
+
+
+def bench(count: int):
+    orders = _sample_orders(count)
+    start = time.perf_counter()
+    snapshot = build(orders)
+    built = time.perf_counter()
+    compute(snapshot, now=datetime(2025, 7, 1).timestamp())
+    done = time.perf_counter()
+    print(f"{count} заявок: столбцы {(built - start) * 1000:.0f} мс, агрегаты {(done - built) * 1000:.1f} мс")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Аналитика по заявкам")
+    sub = parser.add_subparsers(dest="command", required=True)
+    report_cmd = sub.add_parser("report", help="отчёт по orders.json")
+    report_cmd.add_argument("--days", type=int, default=ANALYTICS_DAYS)
+    bench_cmd = sub.add_parser("bench", help="замер на синтетических заявках")
+    bench_cmd.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args(argv)
+    if args.command == "report":
+        snapshot = build([entry[2] for entry in storage.snapshot_index()])
+        print(render(compute(snapshot, args.days), executor_names(), html=False))
+    elif args.command == "bench":
+        bench(args.count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Автоматическое назначение исполнителя на новую заявку.
+
+Режим включается переменной AUTO_ASSIGN=1 или кнопкой в настройках админа.
+Исполнитель выбирается плавным взвешенным round-robin (как в nginx) среди
+подходящих: у исполнителя свободна ёмкость и заявка подходит под его подписки
+(subscriptions.matches). В executors.json у исполнителя можно задать:
+
+    {"id": 123, "name": "...", "weight": 2, "capacity": 5}
+
+weight — доля заявок (по умолчанию 1), capacity — сколько заказов одновременно
+(DEFAULT_CAPACITY).
+
+Число заказов на исполнителе (от предложения до сдачи, отказа или отмены)
+хранится в памяти и обновляется на переходах заявок, поэтому выбор не
+просматривает orders.json: работа пропорциональна только числу исполнителей.
+"""
+import os
+
+import storage
+import subscriptions
+from models import Order, OrderStatus as S
+from transitions import Event, add_transition_listener
+
+AUTO_ASSIGN = os.getenv("AUTO_ASSIGN", "0") == "1"
+DEFAULT_CAPACITY = int(os.getenv("AUTO_ASSIGN_CAPACITY", "3"))
+
+_HELD = (S.WAITING_CONFIRMATION, S.EXECUTOR_FOUND, S.WAITING_PAYMENT, S.ACCEPTED,
+         S.IN_WORK, S.SUBMITTED, S.APPROVED, S.REVISION)
+# все переходы, после которых у заявки больше нет исполнителя (или она закрыта);
+# у заявки в раунде предложений executor_id нет, OFFER_ROUND_CANCEL — для порядка
+_RELEASE_EVENTS = (Event.OFFER_UNDELIVERED, Event.OFFER_EXPIRED, Event.EXECUTOR_REFUSE,
+                   Event.ADMIN_REJECT_OFFER, Event.OFFER_ROUND_CANCEL, Event.CLIENT_ACCEPT,
+                   Event.CLIENT_CANCEL)
+
+_enabled = AUTO_ASSIGN
+_inflight = None  # executor_id -> {order_id}
+_current = {}     # executor_id -> текущий вес round-robin
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(value: bool):
+    global _enabled
+    _enabled = value
+
+
+def _ensure_inflight():
+    global _inflight
+    if _inflight is not None:
+        return
+    _inflight = {}
+    for order in map(Order.from_dict, storage.get_all_orders()):
+        if order.executor_id and order.status in _HELD:
+            _inflight.setdefault(int(order.executor_id), set()).add(order.order_id)
+
+
+def inflight(executor_id) -> int:
+    _ensure_inflight()
+    return len(_inflight.get(int(executor_id), ()))
+
+
+@add_transition_listener
+def _on_transition(event: Event, old: Order, new: Order | None):
+    if _inflight is None:
+        return  # посчитается по заявкам при первом выборе
+    if event in (Event.OFFER_TO_EXECUTOR, Event.OFFER_ROUND_CLOSE) and new is not None and new.executor_id:
+        _inflight.setdefault(int(new.executor_id), set()).add(new.order_id)
+    elif event in _RELEASE_EVENTS and old.executor_id:
+        _inflight.get(int(old.executor_id), set()).discard(old.order_id)
+
+
+def is_eligible(executor: dict, order: Order) -> bool:
+    if inflight(executor['id']) >= executor.get('capacity', DEFAULT_CAPACITY):
+        return False
+    return subscriptions.matches(executor, order.subject, order.work_type)
+
+
+def pick(order: Order, executors: list, exclude=()) -> int | None:
+    """Следующий исполнитель по взвешенному round-robin среди подходящих (id или None)."""
+    candidates = [ex for ex in executors if ex['id'] not in exclude and is_eligible(ex, order)]
+    if not candidates:
+        return None
+    total = 0
+    best = None
+    for ex in candidates:
+        weight = ex.get('weight', 1)
+        total += weight
+        _current[ex['id']] = _current.get(ex['id'], 0) + weight
+        if best is None or _current[ex['id']] > _current[best]:
+            best = ex['id']
+    _current[best] -= total
+    # место занято сразу, чтобы параллельные заявки не превысили ёмкость
+    _inflight.setdefault(int(best), set()).add(order.order_id)
+    return best
+
+
+def release(executor_id, order_id):
+    """Освобождает место, если предложение так и не было сделано."""
+    _ensure_inflight()
+    _inflight.get(int(executor_id), set()).discard(order_id)
@@ -0,0 +1,161 @@
+"""Подсказки для полей анкеты, которые вводятся вручную.
+
+Группа, вуз, преподаватель и предмет «Другое» пишутся свободным текстом, и
+одно и то же значение расходится на варианты: «АПЭТ», «апэт », «Апэт».
+Для каждого поля ведётся словарь значений: ключ — нормализованная строка
+(регистр, ё/е, лишние пробелы), у ключа есть целый id, число заявок и
+самое частое написание — оно и считается каноническим.
+
+По ключам строится префиксное дерево; в каждом узле хранится TOP_SUGGESTIONS
+самых частых значений с этим префиксом, поэтому подсказка — проход по
+буквам введённого текста без перебора словаря. Словарь собирается по
+заявкам из памяти storage при первом обращении и пополняется при
+подтверждении заявки (add_order). По каноническому написанию группируются
+заявки в аналитике.
+
+id живут только в памяти процесса: после перезапуска словарь собирается
+заново и id сдвигаются. Поэтому в заявке хранится каноническое написание, а
+не id, а id из callback_data кнопки подсказки принимается (choose), только
+если значение начинается с текста, который пользователь ввёл перед подсказкой.
+"""
+import re
+import sys
+from collections import Counter
+
+import storage
+
+FIELDS = ("group_name", "university_name", "teacher_name", "subject")
+TOP_SUGGESTIONS = 5
+MIN_PREFIX = 2  # подсказки — после стольких введённых символов
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def normalize(value: str) -> str:
+    return _SPACES_RE.sub(" ", value.strip().casefold().replace("ё", "е"))
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children = {}
+        self.top = []  # id самых частых значений с этим префиксом
+
+
+class Vocabulary:
+    """Значения одного поля: ключ -> id, id -> число заявок и написания."""
+    __slots__ = ("ids", "keys", "counts", "spellings", "root")
+
+    def __init__(self):
+        self.ids = {}
+        self.keys = []
+        self.counts = []
+        self.spellings = []
+        self.root = _Node()
+
+    def add(self, value: str, count: int = 1) -> int | None:
+        key = normalize(value)
+        if not key:
+            return None
+        value_id = self.ids.get(key)
+        if value_id is None:
+            value_id = self.ids[key] = len(self.keys)
+            self.keys.append(sys.intern(key))
+            self.counts.append(0)
+            self.spellings.append(Counter())
+        self.counts[value_id] += count
+        self.spellings[value_id][_SPACES_RE.sub(" ", value.strip())] += count
+        self._promote(value_id)
+        return value_id
+
+    def _promote(self, value_id: int):
+        # счётчик только растёт, поэтому в top узла значение может только подняться
+        node = self.root
+        counts = self.counts
+        for ch in self.keys[value_id]:
+            node = node.children.setdefault(ch, _Node())
+            top = node.top
+            if value_id not in top:
+                if len(top) >= TOP_SUGGESTIONS and counts[top[-1]] >= counts[value_id]:
+                    continue
+                top.append(value_id)
+            top.sort(key=lambda i: -counts[i])
+            del top[TOP_SUGGESTIONS:]
+
+    def value(self, value_id: int) -> str | None:
+        if 0 <= value_id < len(self.keys):
+            return sys.intern(self.spellings[value_id].most_common(1)[0][0])
+        return None
+
+    def find(self, value: str) -> int | None:
+        return self.ids.get(normalize(value))
+
+    def complete(self, prefix: str) -> list:
+        node = self.root
+        for ch in normalize(prefix):
+            node = node.children.get(ch)
+            if node is None:
+                return []
+        return list(node.top)
+
+
+_vocabularies = None  # поле -> Vocabulary
+
+
+def _ensure():
+    global _vocabularies
+    if _vocabularies is not None:
+        return
+    counts = {field: Counter() for field in FIELDS}
+    for _, _, order in storage.snapshot_index():
+        for field in FIELDS:
+            value = getattr(order, field)
+            if isinstance(value, str):
+                counts[field][value] += 1
+    vocabularies = {field: Vocabulary() for field in FIELDS}
+    for field, values in counts.items():
+        for value, count in values.items():
+            vocabularies[field].add(value, count)
+    _vocabularies = vocabularies
+
+
+def vocabulary(field: str) -> Vocabulary:
+    _ensure()
+    return _vocabularies[field]
+
+
+def canonical(field: str, value):
+    """Каноническое написание известного значения, иначе значение без лишних пробелов."""
+    if not isinstance(value, str):
+        return value
+    vocab = vocabulary(field)
+    value_id = vocab.find(value)
+    return vocab.value(value_id) if value_id is not None else _SPACES_RE.sub(" ", value.strip())
+
+
+def suggest(field: str, prefix: str) -> list:
+    """[(id, значение)] для кнопок; пусто, если текст короткий или совпал со значением целиком."""
+    vocab = vocabulary(field)
+    if len(normalize(prefix)) < MIN_PREFIX or vocab.find(prefix) is not None:
+        return []
+    return [(value_id, vocab.value(value_id)) for value_id in vocab.complete(prefix)]
+
+
+def choose(field: str, value_id: int, typed: str | None) -> str | None:
+    """Значение по id из кнопки подсказки; None, если оно не продолжает typed
+    (кнопка осталась от прошлого запуска, и id указывает на другое значение)."""
+    if not typed:
+        return None
+    vocab = vocabulary(field)
+    if not 0 <= value_id < len(vocab.keys) or not vocab.keys[value_id].startswith(normalize(typed)):
+        return None
+    return vocab.value(value_id)
+
+
+def add_order(data: dict):
+    """Пополняет словари значениями подтверждённой заявки."""
+    for field in FIELDS:
+        value = data.get(field)
+        if isinstance(value, str):
+            vocabulary(field).add(value)
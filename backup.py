@@ -0,0 +1,221 @@
+"""Резервные копии заявок на лету.
+
+Копировать orders.json целиком во время работы бота — значит читать файл,
+который в этот момент может перезаписываться. Здесь копии снимаются с заявок в
+памяти (storage.snapshot_index): в цикле событий берутся только ссылки на
+неизменяемые модели Order, а сериализация, сжатие и запись идут в потоке через
+run_blocking, так что запись заявок не ждёт резервного копирования.
+
+Если задан BACKUP_DIR, бот раз в BACKUP_INTERVAL секунд пишет туда:
+
+    full-20250701-120000-000000.json.gz    полная копия всех заявок
+    delta-20250701-121500-000000.json.gz   только заявки, изменённые с прошлой копии
+
+Изменённые заявки собираются подпиской на storage, поэтому инкремент не
+сравнивает весь список. Полная копия снимается при запуске и после каждых
+BACKUP_FULL_EVERY инкрементов; хранятся последние BACKUP_KEEP полных копий
+вместе с их инкрементами.
+
+Восстановление на момент времени (по умолчанию — на последнюю копию):
+
+    python backup.py snapshot
+    python backup.py list
+    python backup.py restore --at "01.07.2025 12:30" --output orders.json
+"""
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import time
+from datetime import datetime
+
+import storage
+from scheduler import run_blocking
+
+BACKUP_DIR = os.getenv("BACKUP_DIR")
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", "900"))  # сек
+BACKUP_FULL_EVERY = int(os.getenv("BACKUP_FULL_EVERY", "96"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+COMPRESS_LEVEL = 6
+STAMP_FORMAT = "%Y%m%d-%H%M%S-%f"
+
+_dirty = {}  # order_id -> Order (None — заявка удалена) с прошлой копии
+_deltas_since_full = 0
+_task = None
+
+
+def _on_orders_changed(changes):
+    for change in changes:
+        _dirty[change.order_id] = change.new
+
+
+def _encode(kind: str, created: datetime, orders: list, deleted: list) -> bytes:
+    if kind == "full":
+        orders = [entry[2] for entry in orders]
+    payload = {
+        "kind": kind,
+        "created": created.isoformat(),
+        "orders": [order.to_dict() for order in orders],
+        "deleted": deleted,
+    }
+    return gzip.compress(storage.get_serializer().dumps(payload), COMPRESS_LEVEL)
+
+
+def _write(directory: str, kind: str, created: datetime, data: bytes) -> str:
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{kind}-{created.strftime(STAMP_FORMAT)}.json.gz")
+    storage.write_bytes(path, data)
+    return path
+
+
+def _take(full: bool):
+    """Снимок в цикле событий: только ссылки, без сериализации."""
+    global _dirty
+    start = time.perf_counter()
+    created = datetime.now()
+    if full:
+        orders, deleted = storage.snapshot_index(), []
+        _dirty = {}
+    else:
+        changed, _dirty = _dirty, {}
+        orders = [order for order in changed.values() if order is not None]
+        deleted = [order_id for order_id, order in changed.items() if order is None]
+    return created, orders, deleted, time.perf_counter() - start
+
+
+def _save(directory: str, kind: str, created: datetime, orders: list, deleted: list) -> str:
+    path = _write(directory, kind, created, _encode(kind, created, orders, deleted))
+    if kind == "full":
+        apply_retention(directory)
+    return path
+
+
+async def snapshot(full: bool = False) -> str | None:
+    """Снимает полную копию или инкремент (если есть изменения); возвращает путь файла."""
+    global _deltas_since_full
+    full = full or _deltas_since_full >= BACKUP_FULL_EVERY
+    if not full and not _dirty:
+        return None
+    kind = "full" if full else "delta"
+    created, orders, deleted, pause = _take(full)
+    try:
+        path = await run_blocking(_save, BACKUP_DIR, kind, created, orders, deleted)
+    except Exception:
+        # изменения уже забраны из _dirty — цепочку инкрементов начинаем заново
+        _deltas_since_full = BACKUP_FULL_EVERY
+        raise
+    _deltas_since_full = 0 if full else _deltas_since_full + 1
+    logging.info("Резервная копия %s: %d заявок, пауза %.2f мс", path, len(orders), pause * 1000)
+    return path
+
+
+def list_backups(directory: str) -> list:
+    """Файлы копий по времени создания: [(время, вид, путь)]."""
+    result = []
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return result
+    for name in names:
+        kind, _, rest = name.partition("-")
+        if kind not in ("full", "delta") or not rest.endswith(".json.gz"):
+            continue
+        try:
+            created = datetime.strptime(rest[:-len(".json.gz")], STAMP_FORMAT)
+        except ValueError:
+            continue
+        result.append((created, kind, os.path.join(directory, name)))
+    result.sort()
+    return result
+
+
+def apply_retention(directory: str, keep: int = BACKUP_KEEP):
+    """Удаляет всё, что старше keep-й с конца полной копии."""
+    backups = list_backups(directory)
+    fulls = [created for created, kind, _ in backups if kind == "full"]
+    if len(fulls) <= keep:
+        return
+    cutoff = fulls[-keep]
+    for created, _, path in backups:
+        if created < cutoff:
+            os.unlink(path)
+
+
+def _load(path: str) -> dict:
+    with open(path, "rb") as f:
+        return storage.get_serializer().loads(gzip.decompress(f.read()))
+
+
+def restore(directory: str, at: datetime | None = None) -> list:
+    """Собирает заявки на момент at: последняя полная копия до него плюс её инкременты."""
+    backups = [b for b in list_backups(directory) if at is None or b[0] <= at]
+    base = max((i for i, b in enumerate(backups) if b[1] == "full"), default=None)
+    if base is None:
+        raise ValueError("Нет полной копии на этот момент")
+    orders = {}
+    for _, _, path in backups[base:]:
+        payload = _load(path)
+        for order in payload["orders"]:
+            orders[order.get("order_id")] = order
+        for order_id in payload["deleted"]:
+            orders.pop(order_id, None)
+    return sorted(orders.values(), key=lambda o: o.get("order_id") or 0)
+
+
+async def _run():
+    while True:
+        await asyncio.sleep(BACKUP_INTERVAL)
+        try:
+            await snapshot()
+        except Exception:
+            logging.exception("Не удалось сохранить резервную копию заявок")
+
+
+async def start() -> bool:
+    """Снимает полную копию и запускает периодическое копирование."""
+    global _task
+    if not BACKUP_DIR or _task is not None:
+        return False
+    storage.add_orders_listener(_on_orders_changed)
+    await snapshot(full=True)
+    _task = asyncio.create_task(_run())
+    return True
+
+
+async def stop():
+    """Останавливает копирование и сохраняет последние изменения."""
+    global _task
+    if _task is None:
+        return
+    _task.cancel()
+    _task = None
+    await snapshot()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Резервные копии заявок")
+    parser.add_argument("--dir", default=BACKUP_DIR or "backups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("snapshot", help="полная копия orders.json")
+    sub.add_parser("list", help="список копий")
+    restore_cmd = sub.add_parser("restore", help="восстановление на момент времени")
+    restore_cmd.add_argument("--at", help="ДД.ММ.ГГГГ ЧЧ:ММ (по умолчанию — последняя копия)")
+    restore_cmd.add_argument("--output", default="orders.restored.json")
+    args = parser.parse_args(argv)
+    if args.command == "snapshot":
+        created, orders, deleted, _ = _take(full=True)
+        path = _save(args.dir, "full", created, orders, deleted)
+        print(f"Сохранено {len(orders)} заявок в {path}")
+    elif args.command == "list":
+        for created, kind, path in list_backups(args.dir):
+            print(f"{created:%d.%m.%Y %H:%M:%S}  {kind:<5}  {os.path.getsize(path) / 1024:>8.1f} КБ  {path}")
+    elif args.command == "restore":
+        at = datetime.strptime(args.at, "%d.%m.%Y %H:%M") if args.at else None
+        orders = restore(args.dir, at)
+        storage.write_json(args.output, orders)
+        print(f"Восстановлено {len(orders)} заявок в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Счётчики для админской статистики («📊 Статистика»).
+
+Сколько заявок в каждом статусе, на какую сумму, сколько заказов в работе у
+каждого исполнителя — всё это хранится готовыми счётчиками и обновляется
+подпиской на storage в той же операции save_orders, что применяет переход:
+из счётчиков вычитается вклад старой версии заявки и прибавляется вклад новой.
+Статистика отдаётся из памяти, без чтения orders.json.
+
+При остановке счётчики пишутся в DASHBOARD_FILE вместе с отметкой orders.json
+(размер и время изменения); если при запуске отметка не совпала, счётчики
+пересчитываются по заявкам. Раз в DASHBOARD_CHECK_INTERVAL секунд они
+сверяются с полным пересчётом и заменяются, если разошлись.
+"""
+import asyncio
+import logging
+import os
+from collections import Counter
+
+import storage
+from models import Order, OrderStatus as S
+from scheduler import run_blocking
+
+DASHBOARD_FILE = os.getenv("DASHBOARD_FILE", "dashboard.json")
+DASHBOARD_CHECK_INTERVAL = int(os.getenv("DASHBOARD_CHECK_INTERVAL", "3600"))  # сек
+
+IN_FLIGHT = (S.ACCEPTED, S.IN_WORK, S.SUBMITTED, S.APPROVED, S.REVISION)  # оплачены, не сданы
+_EXECUTOR_ACTIVE = (S.EXECUTOR_FOUND, S.WAITING_PAYMENT) + IN_FLIGHT
+
+_counts = None    # статус -> число заявок
+_amounts = None   # статус -> сумма final_price
+_executors = None  # executor_id -> заказов в работе
+_changes = 0      # сколько раз менялись счётчики (для сверки)
+_task = None
+
+
+def _price(order: Order) -> int:
+    try:
+        return int(order.final_price)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _apply(order: Order, sign: int, counts, amounts, executors):
+    status = str(order.status)
+    counts[status] += sign
+    amounts[status] += sign * _price(order)
+    if order.executor_id and order.status in _EXECUTOR_ACTIVE:
+        executors[order.executor_id] += sign
+
+
+def _compute(orders) -> tuple:
+    counts, amounts, executors = Counter(), Counter(), Counter()
+    for order in orders:
+        _apply(order, 1, counts, amounts, executors)
+    return _nonzero(counts), _nonzero(amounts), _nonzero(executors)
+
+
+def _nonzero(counter: Counter) -> Counter:
+    # не «+counter»: отрицательное значение — это расхождение, его нельзя терять
+    return Counter({k: v for k, v in counter.items() if v})
+
+
+def _ensure_counters():
+    global _counts, _amounts, _executors
+    if _counts is not None:
+        return
+    saved = storage.read_json(DASHBOARD_FILE)
+    if isinstance(saved, dict) and saved.get("stamp") is not None and saved["stamp"] == storage.orders_stamp():
+        _counts = Counter(saved.get("counts") or {})
+        _amounts = Counter(saved.get("amounts") or {})
+        _executors = Counter({int(k): v for k, v in (saved.get("executors") or {}).items()})
+        return
+    _counts, _amounts, _executors = _compute(entry[2] for entry in storage.snapshot_index())
+
+
+@storage.add_orders_listener
+def _on_orders_changed(changes):
+    global _changes
+    if _counts is None:
+        return  # посчитаются по заявкам при первом обращении
+    for change in changes:
+        if change.old is not None:
+            _apply(change.old, -1, _counts, _amounts, _executors)
+        if change.new is not None:
+            _apply(change.new, 1, _counts, _amounts, _executors)
+    _changes += 1
+
+
+def stats() -> dict:
+    _ensure_counters()
+    in_flight = [str(s) for s in IN_FLIGHT]
+    return {
+        "counts": {k: v for k, v in _counts.items() if v},
+        "amounts": {k: v for k, v in _amounts.items() if v},
+        "executors": {k: v for k, v in _executors.items() if v},
+        "total": sum(_counts.values()),
+        "in_flight_count": sum(_counts[s] for s in in_flight),
+        "in_flight_amount": sum(_amounts[s] for s in in_flight),
+        "waiting_payment_count": _counts[str(S.WAITING_PAYMENT)],
+        "waiting_payment_amount": _amounts[str(S.WAITING_PAYMENT)],
+    }
+
+
+async def check() -> bool:
+    """Сверяет счётчики с пересчётом по заявкам; True — если пришлось заменить."""
+    global _counts, _amounts, _executors
+    _ensure_counters()
+    changes = _changes
+    orders = [entry[2] for entry in storage.snapshot_index()]
+    counts, amounts, executors = await run_blocking(_compute, orders)
+    if changes != _changes:
+        return False  # заявки менялись во время пересчёта — сверим в следующий раз
+    if (counts, amounts, executors) == (_nonzero(_counts), _nonzero(_amounts), _nonzero(_executors)):
+        return False
+    logging.warning("Счётчики статистики разошлись с заявками, пересчитаны заново")
+    _counts, _amounts, _executors = counts, amounts, executors
+    return True
+
+
+async def _run():
+    while True:
+        await asyncio.sleep(DASHBOARD_CHECK_INTERVAL)
+        try:
+            await check()
+            save()
+        except Exception:
+            logging.exception("Ошибка при сверке счётчиков статистики")
+
+
+def start() -> bool:
+    global _task
+    if _task is not None:
+        return False
+    _ensure_counters()
+    _task = asyncio.create_task(_run())
+    return True
+
+
+def save():
+    if _counts is None:
+        return
+    try:
+        storage.write_json(DASHBOARD_FILE, {
+            "stamp": storage.orders_stamp(),
+            "counts": dict(_counts),
+            "amounts": dict(_amounts),
+            "executors": {str(k): v for k, v in _executors.items()},
+        })
+    except OSError:
+        logging.exception("Не удалось сохранить счётчики статистики")
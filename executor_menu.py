@@ -3,13 +3,15 @@ from aiogram.types import Message, KeyboardButton, ReplyKeyboardMarkup, InlineKe
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.filters import StateFilter
-import json
-import os
 from shared import ADMIN_ID, bot, get_full_name
 from datetime import datetime
-
-EXECUTORS_FILE = "executors.json"
-ORDERS_FILE = "orders.json"
+from models import Order, OrderStatus, WorkType
+from storage import get_all_orders, get_order, get_executors_list
+from keyboards import static_keyboard, order_keyboard
+from transitions import Event, fire
+from materials import has_materials
+from message_editor import safe_edit
+import subscriptions
 
 executor_menu_router = Router()
 
@@ -41,28 +43,48 @@ EXECUTOR_VISIBLE_STATUSES = [
 ]
 
 def is_executor(user_id: int) -> bool:
-    if not os.path.exists(EXECUTORS_FILE):
-        return False
-    with open(EXECUTORS_FILE, "r", encoding="utf-8") as f:
-        try:
-            executors = json.load(f)
-        except Exception:
-            return False
+    executors = get_executors_list()
     return any(str(ex.get("id")) == str(user_id) for ex in executors)
 
+@static_keyboard
 def get_executor_menu_keyboard():
     buttons = [
         [KeyboardButton(text="📂 Мои заказы")],
+        [KeyboardButton(text="🔔 Подписки")],
         [KeyboardButton(text="👨‍💻 Связаться с администратором")]
     ]
     return ReplyKeyboardMarkup(keyboard=buttons, resize_keyboard=True)
 
+def get_subscriptions_keyboard(executor_id):
+    subs = subscriptions.get_subscriptions(executor_id)
+    def mark(active, text):
+        return f"✅ {text}" if active else text
+    subjects = list(subscriptions.SUBJECT_NAMES) + [subscriptions.OTHER_SUBJECT]
+    subject_buttons = [
+        InlineKeyboardButton(
+            text=mark(name in subs['subjects'], "Другое" if name == subscriptions.OTHER_SUBJECT else name),
+            callback_data=f"sub:s:{i}")
+        for i, name in enumerate(subjects)
+    ]
+    work_type_buttons = [
+        InlineKeyboardButton(
+            text=mark(value in subs['work_types'], "Другое" if value == WorkType.OTHER else WorkType(value).title),
+            callback_data=f"sub:w:{i}")
+        for i, value in enumerate(subscriptions.WORK_TYPE_VALUES)
+    ]
+    buttons = [subject_buttons[i:i + 2] for i in range(0, len(subject_buttons), 2)]
+    buttons.append([InlineKeyboardButton(text="— Типы работ —", callback_data="sub:noop")])
+    buttons += [work_type_buttons[i:i + 2] for i in range(0, len(work_type_buttons), 2)]
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+@order_keyboard
 def get_executor_cancel_confirm_keyboard(order_id):
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Да", callback_data=f"executor_cancel_confirm:{order_id}")],
         [InlineKeyboardButton(text="Нет", callback_data=f"executor_cancel_abort:{order_id}")]
     ])
 
+@order_keyboard
 def get_executor_cancel_reason_keyboard(order_id):
     buttons = [
         [InlineKeyboardButton(text=reason, callback_data=f"executor_cancel_reason:{order_id}:{i}")]
@@ -71,19 +93,14 @@ def get_executor_cancel_reason_keyboard(order_id):
     buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data=f"executor_view_order_{order_id}")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@static_keyboard
 def get_executor_cancel_comment_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➡️ Пропустить", callback_data="executor_skip_cancel_comment")]
     ])
 
 def get_executor_orders(user_id: int) -> list:
-    if not os.path.exists(ORDERS_FILE):
-        return []
-    with open(ORDERS_FILE, "r", encoding="utf-8") as f:
-        try:
-            all_orders = json.load(f)
-        except Exception:
-            return []
+    all_orders = get_all_orders()
     # Фильтруем только нужные статусы
     return [o for o in all_orders if str(o.get("executor_id")) == str(user_id) and o.get("status") in EXECUTOR_VISIBLE_STATUSES]
 
@@ -107,18 +124,14 @@ async def executor_my_orders(message_or_callback, state: FSMContext):
     else:
         text = "Ваши заявки:"
         keyboard_buttons = []
-        for order in reversed(orders[-10:]):
-            order_id = order.get('order_id')
-            status = order.get('status', 'N/A')
-            subject = order.get('subject', 'Не указан')
-            work_type = order.get('work_type', 'Заявка').replace('work_type_', '')
-            button_text = f"Заказ на тему: {work_type} | {status}"
-            keyboard_buttons.append([InlineKeyboardButton(text=button_text, callback_data=f"executor_view_order_{order_id}")])
+        for order in map(Order.from_dict, reversed(orders[-10:])):
+            button_text = f"Заказ на тему: {order.work_type_title} | {order.status or 'N/A'}"
+            keyboard_buttons.append([InlineKeyboardButton(text=button_text, callback_data=f"executor_view_order_{order.order_id}")])
         keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
     if isinstance(message_or_callback, Message):
         await message_or_callback.answer(text, reply_markup=keyboard)
     else:
-        await message_or_callback.message.edit_text(text, reply_markup=keyboard)
+        await safe_edit(message_or_callback.message, text, reply_markup=keyboard)
         await message_or_callback.answer()
 
 @executor_menu_router.callback_query(F.data.startswith("executor_view_order_"))
@@ -130,27 +143,22 @@ async def executor_view_order(callback: CallbackQuery, state: FSMContext):
         await callback.answer("Заявка не найдена.", show_alert=True)
         return
     from shared import STATUS_EMOJI_MAP
-    status = order.get('status', 'N/A')
+    order = Order.from_dict(order)
+    status = order.status or 'N/A'
     emoji = STATUS_EMOJI_MAP.get(status, '📄')
-    work_type = order.get('work_type', 'Не указан').replace('work_type_', '')
-    subject = order.get('subject', 'Не указан')
-    deadline = order.get('deadline', 'Не указан')
-    comment = order.get('comments', 'Нет')
     text = f"{emoji} Детали заявки №{order_id}\n\n" \
            f"Статус: {status}\n" \
-           f"Предмет: {subject}\n" \
-           f"Тип работы: {work_type}\n" \
-           f"Дедлайн: {deadline}\n" \
-           f"Комментарий: {comment}"
+           f"Предмет: {order.subject or 'Не указан'}\n" \
+           f"Тип работы: {order.work_type_title}\n" \
+           f"Дедлайн: {order.deadline or 'Не указан'}\n" \
+           f"Комментарий: {order.comments or 'Нет'}"
     
     keyboard_buttons = []
 
     if status == "Отправлен на проверку":
-        submitted_at = order.get('submitted_at', '—')
-        text += f"\nОтправлено: {submitted_at}"
+        text += f"\nОтправлено: {order.submitted_at or '—'}"
     elif status == "На доработке":
-        revision_comment = order.get('revision_comment', 'Нет')
-        text += f"\n\n❗️<b>Комментарий клиента к доработке:</b>\n{revision_comment}"
+        text += f"\n\n❗️<b>Комментарий клиента к доработке:</b>\n{order.revision_comment or 'Нет'}"
 
     if status in ["В работе", "На доработке"]:
         keyboard_buttons.append([InlineKeyboardButton(text="✅ Сдать работу", callback_data=f"executor_submit_work_{order_id}")])
@@ -163,7 +171,34 @@ async def executor_view_order(callback: CallbackQuery, state: FSMContext):
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
 
-    await callback.message.edit_text(text, reply_markup=keyboard)
+    await safe_edit(callback.message, text, reply_markup=keyboard)
+    await callback.answer()
+
+SUBSCRIPTIONS_TEXT = ("🔔 <b>Подписки</b>\n\nВыберите предметы и типы работ, о новых заказах по которым "
+                      "вам приходят уведомления. Если ничего не выбрано — приходят все заказы.")
+
+@executor_menu_router.message(F.text == "🔔 Подписки")
+async def executor_subscriptions(message: Message, state: FSMContext):
+    await state.clear()
+    await message.answer(SUBSCRIPTIONS_TEXT, parse_mode="HTML",
+                         reply_markup=get_subscriptions_keyboard(message.from_user.id))
+
+@executor_menu_router.callback_query(F.data.startswith("sub:"))
+async def executor_toggle_subscription(callback: CallbackQuery):
+    parts = callback.data.split(":")
+    if len(parts) != 3 or not parts[2].isdigit():
+        await callback.answer()
+        return
+    kind, index = parts[1], int(parts[2])
+    values = (list(subscriptions.SUBJECT_NAMES) + [subscriptions.OTHER_SUBJECT]) if kind == "s" else subscriptions.WORK_TYPE_VALUES
+    if index >= len(values):
+        await callback.answer()
+        return
+    if subscriptions.toggle(callback.from_user.id, "subjects" if kind == "s" else "work_types", values[index]) is None:
+        await callback.answer("Вас нет в списке исполнителей, подписки недоступны.", show_alert=True)
+        return
+    await safe_edit(callback.message, SUBSCRIPTIONS_TEXT, parse_mode="HTML",
+                    reply_markup=get_subscriptions_keyboard(callback.from_user.id))
     await callback.answer()
 
 @executor_menu_router.message(F.text == "👨‍💻 Связаться с администратором")
@@ -189,7 +224,7 @@ async def executor_submit_work_start(callback: CallbackQuery, state: FSMContext)
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="⬅️ Вернуться к заказу", callback_data=f"executor_view_order_{order_id}")],
     ])
-    await callback.message.edit_text(
+    await safe_edit(callback.message,
         "Пожалуйста, прикрепите файл с выполненной работой (zip, docx, pdf и др.)",
         reply_markup=keyboard
     )
@@ -208,52 +243,48 @@ async def executor_work_file_received(message: Message, state: FSMContext):
 
 @executor_menu_router.callback_query(F.data.startswith("executor_send_work_"), ExecutorStates.waiting_for_work_file)
 async def executor_send_work(callback: CallbackQuery, state: FSMContext):
-    from shared import get_all_orders, ADMIN_ID, bot
-    import json
     data = await state.get_data()
     order_id = data.get('submit_order_id')
     file_id = data.get('work_file_id')
     file_name = data.get('work_file_name')
-    orders = get_all_orders()
-    for order in orders:
-        if order.get('order_id') == order_id:
-            order['status'] = 'Отправлен на проверку'
-            order['submitted_work'] = {'file_id': file_id, 'file_name': file_name}
-            order['submitted_at'] = datetime.now().strftime('%d.%m.%Y')
-            break
-    with open('orders.json', 'w', encoding='utf-8') as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
-    order = next((o for o in orders if o.get('order_id') == order_id), None)
-    subject = order.get('subject', 'Не указан')
-    work_type = order.get('work_type', 'Не указан').replace('work_type_', '')
-    submitted_at = order.get('submitted_at', '')
-    admin_text = f"Исполнитель выполнил заказ по предмету <b>{subject}</b>\nТип работы: <b>{work_type}</b>\nДата выполнения: <b>{submitted_at}</b>"
+    target_order = fire(
+        order_id, Event.WORK_SUBMITTED,
+        submitted_work={'file_id': file_id, 'file_name': file_name},
+        submitted_at=datetime.now().strftime('%d.%m.%Y'),
+    )
+    if not target_order:
+        await callback.answer("Заказ не найден или работа уже отправлена.", show_alert=True)
+        await state.clear()
+        return
+    order = Order.from_dict(target_order)
+    admin_text = f"Исполнитель выполнил заказ по предмету <b>{order.subject or 'Не указан'}</b>\nТип работы: <b>{order.work_type_title}</b>\nДата выполнения: <b>{order.submitted_at or ''}</b>"
     admin_keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Проверить работу", callback_data=f"admin_check_work_{order_id}")],
         [InlineKeyboardButton(text="Утвердить заказ", callback_data=f"admin_approve_work_{order_id}")],
         [InlineKeyboardButton(text="Отказаться от работы", callback_data=f"admin_reject_work_{order_id}")]
     ])
     await bot.send_document(ADMIN_ID, file_id, caption=admin_text, parse_mode="HTML", reply_markup=admin_keyboard)
-    await callback.message.edit_text("💼 Работа отправлена на проверку администратору!\n⏳Ожидайте ответа.")
+    await safe_edit(callback.message, "💼 Работа отправлена на проверку администратору!\n⏳Ожидайте ответа.")
     await state.clear()
     await callback.answer()
 
 @executor_menu_router.callback_query(F.data.startswith("executor_cancel_submit_"), ExecutorStates.waiting_for_work_file)
 async def executor_cancel_submit(callback: CallbackQuery, state: FSMContext):
     await state.clear()
-    await callback.message.edit_text("Отправка работы отменена.")
+    await safe_edit(callback.message, "Отправка работы отменена.")
     await callback.answer()
 
 @executor_menu_router.callback_query(F.data.startswith("executor_show_materials:"))
 async def executor_show_materials_handler(callback: CallbackQuery, state: FSMContext):
     order_id = callback.data.split(":", 1)[1]
-    from shared import get_all_orders
     orders = get_all_orders()
     order = next((o for o in orders if str(o['order_id']) == str(order_id)), None)
     if not order:
         await callback.answer("Заказ не найден.", show_alert=True)
         return
     material_buttons = []
+    if has_materials(order):
+        material_buttons.append([InlineKeyboardButton(text="📦 Все материалы", callback_data=f"executor_material_all:{order_id}")])
     if order.get('guidelines_file'):
         material_buttons.append([InlineKeyboardButton(text="Методичка", callback_data=f"executor_material_guidelines:{order_id}")])
     if order.get('task_file') or order.get('task_text'):
@@ -262,55 +293,47 @@ async def executor_show_materials_handler(callback: CallbackQuery, state: FSMCon
         material_buttons.append([InlineKeyboardButton(text="Пример работы", callback_data=f"executor_material_example:{order_id}")])
     material_buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data=f"executor_view_order_{order_id}")])
     keyboard = InlineKeyboardMarkup(inline_keyboard=material_buttons)
-    await callback.message.edit_text("Выберите материал для просмотра:", reply_markup=keyboard)
+    await safe_edit(callback.message, "Выберите материал для просмотра:", reply_markup=keyboard)
     await callback.answer()
 
 @executor_menu_router.callback_query(F.data.startswith("executor_refuse_work_") | F.data.startswith("executor_refuse_"))
 async def executor_refuse_start(callback: CallbackQuery, state: FSMContext):
-    from shared import get_all_orders
-    
     order_id_str = callback.data.split('_')[-1]
     if not order_id_str.isdigit():
         await callback.answer("Ошибка: неверный ID заказа.", show_alert=True)
         return
     order_id = int(order_id_str)
 
-    all_orders = get_all_orders()
-    order = next((o for o in all_orders if o.get('order_id') == order_id and o.get('executor_id') == callback.from_user.id), None)
-
-    if not order:
+    order = get_order(order_id)
+    if not order or order.executor_id != callback.from_user.id:
         await callback.answer("Заказ не найден или уже не актуален.", show_alert=True)
         return
 
-    if order.get("status") == "В работе":
+    if order.status == OrderStatus.IN_WORK:
         await state.set_state(ExecutorCancelOrder.waiting_for_confirm)
         await state.update_data(cancel_order_id=order_id)
-        await callback.message.edit_text(
+        await safe_edit(callback.message,
             "❗️ Вы уверены, что хотите отказаться от этого заказа?",
             reply_markup=get_executor_cancel_confirm_keyboard(order_id)
         )
     else:
-        order['status'] = "Рассматривается"
-        order.pop('executor_id', None)
-        order.pop('executor_offer', None)
-        
-        with open("orders.json", "w", encoding="utf-8") as f:
-            json.dump(all_orders, f, ensure_ascii=False, indent=4)
-        
-        subject = order.get('subject', 'Не указан')
+        if not fire(order_id, Event.EXECUTOR_REFUSE):
+            await callback.answer("Заказ уже не актуален.", show_alert=True)
+            return
+        subject = order.subject or 'Не указан'
         await bot.send_message(
             ADMIN_ID,
             f"❌ Исполнитель {get_full_name(callback.from_user)} (ID: {callback.from_user.id}) отказался от заказа по предмету \"{subject}\"",
             parse_mode="HTML"
         )
-        await callback.message.edit_text(f"❗️ Вы отказались от заказа по предмету: {subject} 📄")
+        await safe_edit(callback.message, f"❗️ Вы отказались от заказа по предмету: {subject} 📄")
     await callback.answer()
 
 @executor_menu_router.callback_query(F.data.startswith("executor_cancel_confirm:"), ExecutorCancelOrder.waiting_for_confirm)
 async def executor_cancel_confirm(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split(":")[1])
     await state.set_state(ExecutorCancelOrder.waiting_for_reason)
-    await callback.message.edit_text(
+    await safe_edit(callback.message,
         "💬 Пожалуйста, выберите причину отказа:",
         reply_markup=get_executor_cancel_reason_keyboard(order_id)
     )
@@ -334,10 +357,10 @@ async def executor_cancel_reason(callback: CallbackQuery, state: FSMContext):
 
     if reason.startswith("Другое"):
         await state.set_state(ExecutorCancelOrder.waiting_for_custom_reason)
-        await callback.message.edit_text("✍️ Пожалуйста, введите причину отказа:")
+        await safe_edit(callback.message, "✍️ Пожалуйста, введите причину отказа:")
     else:
         await state.set_state(ExecutorCancelOrder.waiting_for_comment)
-        await callback.message.edit_text(
+        await safe_edit(callback.message,
             "💬 Добавьте комментарий к отказу (или пропустите):",
             reply_markup=get_executor_cancel_comment_keyboard()
         )
@@ -370,34 +393,21 @@ async def executor_cancel_skip_comment(callback: CallbackQuery, state: FSMContex
 
 
 async def finish_executor_cancel_order(message_or_callback, state, order_id, reason, comment):
-    from shared import get_all_orders, get_full_name
-    all_orders = get_all_orders()
-    target_order = None
-    for order in all_orders:
-        if order.get('order_id') == order_id:
-            order['status'] = "Рассматривается"
-            order.pop('executor_id', None)
-            order.pop('executor_offer', None)
-            target_order = order
-            break
-            
+    target_order = fire(order_id, Event.EXECUTOR_REFUSE)
     if not target_order:
         if isinstance(message_or_callback, Message):
             await message_or_callback.answer("Не удалось обработать отказ, заказ не найден.")
         else:
-            await message_or_callback.message.edit_text("Не удалось обработать отказ, заказ не найден.")
+            await safe_edit(message_or_callback.message, "Не удалось обработать отказ, заказ не найден.")
         await state.clear()
         return
 
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(all_orders, f, ensure_ascii=False, indent=4)
-    
     await state.clear()
     
     if isinstance(message_or_callback, Message):
         await message_or_callback.answer("Вы отказались от заказа. Администратор уведомлен.")
     else:
-        await message_or_callback.message.edit_text("Вы отказались от заказа. Администратор уведомлен.")
+        await safe_edit(message_or_callback.message, "Вы отказались от заказа. Администратор уведомлен.")
 
     admin_text = (f"❌ Исполнитель {get_full_name(message_or_callback.from_user)} (ID: {message_or_callback.from_user.id}) "
                   f"отказался от заказа №{order_id}, который был в работе.\n\n"
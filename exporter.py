@@ -0,0 +1,201 @@
+"""Выгрузка заявок в CSV, XLSX и Parquet.
+
+Заявки идут конвейером генераторов: снимок storage -> фильтр (статусы, даты
+создания, исполнитель) -> строки -> запись в файл. Строки не собираются в
+список: CSV и XLSX (openpyxl в режиме write_only) пишутся построчно, Parquet —
+пачками по EXPORT_BATCH строк, так что память на выгрузку не растёт с числом
+заявок. В боте выгрузка идёт в потоке (run_blocking) и уходит админу одним
+документом (/export), для cron есть CLI:
+
+    python exporter.py --output orders.csv --status "Выполнена" --from 01.06.2025 --to 30.06.2025
+    python exporter.py --output orders.parquet --executor 8030752676
+"""
+import argparse
+import csv
+import os
+from datetime import datetime
+
+import storage
+from models import Order, OrderStatus
+from optional_deps import require
+
+EXPORT_BATCH = 10000  # строк в одной группе Parquet
+FORMATS = ("csv", "xlsx", "parquet")
+
+
+def _price(order: Order):
+    try:
+        return int(order.final_price)
+    except (TypeError, ValueError):
+        return None
+
+
+# (заголовок, тип для Parquet, значение)
+COLUMNS = (
+    ("Номер", "int", lambda o: o.order_id),
+    ("Статус", "str", lambda o: str(o.status) if o.status else None),
+    ("Создана", "str", lambda o: o.creation_date),
+    ("Предмет", "str", lambda o: o.subject),
+    ("Тип работы", "str", lambda o: o.work_type_title if o.work_type else None),
+    ("Вуз", "str", lambda o: o.university_name),
+    ("Группа", "str", lambda o: o.group_name),
+    ("Преподаватель", "str", lambda o: o.teacher_name),
+    ("Срок", "str", lambda o: o.deadline),
+    ("Цена", "int", _price),
+    ("Исполнитель", "int", lambda o: o.executor_id),
+    ("Клиент", "int", lambda o: o.user_id),
+    ("Username", "str", lambda o: o.username),
+    ("Сдана", "str", lambda o: o.submitted_at),
+)
+HEADER = tuple(name for name, _, _ in COLUMNS)
+
+
+def parse_date(value: str | None):
+    return datetime.strptime(value, "%d.%m.%Y").date() if value else None
+
+
+def iter_orders(entries=None):
+    """Заявки из снимка storage (или из переданных записей snapshot_index)."""
+    if entries is None:
+        entries = storage.snapshot_index()
+    for entry in entries:
+        yield entry[2]
+
+
+def select(orders, statuses=None, date_from=None, date_to=None, executor_id=None):
+    """Фильтр заявок; даты — по дню создания, границы включительно."""
+    statuses = {str(s) for s in statuses} if statuses else None
+    days = {}  # разбор повторяющихся дат один раз
+    for order in orders:
+        if statuses is not None and str(order.status) not in statuses:
+            continue
+        if executor_id is not None and order.executor_id != executor_id:
+            continue
+        if date_from or date_to:
+            key = (order.creation_date or "")[:10]
+            if key not in days:
+                try:
+                    days[key] = parse_date(key)
+                except ValueError:
+                    days[key] = None
+            day = days[key]
+            if day is None or (date_from and day < date_from) or (date_to and day > date_to):
+                continue
+        yield order
+
+
+def rows(orders):
+    getters = [getter for _, _, getter in COLUMNS]
+    for order in orders:
+        yield [getter(order) for getter in getters]
+
+
+def write_csv(path: str, rows) -> int:
+    count = 0
+    # utf-8-sig — чтобы Excel сразу открыл кириллицу
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(HEADER)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def write_xlsx(path: str, rows) -> int:
+    openpyxl = require("openpyxl")
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet("Заявки")
+    sheet.append(HEADER)
+    count = 0
+    for row in rows:
+        sheet.append(row)
+        count += 1
+    workbook.save(path)
+    return count
+
+
+def write_parquet(path: str, rows) -> int:
+    pa = require("pyarrow")
+    pq = require("pyarrow.parquet")
+    types = {"int": pa.int64(), "str": pa.string()}
+    schema = pa.schema([(name, types[kind]) for name, kind, _ in COLUMNS])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == EXPORT_BATCH:
+                writer.write_batch(_to_batch(pa, schema, batch))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_batch(_to_batch(pa, schema, batch))
+            count += len(batch)
+    return count
+
+
+def _to_batch(pa, schema, batch: list):
+    columns = [pa.array([row[i] for row in batch], type=field.type) for i, field in enumerate(schema)]
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx, "parquet": write_parquet}
+
+
+def export(path: str, fmt: str, entries=None, **filters) -> int:
+    """Пишет выбранные заявки в path; возвращает число строк."""
+    return WRITERS[fmt](path, rows(select(iter_orders(entries), **filters)))
+
+
+def parse_args(args: list) -> tuple:
+    """Аргументы /export: формат и фильтры status=… from=… to=… executor=…"""
+    fmt = "csv"
+    filters = {}
+    for arg in args:
+        key, sep, value = arg.partition("=")
+        if not sep and arg.lower() in FORMATS:
+            fmt = arg.lower()
+        elif key == "status":
+            filters["statuses"] = [s.strip() for s in value.split(",") if s.strip()]
+        elif key == "from":
+            filters["date_from"] = parse_date(value)
+        elif key == "to":
+            filters["date_to"] = parse_date(value)
+        elif key == "executor":
+            filters["executor_id"] = int(value)
+        else:
+            raise ValueError(f"Непонятный аргумент: {arg}")
+    check_statuses(filters.get("statuses", ()))
+    return fmt, filters
+
+
+def check_statuses(statuses):
+    unknown = [s for s in statuses if s not in {st.value for st in OrderStatus}]
+    if unknown:
+        raise ValueError(f"Нет такого статуса: {', '.join(unknown)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Выгрузка заявок")
+    parser.add_argument("--output", required=True, help="файл; формат по расширению, если не задан --format")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--status", action="append", help="статус (можно несколько раз)")
+    parser.add_argument("--from", dest="date_from", type=parse_date, help="ДД.ММ.ГГГГ")
+    parser.add_argument("--to", dest="date_to", type=parse_date, help="ДД.ММ.ГГГГ")
+    parser.add_argument("--executor", type=int)
+    args = parser.parse_args(argv)
+    fmt = args.format or os.path.splitext(args.output)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        parser.error(f"неизвестный формат {fmt!r}, укажите --format")
+    try:
+        check_statuses(args.status or ())
+    except ValueError as e:
+        parser.error(str(e))
+    count = export(args.output, fmt, statuses=args.status, date_from=args.date_from,
+                   date_to=args.date_to, executor_id=args.executor)
+    print(f"Выгружено {count} заявок в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Локальное зеркало материалов заказов.
+
+Материалы хранятся в Telegram только как file_id. Если задан FILE_MIRROR_DIR,
+фоновые загрузчики скачивают каждый файл в хранилище, адресуемое содержимым:
+
+    FILE_MIRROR_DIR/blobs/ab/abcdef...   (имя — SHA-256 содержимого)
+
+Одинаковые файлы (одна методичка от всей группы) лежат на диске один раз.
+Хэш записывается в слот заявки (поле sha256 рядом с id), а соответствие
+file_id -> sha256 хранится в index.json, поэтому уже известный file_id повторно
+не скачивается. Хэши и index.json пишутся пачками: когда очередь опустела или
+накопилось FILE_MIRROR_FLUSH_EVERY файлов — одна запись orders.json на пачку,
+а не на каждый файл. Загрузка идёт потоком кусками по CHUNK_SIZE через
+хэширующую обёртку, так что память не зависит от размера файла; одновременно
+работает не больше FILE_MIRROR_WORKERS загрузок.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+
+import storage
+from materials import MATERIAL_SLOTS, slot_files
+
+FILE_MIRROR_DIR = os.getenv("FILE_MIRROR_DIR")
+FILE_MIRROR_WORKERS = int(os.getenv("FILE_MIRROR_WORKERS", "2"))
+FILE_MIRROR_FLUSH_EVERY = int(os.getenv("FILE_MIRROR_FLUSH_EVERY", "100"))
+CHUNK_SIZE = 64 * 1024
+
+_queue = None
+_index = {}  # file_id -> sha256
+_pending = set()  # file_id в очереди или в работе
+_hashes = {}  # order_id -> {file_id: sha256}, ещё не записанные в заявки
+_index_dirty = False
+_workers = []
+
+
+class HashingWriter:
+    """Файловый объект для bot.download_file: пишет во временный файл и считает SHA-256."""
+
+    def __init__(self, f):
+        self._f = f
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self.sha256.update(chunk)
+        self.size += len(chunk)
+        return self._f.write(chunk)
+
+    def flush(self):
+        self._f.flush()
+
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(FILE_MIRROR_DIR, "blobs", sha256[:2], sha256)
+
+
+def _index_path() -> str:
+    return os.path.join(FILE_MIRROR_DIR, "index.json")
+
+
+async def mirror_file(bot, file_id: str) -> str:
+    """Скачивает файл в хранилище (если его там нет) и возвращает его SHA-256."""
+    known = _index.get(file_id)
+    if known and os.path.exists(blob_path(known)):
+        return known
+    tmp_dir = os.path.join(FILE_MIRROR_DIR, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    tg_file = await bot.get_file(file_id)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            writer = HashingWriter(f)
+            await bot.download_file(tg_file.file_path, destination=writer, chunk_size=CHUNK_SIZE, seek=False)
+        sha256 = writer.sha256.hexdigest()
+        target = blob_path(sha256)
+        if os.path.exists(target):
+            os.unlink(tmp_path)  # такой файл уже есть — дубликат не храним
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    global _index_dirty
+    _index[file_id] = sha256
+    _index_dirty = True
+    return sha256
+
+
+def _record_hashes(hashes: dict):
+    def apply(order: dict):
+        for slot, _ in MATERIAL_SLOTS:
+            for file in slot_files(order.get(slot)):
+                sha256 = hashes.get(file.get('id'))
+                if sha256:
+                    file['sha256'] = sha256
+    return apply
+
+
+def flush():
+    """Записывает накопленные хэши в заявки и index.json."""
+    global _index_dirty
+    if _hashes:
+        batch = {order_id: _record_hashes(hashes) for order_id, hashes in _hashes.items()}
+        _hashes.clear()
+        storage.update_orders(batch)
+    if _index_dirty:
+        _index_dirty = False
+        storage.write_json(_index_path(), _index)
+
+
+def enqueue_order(order: dict):
+    """Ставит в очередь файлы заявки, у которых ещё нет локальной копии."""
+    if _queue is None:
+        return
+    for slot, _ in MATERIAL_SLOTS:
+        for file in slot_files(order.get(slot)):
+            file_id = file.get('id')
+            if file_id and not file.get('sha256') and file_id not in _pending:
+                _pending.add(file_id)
+                _queue.put_nowait((order.get('order_id'), file_id))
+
+
+def _on_orders_changed(changes):
+    for change in changes:
+        if change.new is not None:
+            enqueue_order(change.new.to_dict())
+
+
+async def _worker(bot):
+    while True:
+        order_id, file_id = await _queue.get()
+        try:
+            sha256 = await mirror_file(bot, file_id)
+            _hashes.setdefault(order_id, {})[file_id] = sha256
+        except Exception:
+            logging.exception("Не удалось сохранить копию файла %s заказа %s", file_id, order_id)
+        finally:
+            _pending.discard(file_id)
+            _queue.task_done()
+        if _queue.empty() or sum(map(len, _hashes.values())) >= FILE_MIRROR_FLUSH_EVERY:
+            try:
+                flush()
+            except Exception:
+                logging.exception("Не удалось записать хэши файлов")
+
+
+def start(bot) -> bool:
+    """Запускает загрузчики и досылает в очередь файлы уже существующих заявок."""
+    global _queue
+    if not FILE_MIRROR_DIR or _queue is not None:
+        return False
+    os.makedirs(FILE_MIRROR_DIR, exist_ok=True)
+    _index.update(storage.read_json(_index_path(), {}))
+    _queue = asyncio.Queue()
+    storage.add_orders_listener(_on_orders_changed)
+    for order in storage.get_all_orders():
+        enqueue_order(order)
+    for _ in range(FILE_MIRROR_WORKERS):
+        _workers.append(asyncio.create_task(_worker(bot)))
+    logging.info("Зеркало файлов: %s, в очереди %d", FILE_MIRROR_DIR, _queue.qsize())
+    return True
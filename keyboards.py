@@ -0,0 +1,38 @@
+"""Фабрика клавиатур.
+
+Статичные клавиатуры строятся один раз при первом обращении, клавиатуры,
+зависящие только от простых параметров (order_id, цена, статус), кэшируются
+в ограниченном LRU, и все обработчики получают один и тот же объект разметки.
+InlineKeyboardMarkup в aiogram изменяемый (MutableTelegramObject), так что это
+безопасно только пока никто не меняет полученную клавиатуру: если нужна
+клавиатура с дополнительной кнопкой, её строят заново, а не дописывают в
+inline_keyboard кэшированной.
+"""
+import functools
+
+KEYBOARD_CACHE_SIZE = 2048
+
+_cached_builders = []
+
+
+def static_keyboard(builder):
+    """Декоратор для клавиатуры без параметров: строится один раз."""
+    cached = functools.cache(builder)
+    _cached_builders.append(cached)
+    return cached
+
+
+def order_keyboard(builder):
+    """Декоратор для клавиатуры с хэшируемыми параметрами: LRU на KEYBOARD_CACHE_SIZE."""
+    cached = functools.lru_cache(maxsize=KEYBOARD_CACHE_SIZE)(builder)
+    _cached_builders.append(cached)
+    return cached
+
+
+def keyboard_cache_info() -> dict:
+    return {f.__qualname__: f.cache_info() for f in _cached_builders}
+
+
+def clear_keyboard_caches():
+    for f in _cached_builders:
+        f.cache_clear()
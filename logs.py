@@ -0,0 +1,153 @@
+"""Структурированное асинхронное логирование.
+
+Обработчики в цикле событий только кладут запись в очередь (QueueHandler), а
+форматирование и вывод выполняет отдельный поток QueueListener — медленный
+stdout не останавливает бота.
+
+Каждая запись выводится одной строкой JSON и несёт контекст апдейта:
+update_id, user_id, handler (имя обработчика) и order_id. Контекст хранится в
+contextvars: LogContextMiddleware заполняет его для каждого апдейта, а
+order_id проставляет bind() (его вызывает transitions.fire). Отладочные записи
+прореживаются: из каждых LOG_DEBUG_SAMPLE записей с одинаковым шаблоном
+сообщения выводится одна.
+
+Настройки: LOG_LEVEL (INFO), LOG_FORMAT (json или text), LOG_DEBUG_SAMPLE (100).
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_DEBUG_SAMPLE = int(os.getenv("LOG_DEBUG_SAMPLE", "100"))
+
+CONTEXT_FIELDS = ("update_id", "user_id", "handler", "order_id")
+_context = {name: contextvars.ContextVar(name, default=None) for name in CONTEXT_FIELDS}
+
+_listener = None
+
+
+def bind(**fields):
+    """Добавляет поля к контексту логов текущего апдейта."""
+    for name, value in fields.items():
+        _context[name].set(value)
+
+
+class ContextFilter(logging.Filter):
+    """Копирует контекст апдейта в запись (в потоке, где запись создана)."""
+
+    def filter(self, record):
+        for name, var in _context.items():
+            if not hasattr(record, name):
+                setattr(record, name, var.get())
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает одну из every отладочных записей с одинаковым шаблоном."""
+
+    def __init__(self, every: int = LOG_DEBUG_SAMPLE):
+        super().__init__()
+        self.every = max(every, 1)
+        self._seen = Counter()
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        key = (record.name, record.msg)
+        self._seen[key] += 1
+        if self._seen[key] % self.every != 1:
+            return False
+        record.sampled = self.every
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """В очередь уходит запись с готовым текстом, а трейсбек форматируется уже в потоке вывода."""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for name in CONTEXT_FIELDS + ("sampled",):
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Переключает корневой логгер на очередь; вывод — в потоке QueueListener."""
+    global _listener
+    if _listener is not None:
+        return _listener
+    output = logging.StreamHandler(sys.stdout)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [upd=%(update_id)s user=%(user_id)s order=%(order_id)s] %(message)s"
+        ))
+    log_queue = queue.SimpleQueue()
+    handler = _QueueHandler(log_queue)
+    handler.addFilter(SamplingFilter())
+    handler.addFilter(ContextFilter())
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает поток вывода."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class LogContextMiddleware(BaseMiddleware):
+    """Заполняет контекст логов: на апдейте — update_id и user_id, на событии — имя обработчика.
+
+    Регистрируется внешним middleware на dp.update и внутренним на типах событий
+    (внутренние middleware распространяются на вложенные роутеры).
+    """
+
+    async def __call__(self, handler, event, data: dict):
+        if isinstance(event, Update):
+            user = data.get("event_from_user")
+            bind(update_id=event.update_id, user_id=user.id if user else None)
+        else:
+            handler_object = data.get("handler")
+            if handler_object is not None:
+                bind(handler=getattr(handler_object.callback, "__name__", None))
+        return await handler(event, data)
@@ -1,11 +1,13 @@
 import asyncio
+import html
 import logging
-import json
 import os
+import shlex
+import tempfile
 from datetime import datetime
 
 from aiogram import Bot, Dispatcher, Router, F, types
-from aiogram.filters import Command, StateFilter
+from aiogram.filters import Command, CommandObject, StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.types import (
@@ -15,15 +17,38 @@ from aiogram.types import (
     CallbackQuery,
     ReplyKeyboardRemove,
     ReplyKeyboardMarkup,
-    KeyboardButton
+    KeyboardButton,
+    FSInputFile
 )
 from dotenv import load_dotenv
-import gspread
-from google.oauth2.service_account import Credentials
-from shared import get_all_orders, ADMIN_ID, bot, STATUS_EMOJI_MAP, pluralize_days, get_full_name
+from shared import ADMIN_ID, bot, STATUS_EMOJI_MAP, pluralize_days, get_full_name
+from storage import get_all_orders, get_order, save_orders, get_executors_list, save_executors_list, snapshot_index
 from payment import payment_router
 from executor_menu import executor_menu_router, is_executor, get_executor_menu_keyboard
 from executor_menu import ExecutorStates
+from models import Order, OrderStatus, SUBJECTS
+from optional_deps import require, check_optional_dependencies, MissingDependencyError
+from keyboards import static_keyboard, order_keyboard
+import render
+from transitions import Event, fire
+from middlewares import IdempotencyMiddleware, ThrottlingMiddleware, THROTTLE_RATES
+from scheduler import SchedulerMiddleware, run_blocking
+from materials import send_materials, has_materials
+from albums import AlbumMiddleware
+import file_mirror
+import backup
+import analytics
+import exporter
+import dashboard
+import search
+import autocomplete
+import matching
+import autoassign
+import subscriptions
+import offer_rounds
+import offer_timeouts
+from logs import LogContextMiddleware, setup_logging
+from message_editor import safe_edit, forget
 
 # Глобальная карта статусов для консистентности
 STATUS_EMOJI_MAP = {
@@ -48,13 +73,35 @@ EXECUTOR_IDS = [int(x) for x in os.getenv("EXECUTOR_IDS", "123456789").split(","
 
 ALLOWED_EXTENSIONS = {"pdf", "docx", "png", "jpeg", "jpg"}
 MAX_FILE_SIZE = 15 * 1024 * 1024  # 15 MB
+AUTO_ASSIGN_ATTEMPTS = 3  # сколько исполнителей пробовать, если предложение не доставлено
 
-# Настройка логирования
-logging.basicConfig(level=logging.INFO)
+# Настройка логирования: JSON в отдельном потоке, контекст апдейта в каждой записи
+setup_logging()
 
 # Инициализация бота и диспетчера
 bot = Bot(token=BOT_TOKEN)
 dp = Dispatcher()
+log_context = LogContextMiddleware()
+dp.update.outer_middleware(log_context)
+dp.message.middleware(log_context)
+dp.callback_query.middleware(log_context)
+# Ограничение частоты — раньше идемпотентности: отброшенное нажатие не должно
+# оставить в кэше ключ, из-за которого повтор той же кнопки сочтут дублем
+throttling = ThrottlingMiddleware(exempt_ids=[int(ADMIN_ID)])
+dp.update.outer_middleware(throttling)
+# Повторы апдейтов и двойные нажатия отбрасываются до обработчиков
+idempotency = IdempotencyMiddleware()
+dp.update.outer_middleware(idempotency)
+dp.shutdown.register(idempotency.save)
+dp.shutdown.register(backup.stop)
+dp.shutdown.register(matching.save)
+dp.shutdown.register(dashboard.save)
+dp.shutdown.register(file_mirror.flush)
+# Части альбома собираются до планировщика и не занимают его слоты
+dp.update.outer_middleware(AlbumMiddleware())
+# Ограниченное число одновременно работающих обработчиков, срочное — вперёд
+update_scheduler = SchedulerMiddleware(admin_ids=[int(ADMIN_ID)])
+dp.update.outer_middleware(update_scheduler)
 router = Router()
 dp.include_router(router)
 admin_router = Router()
@@ -77,6 +124,9 @@ class AssignExecutor(StatesGroup):
 class AdminApproval(StatesGroup):
     waiting_for_new_price = State()
 
+class AdminOfferRound(StatesGroup):
+    waiting_for_max_price = State()
+
 # --- FSM для исполнителя ---
 class ExecutorResponse(StatesGroup):
     waiting_for_price = State()
@@ -123,35 +173,26 @@ class ExecutorResponse(StatesGroup):
     waiting_for_comment = State()
     waiting_for_confirm = State()  # Новый этап
 
-EXECUTORS_FILE = "executors.json"
-
 def get_admin_settings_keyboard():
+    return _admin_settings_keyboard(autoassign.is_enabled())
+
+@order_keyboard
+def _admin_settings_keyboard(auto_assign: bool):
     buttons = [
         [InlineKeyboardButton(text="➕ Добавить исполнителя", callback_data="admin_add_executor")],
         [InlineKeyboardButton(text="➖ Удалить исполнителя", callback_data="admin_delete_executor")],
         [InlineKeyboardButton(text="👥 Показать всех исполнителей", callback_data="admin_show_executors")],
+        [InlineKeyboardButton(text=f"🤖 Автоназначение: {'вкл' if auto_assign else 'выкл'}", callback_data="admin_toggle_auto_assign")],
         [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_back_to_menu")]
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@static_keyboard
 def get_skip_keyboard_admin():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➡️ Пропустить", callback_data="admin_skip_executor_name")]
     ])
 
-def get_executors_list():
-    if not os.path.exists(EXECUTORS_FILE):
-        return []
-    with open(EXECUTORS_FILE, "r", encoding="utf-8") as f:
-        try:
-            return json.load(f)
-        except Exception:
-            return []
-
-def save_executors_list(executors):
-    with open(EXECUTORS_FILE, "w", encoding="utf-8") as f:
-        json.dump(executors, f, ensure_ascii=False, indent=4)
-
 def get_executors_info_keyboard():
     executors = get_executors_list()
     if not executors:
@@ -174,11 +215,15 @@ def get_executors_delete_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 def get_executors_assign_keyboard(order_id):
-    executors = get_executors_list()
+    # Сначала исполнители, которые лучше подходят под заказ
+    order = get_order(order_id)
+    executors = matching.rank(order, get_executors_list())
     buttons = []
     if executors:
         for ex in executors:
             label = f"{ex.get('name') or 'Без ФИО'} | ID: {ex['id']}"
+            if order is not None:
+                label += f" | {matching.describe(matching.get_stats(ex['id']), order)}"
             buttons.append([InlineKeyboardButton(text=label, callback_data=f"assign_executor_select_{ex['id']}")])
         buttons.append([InlineKeyboardButton(text="Ввести ID вручную", callback_data=f"assign_executor_manual_{order_id}")])
     # Добавляем кнопку 'Назад'
@@ -191,23 +236,56 @@ async def admin_settings_menu(message: Message, state: FSMContext):
     await state.clear()
     await message.answer("⚙️ Настройки исполнителей:", reply_markup=get_admin_settings_keyboard())
 
+@admin_router.message(F.text == "📊 Статистика")
+async def admin_dashboard(message: Message, state: FSMContext):
+    if message.from_user.id != int(ADMIN_ID): return
+    await state.clear()
+    stats = dashboard.stats()
+    lines = [
+        "📊 <b>Статистика</b>",
+        "",
+        f"Всего заявок: <b>{stats['total']}</b>",
+        f"В работе (оплачено): <b>{stats['in_flight_count']}</b> на {stats['in_flight_amount']} ₽",
+        f"Ждут оплаты: <b>{stats['waiting_payment_count']}</b> на {stats['waiting_payment_amount']} ₽",
+        "",
+        "<b>По статусам:</b>",
+    ]
+    for status in OrderStatus:
+        count = stats['counts'].get(status.value)
+        if count:
+            amount = stats['amounts'].get(status.value)
+            lines.append(f"{STATUS_EMOJI_MAP.get(status.value, '📄')} {status.value}: {count}" + (f" ({amount} ₽)" if amount else ""))
+    if stats['executors']:
+        names = {ex['id']: ex.get('name') for ex in get_executors_list()}
+        lines += ["", "<b>Заказов у исполнителей:</b>"]
+        for executor_id, count in sorted(stats['executors'].items(), key=lambda item: -item[1]):
+            lines.append(f"{html.escape(str(names.get(executor_id) or executor_id))}: {count}")
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
 @admin_router.callback_query(F.data == "admin_settings")
 async def admin_settings_menu_cb(callback: CallbackQuery, state: FSMContext):
     await state.clear()
-    await callback.message.edit_text("⚙️ Настройки исполнителей:", reply_markup=get_admin_settings_keyboard())
+    await safe_edit(callback.message, "⚙️ Настройки исполнителей:", reply_markup=get_admin_settings_keyboard())
     await callback.answer()
 
+@admin_router.callback_query(F.data == "admin_toggle_auto_assign")
+async def admin_toggle_auto_assign(callback: CallbackQuery, state: FSMContext):
+    if callback.from_user.id != int(ADMIN_ID): return
+    autoassign.set_enabled(not autoassign.is_enabled())
+    await safe_edit(callback.message, "⚙️ Настройки исполнителей:", reply_markup=get_admin_settings_keyboard())
+    await callback.answer("Автоназначение включено" if autoassign.is_enabled() else "Автоназначение выключено")
+
 @admin_router.callback_query(F.data == "admin_add_executor")
 async def admin_add_executor_start(callback: CallbackQuery, state: FSMContext):
     await state.set_state(AdminSettings.waiting_for_executor_name)
-    await callback.message.edit_text("✍️ Введите ФИО исполнителя (или пропустите):", reply_markup=get_skip_keyboard_admin())
+    await safe_edit(callback.message, "✍️ Введите ФИО исполнителя (или пропустите):", reply_markup=get_skip_keyboard_admin())
     await callback.answer()
 
 @admin_router.callback_query(F.data == "admin_skip_executor_name", AdminSettings.waiting_for_executor_name)
 async def admin_skip_executor_name(callback: CallbackQuery, state: FSMContext):
     await state.update_data(executor_name="")
     await state.set_state(AdminSettings.waiting_for_executor_id)
-    await callback.message.edit_text("🔢 Введите ID исполнителя (обязательно):")
+    await safe_edit(callback.message, "🔢 Введите ID исполнителя (обязательно):")
     await callback.answer()
 
 @admin_router.message(AdminSettings.waiting_for_executor_name)
@@ -237,7 +315,7 @@ async def admin_executor_id_input(message: Message, state: FSMContext):
 @admin_router.callback_query(F.data == "admin_delete_executor")
 async def admin_delete_executor_start(callback: CallbackQuery, state: FSMContext):
     await state.set_state(AdminSettings.waiting_for_delete_id)
-    await callback.message.edit_text("Выберите исполнителя для удаления:", reply_markup=get_executors_delete_keyboard())
+    await safe_edit(callback.message, "Выберите исполнителя для удаления:", reply_markup=get_executors_delete_keyboard())
     await callback.answer()
 
 @admin_router.callback_query(F.data.startswith("admin_delete_executor_id_"), AdminSettings.waiting_for_delete_id)
@@ -247,7 +325,7 @@ async def admin_delete_executor_confirm(callback: CallbackQuery, state: FSMConte
     executors = [ex for ex in executors if ex['id'] != executor_id]
     save_executors_list(executors)
     await state.clear()
-    await callback.message.edit_text("✅ Исполнитель удален!", reply_markup=get_admin_settings_keyboard())
+    await safe_edit(callback.message, "✅ Исполнитель удален!", reply_markup=get_admin_settings_keyboard())
     await callback.message.answer("👥 Текущие исполнители:", reply_markup=get_executors_info_keyboard())
     await callback.answer()
 
@@ -263,31 +341,34 @@ async def admin_show_executors(callback: CallbackQuery, state: FSMContext):
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_settings")]
     ])
-    await callback.message.edit_text(text, reply_markup=keyboard)
+    await safe_edit(callback.message, text, reply_markup=keyboard)
     await callback.answer()
 @executor_router.callback_query(F.data == "executor_back_to_price", ExecutorResponse.waiting_for_deadline)
 async def executor_back_to_price_handler(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     order_id = data.get('order_id')
     await state.set_state(ExecutorResponse.waiting_for_price)
-    await callback.message.edit_text("Отлично! Укажите вашу цену:", reply_markup=get_price_keyboard(order_id))
+    await safe_edit(callback.message, "Отлично! Укажите вашу цену:", reply_markup=get_price_keyboard(order_id))
     await callback.answer()
 
 @admin_router.callback_query(F.data == "admin_back_to_menu")
 async def admin_back_to_menu(callback: CallbackQuery, state: FSMContext):
     await state.clear()
-    await callback.message.edit_text("Добро пожаловать в панель администратора!", reply_markup=None)
+    await safe_edit(callback.message, "Добро пожаловать в панель администратора!", reply_markup=None)
     await bot.send_message(callback.from_user.id, "Главное меню:", reply_markup=get_admin_keyboard())
     await callback.answer()
 
 
+@static_keyboard
 def get_admin_keyboard():
     buttons = [
         [KeyboardButton(text="📦 Все заказы")],
+        [KeyboardButton(text="📊 Статистика")],
         [KeyboardButton(text="⚙️ Настройки")]
     ]
     return ReplyKeyboardMarkup(keyboard=buttons, resize_keyboard=True)
 
+@order_keyboard
 def get_executor_confirm_keyboard(order_id):
     buttons = [
         [
@@ -298,6 +379,7 @@ def get_executor_confirm_keyboard(order_id):
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@order_keyboard
 def get_price_keyboard(order_id):
     buttons = [
         [InlineKeyboardButton(text=f"{i} ₽", callback_data=f"price_{i}") for i in range(500, 2501, 500)],
@@ -307,6 +389,7 @@ def get_price_keyboard(order_id):
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@static_keyboard
 def get_deadline_keyboard():
     buttons = [
         [
@@ -319,6 +402,7 @@ def get_deadline_keyboard():
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@static_keyboard
 def get_main_reply_keyboard():
     buttons = [
         [KeyboardButton(text="🆕 Новая заявка"), KeyboardButton(text="📂 Мои заявки")],
@@ -326,14 +410,17 @@ def get_main_reply_keyboard():
     ]
     return ReplyKeyboardMarkup(keyboard=buttons, resize_keyboard=True)
 
+@static_keyboard
 def get_back_to_main_menu_keyboard():
     buttons = [[InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_main_menu")]]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@static_keyboard
 def get_back_keyboard():
     buttons = [[InlineKeyboardButton(text="⬅️ Назад", callback_data="back")]]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@order_keyboard
 def get_yes_no_keyboard(prefix: str):
     """Возвращает клавиатуру с кнопками 'Да' и 'Нет'."""
     buttons = [
@@ -344,6 +431,7 @@ def get_yes_no_keyboard(prefix: str):
         [InlineKeyboardButton(text="⬅️ Назад", callback_data="back")]
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
+@order_keyboard
 def get_user_order_keyboard(order_id, status):
     buttons = []
     # Кнопка 'Оплатить' если статус 'Ожидает оплаты'
@@ -355,6 +443,7 @@ def get_user_order_keyboard(order_id, status):
     buttons.append([InlineKeyboardButton(text="⬅️ К списку заявок", callback_data="my_orders_list")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@static_keyboard
 def get_work_type_keyboard():
     buttons = [
         [InlineKeyboardButton(text="Контрольная", callback_data="work_type_Контрольная")],
@@ -367,33 +456,20 @@ def get_work_type_keyboard():
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@static_keyboard
 def get_subject_keyboard():
-    buttons = [
-        [
-            InlineKeyboardButton(text="Мат. анализ", callback_data="subject_Математический анализ"),
-            InlineKeyboardButton(text="Алгебра", callback_data="subject_Алгебра и геометрия")
-        ],
-        [
-            InlineKeyboardButton(text="Программирование", callback_data="subject_Программирование"),
-            InlineKeyboardButton(text="История", callback_data="subject_История России")
-        ],
-        [
-            InlineKeyboardButton(text="Философия", callback_data="subject_Философия"),
-            InlineKeyboardButton(text="Английский язык", callback_data="subject_Английский язык")
-        ],
-        [
-            InlineKeyboardButton(text="Экономика", callback_data="subject_Экономическая теория"),
-            InlineKeyboardButton(text="Русский язык", callback_data="subject_Русский язык и культура речи")
-        ],
-        [InlineKeyboardButton(text="Другое (ввести вручную)", callback_data="subject_other")]
-    ]
+    subject_buttons = [InlineKeyboardButton(text=label, callback_data=f"subject_{name}") for label, name in SUBJECTS]
+    buttons = [subject_buttons[i:i + 2] for i in range(0, len(subject_buttons), 2)]
+    buttons.append([InlineKeyboardButton(text="Другое (ввести вручную)", callback_data="subject_other")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@order_keyboard
 def get_skip_keyboard(prefix: str):
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➡️ Пропустить", callback_data=f"skip_{prefix}")]
     ])
     
+@static_keyboard
 def get_confirmation_keyboard():
     buttons = [
         [InlineKeyboardButton(text="✅ Подтвердить", callback_data="confirm_order")],
@@ -403,6 +479,7 @@ def get_confirmation_keyboard():
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@order_keyboard
 def get_admin_final_approval_keyboard(order_id, price):
     buttons = [
         [InlineKeyboardButton(text=f"✅ Утвердить и отправить ({price} ₽)", callback_data=f"final_approve_{order_id}_{price}")],
@@ -411,6 +488,7 @@ def get_admin_final_approval_keyboard(order_id, price):
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@static_keyboard
 def get_skip_comment_keyboard():
     buttons = [
         [InlineKeyboardButton(text="➡️ Пропустить", callback_data="skip_comment")]
@@ -418,33 +496,47 @@ def get_skip_comment_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 def get_admin_order_keyboard(order, show_materials_button=True):
-    buttons = []
     if 'order_id' not in order:
         # Возвращаем только кнопку 'Назад', чтобы не было KeyError
-        buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_back")])
-        return InlineKeyboardMarkup(inline_keyboard=buttons)
-    status = order.get('status')
-    executor_is_admin = str(order.get('executor_id')) == str(ADMIN_ID)
+        return get_admin_back_keyboard()
+    has_files = bool(order.get('guidelines_file') or order.get('task_file') or order.get('example_file') or order.get('task_text'))
+    return _admin_order_keyboard(
+        order['order_id'],
+        order.get('status'),
+        str(order.get('executor_id')) == str(ADMIN_ID),
+        has_files,
+        show_materials_button,
+    )
+
+@static_keyboard
+def get_admin_back_keyboard():
+    return InlineKeyboardMarkup(inline_keyboard=[[InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_back")]])
+
+@order_keyboard
+def _admin_order_keyboard(order_id, status, executor_is_admin, has_files, show_materials_button):
+    buttons = []
     # Кнопка 'Выбрать исполнителя' только если статус 'Рассматривается' и исполнитель не админ
     if status == "Рассматривается" and not executor_is_admin:
         buttons.append([
-            InlineKeyboardButton(text="👤 Выбрать исполнителя", callback_data=f"assign_executor_{order['order_id']}")
+            InlineKeyboardButton(text="👤 Выбрать исполнителя", callback_data=f"assign_executor_{order_id}")
+        ])
+        buttons.append([
+            InlineKeyboardButton(text="📣 Разослать нескольким", callback_data=f"offer_round_start_{order_id}")
         ])
     # Кнопка 'Взять заказ' если статус 'Рассматривается' или 'Ожидает подтверждения'
     if status in ["Рассматривается", "Ожидает подтверждения"]:
         buttons.append([
-            InlineKeyboardButton(text="❇️ Взять заказ", callback_data=f"admin_self_take_{order['order_id']}")
+            InlineKeyboardButton(text="❇️ Взять заказ", callback_data=f"admin_self_take_{order_id}")
         ])
     # Кнопка "Сохранить в таблицу"
-    buttons.append([InlineKeyboardButton(text="📊 Сохранить в таблицу", callback_data=f"admin_save_to_gsheet:{order['order_id']}")])
+    buttons.append([InlineKeyboardButton(text="📊 Сохранить в таблицу", callback_data=f"admin_save_to_gsheet:{order_id}")])
     # Кнопка "Удалить заявку"
-    buttons.append([InlineKeyboardButton(text="❌ Отказаться от заявки", callback_data=f"admin_delete_order:{order['order_id']}")])
+    buttons.append([InlineKeyboardButton(text="❌ Отказаться от заявки", callback_data=f"admin_delete_order:{order_id}")])
     # Кнопка "Посмотреть материалы заказа"
-    has_files = order.get('guidelines_file') or order.get('task_file') or order.get('example_file') or order.get('task_text')
     if show_materials_button and has_files:
-        buttons.append([InlineKeyboardButton(text="📎 Посмотреть материалы заказа", callback_data=f"admin_show_materials:{order['order_id']}")])
+        buttons.append([InlineKeyboardButton(text="📎 Посмотреть материалы заказа", callback_data=f"admin_show_materials:{order_id}")])
     if not show_materials_button:
-        buttons.append([InlineKeyboardButton(text="⬅️ Скрыть материалы", callback_data=f"admin_hide_materials:{order['order_id']}")])
+        buttons.append([InlineKeyboardButton(text="⬅️ Скрыть материалы", callback_data=f"admin_hide_materials:{order_id}")])
     # Кнопка 'Назад' всегда последней
     buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_back")])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -468,6 +560,78 @@ async def cmd_admin_panel(message: Message, state: FSMContext):
         reply_markup=get_admin_keyboard()
     )
 
+@admin_router.message(Command("throttle"))
+async def cmd_throttle_stats(message: Message):
+    if message.from_user.id != int(ADMIN_ID):
+        return
+    stats = throttling.stats()
+    lines = ["<b>Ограничение частоты запросов</b>", ""]
+    for kind in THROTTLE_RATES:
+        lines.append(f"{kind}: пропущено {stats['passed'].get(kind, 0)}, отброшено {stats['throttled'].get(kind, 0)}")
+    lines.append("")
+    lines.append(f"Пользователей под ограничением: {stats['throttled_users']}")
+    lines.append(f"Активных бакетов: {stats['buckets']}")
+    lines.append(f"Отброшено повторов: {idempotency.duplicates}")
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+@admin_router.message(Command("load"))
+async def cmd_scheduler_stats(message: Message):
+    if message.from_user.id != int(ADMIN_ID):
+        return
+    stats = update_scheduler.stats()
+    lines = [f"<b>Обработчики:</b> занято {stats['busy']} из {stats['workers']}", ""]
+    for name, cls in stats["classes"].items():
+        lines.append(
+            f"{name}: в очереди {cls['queued']}, обработано {cls['served']}, "
+            f"ожидание p95 {cls['p95_wait_ms']} мс, макс {cls['max_wait_ms']} мс"
+        )
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+@admin_router.message(Command("analytics"))
+async def cmd_analytics(message: Message):
+    if message.from_user.id != int(ADMIN_ID):
+        return
+    try:
+        snapshot = await analytics.take()
+        result = await run_blocking(analytics.compute, snapshot)
+    except MissingDependencyError as e:
+        await message.answer(str(e))
+        return
+    # отчёт может не влезть в одно сообщение (4096 символов) — режем по разделам
+    chunk = ""
+    for section in analytics.render(result, analytics.executor_names()).split("\n\n"):
+        if chunk and len(chunk) + len(section) + 2 > 4096:
+            await message.answer(chunk, parse_mode="HTML")
+            chunk = ""
+        chunk = f"{chunk}\n\n{section}" if chunk else section
+    await message.answer(chunk, parse_mode="HTML")
+
+EXPORT_HELP = (
+    "Выгрузка заявок: /export [csv|xlsx|parquet] [status=\"Выполнена,В работе\"] "
+    "[from=01.06.2025] [to=30.06.2025] [executor=ID]"
+)
+
+@admin_router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject):
+    if message.from_user.id != int(ADMIN_ID):
+        return
+    try:
+        fmt, filters = exporter.parse_args(shlex.split(command.args or ""))
+    except ValueError as e:
+        await message.answer(f"{e}\n\n{EXPORT_HELP}")
+        return
+    fd, path = tempfile.mkstemp(suffix=f".{fmt}")
+    os.close(fd)
+    try:
+        # снимок берём в цикле событий, выгрузку пишем в потоке
+        count = await run_blocking(exporter.export, path, fmt, snapshot_index(), **filters)
+        filename = f"orders-{datetime.now():%Y%m%d-%H%M}.{fmt}"
+        await message.answer_document(FSInputFile(path, filename=filename), caption=f"Выгружено заявок: {count}")
+    except MissingDependencyError as e:
+        await message.answer(str(e))
+    finally:
+        os.remove(path)
+
 async def show_admin_orders_list(message_or_callback):
     """Показывает список всех заказов для админа, используя edit_text для callback и answer для message."""
     user_id = message_or_callback.from_user.id
@@ -476,36 +640,72 @@ async def show_admin_orders_list(message_or_callback):
     orders = get_all_orders()
     if not orders:
         if hasattr(message_or_callback, 'message'):
-            await message_or_callback.message.edit_text("Пока нет ни одного заказа.")
+            await safe_edit(message_or_callback.message, "Пока нет ни одного заказа.")
         else:
             await message_or_callback.answer("Пока нет ни одного заказа.")
         return
 
     text = "Все заказы:"
     keyboard_buttons = []
-    for order in reversed(orders[-20:]): # Показываем последние 20
-        order_id = order['order_id']
-        order_status = order.get('status', 'N/A')
+    for order in map(Order.from_dict, reversed(orders[-20:])): # Показываем последние 20
+        order_status = order.status or 'N/A'
         emoji = STATUS_EMOJI_MAP.get(order_status, "📄")
-        work_type_raw = order.get('work_type', 'Заявка')
-        work_type = work_type_raw.replace('work_type_', '')
-        first_name = order.get('first_name', '')
-        last_name = order.get('last_name', '')
-        full_name = f"{first_name} {last_name}".strip()
-        username = order.get('username', 'N/A')
-        display_name = full_name if full_name else username
         # Добавляем статус после ФИО
-        button_text = f"{emoji} {work_type} №{order_id} - {order_status}"
-        keyboard_buttons.append([InlineKeyboardButton(text=button_text, callback_data=f"admin_view_order_{order_id}")])
+        button_text = f"{emoji} {order.work_type_title} №{order.order_id} - {order_status}"
+        keyboard_buttons.append([InlineKeyboardButton(text=button_text, callback_data=f"admin_view_order_{order.order_id}")])
     keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
     if hasattr(message_or_callback, 'message'):
-        try:
-            await message_or_callback.message.edit_text(text, reply_markup=keyboard)
-        except Exception:
-            await message_or_callback.message.answer(text, reply_markup=keyboard)
+        await safe_edit(message_or_callback.message, text, reply_markup=keyboard)
     else:
         await message_or_callback.answer(text, reply_markup=keyboard)
 
+async def _search_page(query: str, page: int):
+    """Текст и клавиатура страницы результатов /search."""
+    total, results = await search.search(query, page)
+    if not total:
+        return f"🔍 По запросу «{html.escape(query)}» ничего не найдено.", None
+    pages = (total + search.PAGE_SIZE - 1) // search.PAGE_SIZE
+    lines = [f"🔍 «{html.escape(query)}»: найдено {total}, страница {page + 1} из {pages}", ""]
+    buttons = []
+    for order, _ in results:
+        emoji = STATUS_EMOJI_MAP.get(order.status, "📄")
+        lines.append(f"{emoji} <b>№{order.order_id}</b> {html.escape(order.subject or '')} — {order.status}")
+        lines.append(f"<i>{html.escape(search.snippet(order, query))}</i>")
+        buttons.append([InlineKeyboardButton(text=f"№{order.order_id} {order.work_type_title}",
+                                             callback_data=f"admin_view_order_{order.order_id}")])
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="◀️", callback_data=f"search_page:{page - 1}"))
+    if page + 1 < pages:
+        nav.append(InlineKeyboardButton(text="▶️", callback_data=f"search_page:{page + 1}"))
+    if nav:
+        buttons.append(nav)
+    return "\n".join(lines), InlineKeyboardMarkup(inline_keyboard=buttons)
+
+@admin_router.message(Command("search"))
+async def cmd_search(message: Message, command: CommandObject, state: FSMContext):
+    if message.from_user.id != int(ADMIN_ID):
+        return
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("Поиск по тексту заданий и комментариям: /search слова запроса")
+        return
+    # запрос держим в FSM — в callback_data он может не поместиться
+    await state.update_data(search_query=query)
+    text, keyboard = await _search_page(query, 0)
+    await message.answer(text, parse_mode="HTML", reply_markup=keyboard)
+
+@admin_router.callback_query(F.data.startswith("search_page:"))
+async def search_page_handler(callback: CallbackQuery, state: FSMContext):
+    if callback.from_user.id != int(ADMIN_ID): return
+    query = (await state.get_data()).get("search_query")
+    if not query:
+        await callback.answer("Запрос устарел, повторите /search.", show_alert=True)
+        return
+    text, keyboard = await _search_page(query, int(callback.data.split(":")[1]))
+    await safe_edit(callback.message, text, parse_mode="HTML", reply_markup=keyboard)
+    await callback.answer()
+
 @admin_router.message(F.text == "📦 Все заказы")
 async def show_all_orders_handler(message_or_callback):
     await show_admin_orders_list(message_or_callback)
@@ -520,110 +720,47 @@ async def admin_view_order_handler(callback: CallbackQuery, state: FSMContext):
         await callback.answer("Заказ не найден.", show_alert=True)
         return
 
-    status = target_order.get('status')
+    order = Order.from_dict(target_order)
+    status = order.status
 
-    if status == 'Ожидает подтверждения' and 'executor_offer' in target_order:
-        offer = target_order['executor_offer']
-        executor_full_name = offer.get('executor_full_name', 'Без имени')
-        price = offer.get('price')
-        deadline = offer.get('deadline', 'N/A')
-        executor_comment = offer.get('executor_comment', 'Нет')
-        subject = target_order.get('subject', 'Не указан')
-        deadline_str = pluralize_days(deadline)
+    if status == OrderStatus.WAITING_CONFIRMATION and order.executor_offer:
+        admin_notification = render.render(render.ADMIN_OFFER, order)
+        keyboard = get_admin_final_approval_keyboard(order_id, order.executor_offer.price)
+        await safe_edit(callback.message, admin_notification, parse_mode="HTML", reply_markup=keyboard)
 
-        admin_notification = f"""✅ Исполнитель {executor_full_name} готов взяться за заказ по предмету \"{subject}\"
-    
-<b>Предложенные условия:</b>
-💰 <b>Цена:</b> {price} ₽
-⏳ <b>Срок:</b> {deadline_str}
-💬 <b>Комментарий исполнителя:</b> {executor_comment or 'Нет'}"""
-
-        keyboard = get_admin_final_approval_keyboard(order_id, price)
-        try:
-            await callback.message.edit_text(admin_notification, parse_mode="HTML", reply_markup=keyboard)
-        except Exception:
-            await callback.message.answer(admin_notification, parse_mode="HTML", reply_markup=keyboard)
-
-    elif status == 'Отправлен на проверку':
-        submitted_work = target_order.get('submitted_work')
-        submitted_at = target_order.get('submitted_at', '—')
-        subject = target_order.get('subject', 'Не указан')
-        work_type = target_order.get('work_type', 'Не указан').replace('work_type_', '')
-        admin_text = f"Исполнитель выполнил заказ по предмету <b>{subject}</b>\nТип работы: <b>{work_type}</b>\nДата выполнения: <b>{submitted_at}</b>"
+    elif status == OrderStatus.SUBMITTED:
+        submitted_work = order.submitted_work
+        admin_text = f"Исполнитель выполнил заказ по предмету <b>{order.subject or 'Не указан'}</b>\nТип работы: <b>{order.work_type_title}</b>\nДата выполнения: <b>{order.submitted_at or '—'}</b>"
         admin_keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="Проверить работу", callback_data=f"admin_check_work_{order_id}")],
             [InlineKeyboardButton(text="Утвердить работу", callback_data=f"admin_approve_work_{order_id}")],
             [InlineKeyboardButton(text="Отказаться от работы", callback_data=f"admin_reject_work_{order_id}")]
         ])
-        if submitted_work and submitted_work.get('file_id'):
+        if submitted_work and submitted_work.file_id:
             await callback.message.delete()
             await bot.send_document(
                 callback.from_user.id,
-                submitted_work['file_id'],
+                submitted_work.file_id,
                 caption=admin_text,
                 parse_mode="HTML",
                 reply_markup=admin_keyboard
             )
         else:
-            await callback.message.edit_text(admin_text, parse_mode="HTML", reply_markup=admin_keyboard)
+            await safe_edit(callback.message, admin_text, parse_mode="HTML", reply_markup=admin_keyboard)
             
-    elif status == "Утверждено администратором":
-        full_name = get_full_name(target_order)
-        header = f"Детали заказа №{order_id} от клиента ({full_name})\n"
-        if target_order.get('creation_date'):
-            header += f"Дата создания: {target_order.get('creation_date')}\n"
-        
-        group = target_order.get("group_name", "Не указана")
-        university = target_order.get("university_name", "Не указан")
-        teacher = target_order.get("teacher_name", "Не указан")
-        gradebook = target_order.get("gradebook", "Не указан")
-        subject = target_order.get("subject", "Не указан")
-        work_type_key = target_order.get("work_type", "N/A").replace("work_type_", "")
-        work_type_str = work_type_key if work_type_key != 'other' else target_order.get('work_type_other_name', 'Другое')
-        guidelines = '✅ Да' if target_order.get('has_guidelines') else '❌ Нет'
-        task = '✅ Прикреплено' if target_order.get('task_file') or target_order.get('task_text') else '❌ Нет'
-        example = '✅ Да' if target_order.get('has_example') else '❌ Нет'
-        deadline = target_order.get('deadline', 'Не указана')
-
-        details_text = f"""{header}
-Группа: {group}
-ВУЗ: {university}
-Преподаватель: {teacher}
-Номер зачетки: {gradebook}
-Предмет: {subject}
-Тип работы: {work_type_str}
-Методичка: {guidelines}
-Задание: {task}
-Пример: {example}
-Дедлайн: {deadline}"""
+    elif status == OrderStatus.APPROVED:
+        details_text = render.render(render.ADMIN_APPROVED, order)
 
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
             [InlineKeyboardButton(text="⬅️ Вернуться к заявкам", callback_data="admin_back")]
         ])
         
-        try:
-            await callback.message.edit_text(details_text, reply_markup=keyboard)
-        except Exception:
-            await callback.message.answer(details_text, reply_markup=keyboard)
+        await safe_edit(callback.message, details_text, reply_markup=keyboard)
 
     else: # --- Обычное поведение для остальных статусов ---
-        summary_text = await build_summary_text(target_order)
-        full_name = f"{target_order.get('first_name', '')} {target_order.get('last_name', '')}".strip()
-        header = f"\n<b>Детали заказа №{order_id} от клиента ({full_name})</b>\n"
-        if target_order.get('creation_date'):
-            header += f"<b>Дата создания:</b> {target_order.get('creation_date')}\n"
-        details_text = header + "\n" + summary_text
-        show_materials_button = bool(
-            target_order.get("guidelines_file") or
-            target_order.get("task_file") or
-            target_order.get("task_text") or
-            target_order.get("example_file")
-        )
+        details_text = render.render(render.ADMIN_DETAIL, order)
         keyboard = get_admin_order_keyboard(target_order, show_materials_button=True)
-        try:
-            await callback.message.edit_text(details_text, reply_markup=keyboard, parse_mode="HTML")
-        except Exception:
-            await callback.message.answer(details_text, reply_markup=keyboard, parse_mode="HTML")
+        await safe_edit(callback.message, details_text, reply_markup=keyboard, parse_mode="HTML")
 
     await callback.answer()
 
@@ -647,73 +784,107 @@ async def assign_executor_start_handler(callback: CallbackQuery, state: FSMConte
     await state.update_data(order_id=order_id)
     executors = get_executors_list()
     if executors:
-        await callback.message.edit_text(
+        await safe_edit(callback.message,
             "Выберите исполнителя для назначения:",
             reply_markup=get_executors_assign_keyboard(order_id)
         )
         # Не ставим состояние FSM здесь!
     else:
-        await callback.message.edit_text(
+        await safe_edit(callback.message,
             "Ваш список исполнителей пуст.\n\nВы можете ввести ID исполнителя вручную:")
         await state.set_state(AssignExecutor.waiting_for_id)
     await callback.answer()
 
-async def send_order_to_executor(message_or_callback, order_id: int, executor_id: int):
-    """Находит заказ, присваивает исполнителя и отправляет ему уведомление (только через orders.json)."""
-    orders = get_all_orders()
-    target_order = None
-    for order in orders:
-        if order.get("order_id") == order_id:
-            target_order = order
-            break
-    if not target_order:
-        text = f"Критическая ошибка: заказ №{order_id} не найден для обновления."
-        if hasattr(message_or_callback, 'message'):
-            await message_or_callback.message.answer(text)
+async def send_order_to_executor(message_or_callback, order_id: int, executor_id: int) -> bool:
+    """Находит заказ, присваивает исполнителя и отправляет ему уведомление (только через orders.json).
+
+    Отчёт уходит в message_or_callback, а если он None (автоназначение) — админу.
+    Возвращает True, если предложение доставлено.
+    """
+    async def report(text, **kwargs):
+        if message_or_callback is None:
+            await bot.send_message(ADMIN_ID, text, **kwargs)
+        elif hasattr(message_or_callback, 'message'):
+            await message_or_callback.message.answer(text, **kwargs)
         else:
-            await message_or_callback.answer(text)
-        return
+            await message_or_callback.answer(text, **kwargs)
 
-    target_order['status'] = "Ожидает подтверждения"
-    target_order['executor_id'] = executor_id
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
+    target_order = fire(order_id, Event.OFFER_TO_EXECUTOR, executor_id=executor_id, offer_due=offer_timeouts.due_time())
+    if not target_order:
+        await report(f"Заказ №{order_id} не найден или уже передан исполнителю.")
+        return False
 
-    work_type = target_order.get('work_type', 'N/A').replace('work_type_', '')
-    subject = target_order.get('subject', 'Не указан')
-    deadline = target_order.get('deadline', 'Не указан')
-    executor_caption = (
-        f"📬 Вам предложен новый заказ по предмету <b>{subject}</b>\n\n"
-        f"📝 <b>Тип работы:</b> {work_type}\n"
-        f"🗓 <b>Срок сдачи:</b> {deadline}\n\n"
-        "Пожалуйста, ознакомьтесь с материалами заявки и примите решение."
-    )
-    executor_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📎 Посмотреть материалы заказа", callback_data=f"executor_show_materials:{order_id}")],
-        [InlineKeyboardButton(text="✅ Готов взяться", callback_data=f"executor_accept_{order_id}"),
-         InlineKeyboardButton(text="❌ Отказаться", callback_data=f"executor_refuse_{order_id}")],
-    ])
+    executor_caption = render.render(render.EXECUTOR_INVITE, target_order)
+    executor_keyboard = get_executor_invite_keyboard(order_id)
     try:
         await bot.send_message(executor_id, executor_caption, parse_mode="HTML", reply_markup=executor_keyboard)
-        success_text = f"✅ Предложение по заказу №{order_id} отправлено исполнителю с ID {executor_id}."
-        if hasattr(message_or_callback, 'message'):
-            await message_or_callback.message.answer(success_text)
-        else:
-            await message_or_callback.answer(success_text)
+        await report(f"✅ Предложение по заказу №{order_id} отправлено исполнителю с ID {executor_id}.")
+        return True
     except Exception as e:
         error_text = f"⚠️ Не удалось отправить уведомление исполнителю (ID: {executor_id}).\n\n<b>Ошибка:</b> {e}"
-        target_order['status'] = "Рассматривается"
-        target_order.pop('executor_id', None)
-        with open("orders.json", "w", encoding="utf-8") as f:
-            json.dump(orders, f, ensure_ascii=False, indent=4)
-        if hasattr(message_or_callback, 'message'):
-            await message_or_callback.message.answer(error_text, parse_mode="HTML")
+        fire(order_id, Event.OFFER_UNDELIVERED)
+        await report(error_text, parse_mode="HTML")
+        return False
+
+async def auto_assign_order(order_id: int, exclude=()) -> bool:
+    """Автоназначение: предлагает заказ следующему подходящему исполнителю."""
+    order = get_order(order_id)
+    if order is None or order.status != OrderStatus.NEW:
+        return False
+    executors = get_executors_list()
+    tried = set(exclude)
+    for _ in range(AUTO_ASSIGN_ATTEMPTS):
+        executor_id = autoassign.pick(order, executors, exclude=tried)
+        if executor_id is None:
+            break
+        tried.add(executor_id)
+        if await send_order_to_executor(None, order_id, executor_id):
+            return True
+        autoassign.release(executor_id, order_id)
+        order = get_order(order_id)
+        if order is None or order.status != OrderStatus.NEW:
+            return False
+    await bot.send_message(ADMIN_ID, f"🤖 Для заказа №{order_id} не нашлось свободного исполнителя, назначьте вручную.")
+    return False
+
+async def expire_offer(order: Order):
+    """Исполнитель не ответил на приглашение вовремя: заказ забирается и передаётся дальше."""
+    order_id = order.order_id
+    offer_round = offer_rounds.get_round(order)
+    if offer_round is not None:
+        if offer_round['offers']:
+            await bot.send_message(ADMIN_ID, f"⏰ Время на отклики по заказу №{order_id} вышло. "
+                                             f"Получено предложений: {len(offer_round['offers'])}, выберите одно из них.")
+        elif offer_rounds.cancel(order_id):
+            await bot.send_message(ADMIN_ID, f"⏰ Никто из приглашённых не откликнулся на заказ №{order_id}. Заказ снова в поиске.")
+        return
+    executor_id = order.executor_id
+    target_order = fire(order_id, Event.OFFER_EXPIRED)
+    if not target_order:
+        return
+    try:
+        await bot.send_message(executor_id, f"⏰ Время на ответ по заказу №{order_id} истекло, предложение отменено.")
+    except Exception:
+        pass
+    expired = target_order.get('expired_executors', [])
+    if len(expired) <= offer_timeouts.OFFER_REOFFER_LIMIT:
+        if autoassign.is_enabled():
+            # при неудаче auto_assign_order сам сообщит админу
+            await auto_assign_order(order_id, exclude=expired)
+            return
         else:
-            await message_or_callback.answer(error_text, parse_mode="HTML")
+            candidates = [ex['id'] for ex in matching.rank(get_order(order_id), get_executors_list()) if ex['id'] not in expired]
+            if candidates and await send_order_to_executor(None, order_id, candidates[0]):
+                return
+    await bot.send_message(
+        ADMIN_ID,
+        f"⏰ Исполнитель {executor_id} не ответил на предложение по заказу №{order_id}. Заказ снова в поиске.",
+        reply_markup=get_admin_order_keyboard(target_order)
+    )
 
 @admin_router.callback_query(F.data.startswith("assign_executor_select_"))
 async def assign_executor_select_handler(callback: CallbackQuery, state: FSMContext):
-    print("assign_executor_select_handler called", callback.data)
+    logging.debug("Выбор исполнителя: %s", callback.data)
     # Проверяем, что после assign_executor_select_ действительно число (id)
     try:
         executor_id = int(callback.data.split("_")[-1])
@@ -722,60 +893,30 @@ async def assign_executor_select_handler(callback: CallbackQuery, state: FSMCont
         return
     data = await state.get_data()
     order_id = data.get('order_id')
-    orders = get_all_orders()
-    target_order = None
-    for order in orders:
-        if order.get("order_id") == order_id:
-            target_order = order
-            break
+    # Назначаем исполнителя и меняем статус
+    target_order = fire(order_id, Event.OFFER_TO_EXECUTOR, executor_id=executor_id, offer_due=offer_timeouts.due_time())
     if not target_order:
-        await callback.message.answer("Критическая ошибка: заказ не найден для обновления.")
+        await callback.message.answer("Заказ не найден или уже передан исполнителю.")
         await state.clear()
         return
-    # Назначаем исполнителя и меняем статус
-    target_order['status'] = "Ожидает подтверждения"
-    target_order['executor_id'] = executor_id
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
-    try:
-        await callback.message.edit_text(
-            f"✅ Предложение отправлено исполнителю с ID {executor_id} для заказа №{order_id}.",
-            reply_markup=None
-        )
-    except Exception as e:
-        if "message is not modified" in str(e):
-            pass
-        else:
-            raise
-    # Уведомление для исполнителя
-    work_type = target_order.get('work_type', 'N/A').replace('work_type_', '')
-    subject = target_order.get('subject', 'Не указан')
-    deadline = target_order.get('deadline', 'Не указан')
-    executor_caption = (
-        f"📬 Вам предложен новый заказ по предмету <b>{subject}</b>\n\n"
-        f"📝 <b>Тип работы:</b> {work_type}\n"
-        f"🗓 <b>Срок сдачи:</b> {deadline}\n\n"
-        "Пожалуйста, ознакомьтесь с материалами заявки и примите решение."
+    await safe_edit(callback.message,
+        f"✅ Предложение отправлено исполнителю с ID {executor_id} для заказа №{order_id}.",
+        reply_markup=None
     )
-    executor_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📎 Посмотреть материалы заказа", callback_data=f"executor_show_materials:{order_id}")],
-        [InlineKeyboardButton(text="✅ Готов взяться", callback_data=f"executor_accept_{order_id}"),
-         InlineKeyboardButton(text="❌ Отказаться", callback_data=f"executor_refuse_{order_id}")]
-    ])
+    # Уведомление для исполнителя
+    executor_caption = render.render(render.EXECUTOR_INVITE, target_order)
+    executor_keyboard = get_executor_invite_keyboard(order_id)
     try:
         await bot.send_message(executor_id, executor_caption, parse_mode="HTML", reply_markup=executor_keyboard)
     except Exception as e:
         await callback.message.answer(f"⚠️ Не удалось отправить уведомление исполнителю (ID: {executor_id}). Ошибка: {e}")
-        target_order['status'] = "Рассматривается"
-        target_order.pop('executor_id', None)
-        with open("orders.json", "w", encoding="utf-8") as f:
-            json.dump(orders, f, ensure_ascii=False, indent=4)
+        fire(order_id, Event.OFFER_UNDELIVERED)
     await state.clear()
 
 @admin_router.callback_query(F.data == "assign_executor_manual")
 async def assign_executor_manual_handler(callback: CallbackQuery, state: FSMContext):
     await state.set_state(AssignExecutor.waiting_for_id)
-    await callback.message.edit_text("Введите Telegram ID исполнителя:")
+    await safe_edit(callback.message, "Введите Telegram ID исполнителя:")
     await callback.answer()
 
 @admin_router.message(AssignExecutor.waiting_for_id)
@@ -791,50 +932,23 @@ async def assign_executor_process_id_handler(message: Message, state: FSMContext
     order_id = data.get('order_id')
     
     # Находим и обновляем заказ
-    orders = get_all_orders()
-    target_order = None
-    for order in orders:
-        if order.get("order_id") == order_id:
-            order['status'] = "Ожидает подтверждения"
-            order['executor_id'] = executor_id
-            target_order = order
-            break
-
+    target_order = fire(order_id, Event.OFFER_TO_EXECUTOR, executor_id=executor_id, offer_due=offer_timeouts.due_time())
     if not target_order:
-        await message.answer("Критическая ошибка: заказ не найден для обновления.")
+        await message.answer("Заказ не найден или уже передан исполнителю.")
         await state.clear()
         return
 
-    # Сохраняем обновленный список заказов
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
-    
     # Уведомляем всех
     await message.answer(f"✅ Предложение отправлено исполнителю с ID {executor_id} для заказа №{order_id}.")
     
     # Уведомление для исполнителя
-    work_type = target_order.get('work_type', 'N/A').replace('work_type_', '')
-    subject = target_order.get('subject', 'Не указан')
-    deadline = target_order.get('deadline', 'Не указан')
-    executor_caption = (
-        f"📬 Вам предложен новый заказ по предмету <b>{subject}</b>\n\n"
-        f"📝 <b>Тип работы:</b> {work_type}\n"
-        f"🗓 <b>Срок сдачи:</b> {deadline}\n\n"
-        "Пожалуйста, ознакомьтесь с материалами заявки и примите решение."
-    )
-    executor_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📎 Посмотреть материалы заказа", callback_data=f"executor_show_materials:{order_id}")],
-        [InlineKeyboardButton(text="✅ Готов взяться", callback_data=f"executor_accept_{order_id}"),
-         InlineKeyboardButton(text="❌ Отказаться", callback_data=f"executor_refuse_{order_id}")]
-    ])
+    executor_caption = render.render(render.EXECUTOR_INVITE, target_order)
+    executor_keyboard = get_executor_invite_keyboard(order_id)
     try:
         await bot.send_message(executor_id, executor_caption, parse_mode="HTML", reply_markup=executor_keyboard)
     except Exception as e:
         await message.answer(f"⚠️ Не удалось отправить уведомление исполнителю (ID: {executor_id}). Ошибка: {e}")
-        target_order['status'] = "Рассматривается"
-        target_order.pop('executor_id', None)
-        with open("orders.json", "w", encoding="utf-8") as f:
-            json.dump(orders, f, ensure_ascii=False, indent=4)
+        fire(order_id, Event.OFFER_UNDELIVERED)
     await state.clear()
 
 
@@ -844,21 +958,15 @@ async def send_order_files_to_user(user_id: int, order_data: dict, with_details:
         details_text = await build_summary_text(order_data)
         await bot.send_message(user_id, "<b>Детали заказа:</b>\n\n" + details_text, parse_mode="HTML")
 
-    async def send_file(file_data, caption):
-        if not file_data: return
-        if file_data['type'] == 'photo':
-            await bot.send_photo(user_id, file_data['id'], caption=caption)
-        else:
-            await bot.send_document(user_id, file_data['id'], caption=caption)
+    await send_materials(bot, user_id, order_data)
 
-    await send_file(order_data.get('guidelines_file'), "📄 Методичка")
-    
-    if order_data.get('task_file'):
-        await send_file(order_data.get('task_file'), "📑 Задание")
-    elif order_data.get('task_text'):
-        await bot.send_message(user_id, f"📑 Текст задания:\n\n{order_data['task_text']}")
-    
-    await send_file(order_data.get('example_file'), "📄 Пример работы")
+@order_keyboard
+def get_executor_invite_keyboard(order_id):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📎 Посмотреть материалы заказа", callback_data=f"executor_show_materials:{order_id}")],
+        [InlineKeyboardButton(text="✅ Готов взяться", callback_data=f"executor_accept_{order_id}"),
+         InlineKeyboardButton(text="❌ Отказаться", callback_data=f"executor_refuse_{order_id}")],
+    ])
 
 # --- Вспомогательная функция для получения полного имени пользователя ---
 def get_full_name(user_or_dict):
@@ -874,25 +982,16 @@ def get_full_name(user_or_dict):
 @executor_router.callback_query(F.data.startswith("executor_accept_"))
 async def executor_accept_handler(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split("_")[-1])
-    orders = get_all_orders()
-    target_order = None
-    for o in orders:
-        if o.get("order_id") == order_id:
-            if o.get('executor_id') != callback.from_user.id:
-                 await callback.answer("Это предложение не для вас или оно уже неактуально.", show_alert=True)
-                 return
-            o['status'] = "Исполнитель найден"
-            target_order = o
-            break
-    if not target_order:
+    order = get_order(order_id)
+    if order and order.executor_id != callback.from_user.id:
+        await callback.answer("Это предложение не для вас или оно уже неактуально.", show_alert=True)
+        return
+    if not fire(order_id, Event.EXECUTOR_ACCEPT):
         await callback.answer("Это предложение уже неактуально.", show_alert=True)
         return
-    # Сохраняем изменение статуса
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
     await state.set_state(ExecutorResponse.waiting_for_price)
     await state.update_data(order_id=order_id)
-    await callback.message.edit_text("Отлично! Укажите вашу цену:", reply_markup=get_price_keyboard(order_id))
+    await safe_edit(callback.message, "Отлично! Укажите вашу цену:", reply_markup=get_price_keyboard(order_id))
     await callback.answer()
 
 @executor_router.callback_query(F.data.startswith("price_"), ExecutorResponse.waiting_for_price)
@@ -900,18 +999,17 @@ async def executor_price_handler(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     order_id = data.get('order_id')
     if callback.data == "price_manual":
-        await callback.message.edit_text("Пожалуйста, введите цену вручную (только число):", reply_markup=get_price_keyboard(order_id))
+        await safe_edit(callback.message, "Пожалуйста, введите цену вручную (только число):", reply_markup=get_price_keyboard(order_id))
         return
     price = callback.data.split("_")[-1]
     await state.update_data(price=price)
     await state.set_state(ExecutorResponse.waiting_for_deadline)
     # Получаем дедлайн от клиента
-    from shared import get_all_orders
     orders = get_all_orders()
     order = next((o for o in orders if o.get('order_id') == order_id), None)
     client_deadline = order.get('deadline', 'Не указан') if order else 'Не указан'
     text = f"Цена принята. Теперь укажите срок выполнения: ⏳\nДедлайн: до {client_deadline}"
-    await callback.message.edit_text(text, reply_markup=get_deadline_keyboard())
+    await safe_edit(callback.message, text, reply_markup=get_deadline_keyboard())
     await callback.answer()
 
 @executor_router.message(ExecutorResponse.waiting_for_price)
@@ -928,13 +1026,14 @@ async def executor_price_manual_handler(message: Message, state: FSMContext):
 @executor_router.callback_query(F.data.startswith("deadline_"), ExecutorResponse.waiting_for_deadline)
 async def executor_deadline_handler(callback: CallbackQuery, state: FSMContext):
     if callback.data == "deadline_manual":
-        await callback.message.edit_text("Пожалуйста, введите срок выполнения вручную:")
+        await safe_edit(callback.message, "Пожалуйста, введите срок выполнения вручную:")
         return
     deadline = callback.data.split("_", 1)[-1]
     await state.update_data(deadline=deadline)
     await state.set_state(ExecutorResponse.waiting_for_comment)
-    await callback.message.edit_text("Добавьте комментарий к заказу (или пропустите этот шаг):", reply_markup=get_executor_comment_keyboard())
+    await safe_edit(callback.message, "Добавьте комментарий к заказу (или пропустите этот шаг):", reply_markup=get_executor_comment_keyboard())
     await callback.answer()
+@static_keyboard
 def get_executor_comment_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➡️ Пропустить", callback_data="skip_executor_comment")]
@@ -1005,15 +1104,18 @@ async def executor_skip_comment_handler(callback: CallbackQuery, state: FSMConte
            f"<b>🗓 Срок:</b> {deadline_str}\n\n" \
            f"<b>💬 Комментарий:</b> Нет"
     await state.set_state(ExecutorResponse.waiting_for_confirm)
-    await callback.message.edit_text(text, parse_mode="HTML", reply_markup=get_executor_final_confirm_keyboard(order_id))
+    await safe_edit(callback.message, text, parse_mode="HTML", reply_markup=get_executor_final_confirm_keyboard(order_id))
     await callback.answer()
 
+OFFER_SENT_TEXT = "✅ Ваши условия отправлены администратору. Ожидайте подтверждения."
+OFFER_STALE_TEXT = "Это предложение уже неактуально или условия уже отправлены."
+
 # --- Обработчик кнопки 'Отправить' ---
 @executor_router.callback_query(F.data.startswith("executor_send_offer:"), ExecutorResponse.waiting_for_confirm)
 async def executor_send_offer_handler(callback: CallbackQuery, state: FSMContext):
     fsm_data = await state.get_data()
-    await send_offer_to_admin(callback.from_user, fsm_data)
-    await callback.message.edit_text("✅ Ваши условия отправлены администратору. Ожидайте подтверждения.")
+    sent = await send_offer_to_admin(callback.from_user, fsm_data)
+    await safe_edit(callback.message, OFFER_SENT_TEXT if sent else OFFER_STALE_TEXT)
     await state.clear()
     await callback.answer()
 
@@ -1023,16 +1125,16 @@ async def executor_send_offer_handler(callback: CallbackQuery, state: FSMContext
 async def executor_comment_handler(message: Message, state: FSMContext):
     await state.update_data(executor_comment=message.text)
     fsm_data = await state.get_data()
-    await send_offer_to_admin(message.from_user, fsm_data)
-    await message.answer("✅ Ваши условия отправлены администратору. Ожидайте подтверждения.")
+    sent = await send_offer_to_admin(message.from_user, fsm_data)
+    await message.answer(OFFER_SENT_TEXT if sent else OFFER_STALE_TEXT)
     await state.clear()
 
 @executor_router.callback_query(F.data == "skip_executor_comment", ExecutorResponse.waiting_for_comment)
 async def executor_skip_comment_handler(callback: CallbackQuery, state: FSMContext):
     await state.update_data(executor_comment="")
     fsm_data = await state.get_data()
-    await send_offer_to_admin(callback.from_user, fsm_data)
-    await callback.message.edit_text("✅ Ваши условия отправлены администратору. Ожидайте подтверждения.")
+    sent = await send_offer_to_admin(callback.from_user, fsm_data)
+    await safe_edit(callback.message, OFFER_SENT_TEXT if sent else OFFER_STALE_TEXT)
     await state.clear()
     await callback.answer()
 
@@ -1045,7 +1147,7 @@ async def admin_change_price_start(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split("_")[-1])
     await state.set_state(AdminApproval.waiting_for_new_price)
     await state.update_data(order_id=order_id, message_id=callback.message.message_id)
-    await callback.message.edit_text("Введите новую цену (только число):")
+    await safe_edit(callback.message, "Введите новую цену (только число):")
     await callback.answer()
 
 @admin_router.message(AdminApproval.waiting_for_new_price)
@@ -1069,8 +1171,7 @@ async def admin_process_new_price(message: Message, state: FSMContext):
             executor_full_name = order['executor_offer'].get('executor_full_name', 'Без имени')
             executor_deadline = order['executor_offer'].get('deadline', 'N/A')
             break
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
+    save_orders(orders)
         
     # Обновляем сообщение у админа
     executor_deadline_str = pluralize_days(executor_deadline)
@@ -1088,6 +1189,7 @@ async def admin_process_new_price(message: Message, state: FSMContext):
         parse_mode="HTML",
         reply_markup=get_admin_final_approval_keyboard(order_id, new_price)
     )
+    forget(message.chat.id, message_id)
     await message.delete() # Удаляем сообщение с новой ценой от админа
     await state.clear()
 
@@ -1098,31 +1200,30 @@ async def admin_final_approve(callback: CallbackQuery, state: FSMContext):
     order_id = int(parts[2])
     price = int(parts[3])
 
-    orders = get_all_orders()
-    target_order = None
-    for order in orders:
-        if order.get("order_id") == order_id:
-            order['status'] = "Ожидает оплаты"
-            order['final_price'] = price
-            target_order = order
-            break
-    
+    target_order = fire(order_id, Event.ADMIN_APPROVE_OFFER, final_price=price)
     if not target_order:
-        await callback.answer("Ошибка: заказ не найден", show_alert=True)
+        await callback.answer("Заказ не найден или условия уже рассмотрены.", show_alert=True)
         return
-        
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
 
+    for warning in await notify_offer_approved(target_order, price):
+        await callback.message.answer(warning)
+
+    await safe_edit(callback.message, f"✅ Предложение по заказу №{order_id} на сумму {price} ₽ отправлено клиенту. Ожидаем оплату...")
+    await callback.answer()
+
+
+async def notify_offer_approved(target_order: dict, price) -> list:
+    """Сообщает клиенту итоговые условия, а исполнителю — что они утверждены. Возвращает предупреждения."""
+    warnings = []
+    order_id = target_order.get('order_id')
     # Уведомление клиенту
     customer_id = target_order.get('user_id')
     if customer_id:
-        deadline = target_order.get('executor_offer', {}).get('deadline') or target_order.get('deadline', '')
+        order = Order.from_dict(target_order)
+        deadline = order.offered_deadline
         deadline_str = pluralize_days(deadline) if isinstance(deadline, str) and deadline.isdigit() else deadline
-        work_type = target_order.get('work_type', 'N/A').replace('work_type_', '')
-        subject = target_order.get('subject', 'Не указан')
         customer_text = f"""
-✅ Ваша заявка по предмету "{subject}"\nТип работы: {work_type}\nДедлайн: {deadline_str}
+✅ Ваша заявка по предмету "{order.subject or 'Не указан'}"\nТип работы: {order.work_type_title}\nДедлайн: {deadline_str}
 
 <b>Итоговая стоимость:</b> {price} ₽.
 <b>Срок:</b> {deadline_str}
@@ -1133,7 +1234,7 @@ async def admin_final_approve(callback: CallbackQuery, state: FSMContext):
         try:
             await bot.send_message(customer_id, customer_text, parse_mode="HTML", reply_markup=keyboard)
         except Exception:
-            await callback.message.answer(f"⚠️ Не удалось уведомить клиента {customer_id}")
+            warnings.append(f"⚠️ Не удалось уведомить клиента {customer_id}")
 
     # Уведомление исполнителю
     executor_id = target_order.get('executor_offer', {}).get('executor_id')
@@ -1142,33 +1243,20 @@ async def admin_final_approve(callback: CallbackQuery, state: FSMContext):
             subject = target_order.get('subject', 'Не указан')
             await bot.send_message(executor_id, f'✅ Администратор утвердил ваши условия по заказу.\nПредмет: "{subject}"\nОжидаем оплату от клиента.')
         except Exception:
-            await callback.message.answer(f"⚠️ Не удалось уведомить исполнителя {executor_id}")
-
-    await callback.message.edit_text(f"✅ Предложение по заказу №{order_id} на сумму {price} ₽ отправлено клиенту. Ожидаем оплату...")
-    await callback.answer()
+            warnings.append(f"⚠️ Не удалось уведомить исполнителя {executor_id}")
+    return warnings
 
 
 @admin_router.callback_query(F.data.startswith("final_reject_"))
 async def admin_final_reject(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split("_")[-1])
     
-    orders = get_all_orders()
-    target_order = None
-    executor_id = None
-    for order in orders:
-        if order.get("order_id") == order_id:
-            order['status'] = "Рассматривается" # Возвращаем к поиску
-            executor_id = order.get('executor_offer', {}).get('executor_id')
-            order.pop('executor_offer', None)
-            target_order = order
-            break
-
-    if not target_order:
-        await callback.answer("Ошибка: заказ не найден", show_alert=True)
+    order = get_order(order_id)
+    executor_id = order.executor_offer.executor_id if order and order.executor_offer else None
+    # Возвращаем к поиску
+    if not fire(order_id, Event.ADMIN_REJECT_OFFER):
+        await callback.answer("Заказ не найден или условия уже рассмотрены.", show_alert=True)
         return
-
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
     
     if executor_id:
         try:
@@ -1176,23 +1264,22 @@ async def admin_final_reject(callback: CallbackQuery, state: FSMContext):
         except Exception:
             pass # Не критично
 
-    await callback.message.edit_text(f"❌ Вы отклонили предложение исполнителя по заказу №{order_id}. Заказ снова в поиске.")
+    await safe_edit(callback.message, f"❌ Вы отклонили предложение исполнителя по заказу №{order_id}. Заказ снова в поиске.")
     await callback.answer()
 
 @admin_router.callback_query(F.data.startswith("admin_approve_work_"))
 async def admin_approve_work_handler(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split('_')[-1])
-    orders = get_all_orders()
-    target_order = next((o for o in orders if o.get('order_id') == order_id), None)
-
-    if not target_order or 'submitted_work' not in target_order:
+    order = get_order(order_id)
+    if not order or not order.submitted_work:
         await callback.answer("Работа не найдена или была отозвана.", show_alert=True)
         return
 
     # Меняем статус
-    target_order['status'] = "Утверждено администратором"
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
+    target_order = fire(order_id, Event.WORK_APPROVED)
+    if not target_order:
+        await callback.answer("Работа уже утверждена.", show_alert=True)
+        return
 
     # Отправляем клиенту
     customer_id = target_order.get('user_id')
@@ -1209,11 +1296,11 @@ async def admin_approve_work_handler(callback: CallbackQuery, state: FSMContext)
                 caption=caption,
                 reply_markup=keyboard
             )
-            await callback.message.edit_text(f"✅ Работа по заказу №{order_id} утверждена и отправлена клиенту.")
+            await safe_edit(callback.message, f"✅ Работа по заказу №{order_id} утверждена и отправлена клиенту.")
         except Exception as e:
-            await callback.message.edit_text(f"⚠️ Не удалось отправить работу клиенту {customer_id}. Ошибка: {e}")
+            await safe_edit(callback.message, f"⚠️ Не удалось отправить работу клиенту {customer_id}. Ошибка: {e}")
     else:
-        await callback.message.edit_text("Не найден клиент или файл для отправки.")
+        await safe_edit(callback.message, "Не найден клиент или файл для отправки.")
 
     await callback.answer()
 
@@ -1297,7 +1384,7 @@ async def universal_admin_message_handler(message: Message, state: FSMContext):
 @router.callback_query(F.data == "back_to_main_menu")
 async def back_to_main_menu_handler(callback: CallbackQuery, state: FSMContext):
     await state.clear()
-    await callback.message.edit_text("❌Действие отменено")
+    await safe_edit(callback.message, "❌Действие отменено")
     await callback.answer()
 
 
@@ -1305,18 +1392,7 @@ async def back_to_main_menu_handler(callback: CallbackQuery, state: FSMContext):
 
 def get_user_orders(user_id: int) -> list:
     """Читает orders.json и возвращает список заявок для конкретного user_id."""
-    file_path = "orders.json"
-    if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
-        return []
-    with open(file_path, "r", encoding="utf-8") as f:
-        try:
-            all_orders = json.load(f)
-        except json.JSONDecodeError:
-            return []
-    
-    if not isinstance(all_orders, list):
-        return []
-
+    all_orders = get_all_orders()
     user_orders = [order for order in all_orders if isinstance(order, dict) and order.get('user_id') == user_id]
     return user_orders
 
@@ -1335,28 +1411,18 @@ async def show_my_orders(message_or_callback: types.Message | types.CallbackQuer
             text = "У вас есть незавершенная заявка. Выберите ее, чтобы продолжить.\n\n" + text
         keyboard_buttons = []
         # Показываем последние 10 заявок, чтобы не перегружать интерфейс
-        for order in reversed(orders[-10:]): 
-            order_id = order['order_id']
-            order_status = order.get('status', 'N/A')
+        for order in map(Order.from_dict, reversed(orders[-10:])):
+            order_status = order.status or 'N/A'
             emoji = STATUS_EMOJI_MAP.get(order_status, "📄")
-            
-            work_type_raw = order.get('work_type', 'Заявка')
-            work_type = work_type_raw.replace('work_type_', '')
-            
-            button_text = f"{emoji} Заявка  №{order_id} {work_type}  | {order_status}"
-            
-            keyboard_buttons.append([InlineKeyboardButton(text=button_text, callback_data=f"view_order_{order_id}")])
+            button_text = f"{emoji} Заявка  №{order.order_id} {order.work_type_title}  | {order_status}"
+            keyboard_buttons.append([InlineKeyboardButton(text=button_text, callback_data=f"view_order_{order.order_id}")])
         keyboard = InlineKeyboardMarkup(inline_keyboard=keyboard_buttons)
 
     if isinstance(message_or_callback, types.Message):
         await message_or_callback.answer(text, reply_markup=keyboard)
     else:
-        try:
-            await message_or_callback.message.edit_text(text, reply_markup=keyboard)
-            await message_or_callback.answer()
-        except:
-            await message_or_callback.message.answer(text, reply_markup=keyboard)
-            await message_or_callback.answer()
+        await safe_edit(message_or_callback.message, text, reply_markup=keyboard)
+        await message_or_callback.answer()
 
 @router.message(F.text == "📂 Мои заявки")
 async def my_orders_handler(message: Message, state: FSMContext):
@@ -1380,7 +1446,7 @@ async def view_order_handler(callback: CallbackQuery, state: FSMContext):
     orders = get_user_orders(user_id)
     target_order = next((order for order in orders if order['order_id'] == order_id), None)
     if not target_order:
-        await callback.message.edit_text("Не удалось найти эту заявку или у вас нет к ней доступа.")
+        await safe_edit(callback.message, "Не удалось найти эту заявку или у вас нет к ней доступа.")
         await callback.answer()
         return
         
@@ -1389,7 +1455,7 @@ async def view_order_handler(callback: CallbackQuery, state: FSMContext):
         await state.set_data(target_order)
         await state.set_state(OrderState.confirmation)
         summary_text = await build_summary_text(target_order)
-        await callback.message.edit_text(
+        await safe_edit(callback.message,
             text=summary_text, 
             reply_markup=get_confirmation_keyboard(), 
             parse_mode="HTML"
@@ -1416,28 +1482,14 @@ async def view_order_handler(callback: CallbackQuery, state: FSMContext):
                 reply_markup=keyboard
             )
         else:
-            await callback.message.edit_text("Ошибка: файл с работой не найден.")
+            await safe_edit(callback.message, "Ошибка: файл с работой не найден.")
         await callback.answer()
         return
 
-    status = target_order.get('status', 'Не определен')
-    status_text = f"{STATUS_EMOJI_MAP.get(status, '📄')} {status}"
-    details_text = f"""
-<b>Детали заявки №{target_order['order_id']}</b>
-
-<b>Статус:</b> {status_text}
-
-<b>Группа:</b> {target_order.get('group_name', 'Не указано')}
-<b>Университет:</b> {target_order.get('university_name', 'Не указано')}
-<b>Тип работы:</b> {target_order.get('work_type', 'Не указан')}
-<b>Методичка:</b> {'✅ Да' if target_order.get('has_guidelines') else '❌ Нет'}
-<b>Задание:</b> {'✅ Прикреплено' if target_order.get('task_file') or target_order.get('task_text') else '❌ Нет'}
-<b>Пример работы:</b> {'✅ Да' if target_order.get('has_example') else '❌ Нет'}
-<b>Дата сдачи:</b> {target_order.get('deadline', 'Не указана')}
-<b>Комментарий:</b> {target_order.get('comments', 'Нет')}
-    """
+    status = target_order.get('status') or 'Не определен'
+    details_text = render.render(render.CLIENT_DETAIL, target_order)
     keyboard = get_user_order_keyboard(order_id, status)
-    await callback.message.edit_text(details_text, parse_mode="HTML", reply_markup=keyboard)
+    await safe_edit(callback.message, details_text, parse_mode="HTML", reply_markup=keyboard)
     await callback.answer()
 # --- Процесс создания нового заказа ---
 
@@ -1450,21 +1502,63 @@ async def start_new_order(message: Message, state: FSMContext):
         reply_markup=get_back_keyboard()
     )
 
+async def read_autocomplete(message: Message, state: FSMContext, field: str) -> str | None:
+    """Значение поля с приведением к известному написанию.
+
+    Если введено начало известных значений, показывает их кнопками и возвращает
+    None — ответ придёт в autocomplete_choice.
+    """
+    if not message.text:
+        await message.answer("✍️ Пожалуйста, отправьте значение текстом.")
+        return None
+    suggestions = autocomplete.suggest(field, message.text)
+    if not suggestions:
+        await _forget_typed(state)
+        return autocomplete.canonical(field, message.text)
+    await state.update_data(autocomplete_typed=message.text)
+    index = autocomplete.FIELDS.index(field)
+    buttons = [[InlineKeyboardButton(text=value, callback_data=f"ac:{index}:{value_id}")] for value_id, value in suggestions]
+    buttons.append([InlineKeyboardButton(text=f"✏️ Оставить «{message.text.strip()[:40]}»", callback_data=f"ac:{index}:keep")])
+    await message.answer("🔎 Возможно, вы имели в виду:", reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons))
+    return None
+
+async def _forget_typed(state: FSMContext):
+    # данные анкеты целиком уходят в заявку — служебное поле там не нужно
+    data = await state.get_data()
+    if "autocomplete_typed" in data:
+        del data["autocomplete_typed"]
+        await state.set_data(data)
+
 @router.message(OrderState.group_name)
 async def process_group_name(message: Message, state: FSMContext):
-    await state.update_data(group_name=message.text)
+    value = await read_autocomplete(message, state, "group_name")
+    if value is not None:
+        await set_group_name(message, state, value)
+
+async def set_group_name(message: Message, state: FSMContext, value: str):
+    await state.update_data(group_name=value)
     await state.set_state(OrderState.university_name)
     await message.answer("🏫 Отлично! Теперь введите название вашего университета.", reply_markup=get_back_keyboard())
 
 @router.message(OrderState.university_name)
 async def process_university_name(message: Message, state: FSMContext):
-    await state.update_data(university_name=message.text)
+    value = await read_autocomplete(message, state, "university_name")
+    if value is not None:
+        await set_university_name(message, state, value)
+
+async def set_university_name(message: Message, state: FSMContext, value: str):
+    await state.update_data(university_name=value)
     await state.set_state(OrderState.teacher_name)
     await message.answer("👨‍🏫 Введите ФИО преподавателя:", reply_markup=get_back_keyboard())
 
 @router.message(OrderState.teacher_name)
 async def process_teacher_name(message: Message, state: FSMContext):
-    await state.update_data(teacher_name=message.text)
+    value = await read_autocomplete(message, state, "teacher_name")
+    if value is not None:
+        await set_teacher_name(message, state, value)
+
+async def set_teacher_name(message: Message, state: FSMContext, value: str):
+    await state.update_data(teacher_name=value)
     await state.set_state(OrderState.gradebook)
     await message.answer("📒 Введите номер и вариант зачетки (например: №24-15251):", reply_markup=get_back_keyboard())
 
@@ -1479,30 +1573,64 @@ async def process_subject_choice(callback: CallbackQuery, state: FSMContext):
     subject = callback.data.split("_", 1)[-1]
     if subject == "other":
         await state.set_state(OrderState.subject_other)
-        await callback.message.edit_text("📚 Введите название предмета:")
+        await safe_edit(callback.message, "📚 Введите название предмета:")
     else:
         await state.update_data(subject=subject)
         await state.set_state(OrderState.work_type)
-        await callback.message.edit_text("📝 Выберите тип работы:", reply_markup=get_work_type_keyboard())
+        await safe_edit(callback.message, "📝 Выберите тип работы:", reply_markup=get_work_type_keyboard())
     await callback.answer()
 
 @router.message(OrderState.subject_other)
 async def process_subject_other_input(message: Message, state: FSMContext):
-    await state.update_data(subject=message.text)
+    value = await read_autocomplete(message, state, "subject")
+    if value is not None:
+        await set_subject_other(message, state, value)
+
+async def set_subject_other(message: Message, state: FSMContext, value: str):
+    await state.update_data(subject=value)
     await state.set_state(OrderState.work_type)
     await message.answer("📝 Выберите тип работы:", reply_markup=get_work_type_keyboard())
 
+# поле -> (состояние анкеты, продолжение после выбора значения)
+AUTOCOMPLETE_STEPS = {
+    "group_name": (OrderState.group_name, set_group_name),
+    "university_name": (OrderState.university_name, set_university_name),
+    "teacher_name": (OrderState.teacher_name, set_teacher_name),
+    "subject": (OrderState.subject_other, set_subject_other),
+}
+
+@router.callback_query(F.data.startswith("ac:"))
+async def autocomplete_choice(callback: CallbackQuery, state: FSMContext):
+    _, index, choice = callback.data.split(":")
+    field = autocomplete.FIELDS[int(index)]
+    expected_state, continue_with = AUTOCOMPLETE_STEPS[field]
+    if await state.get_state() != expected_state.state:
+        await callback.answer("Этот шаг анкеты уже пройден.", show_alert=True)
+        return
+    data = await state.get_data()
+    if choice == "keep":
+        value = autocomplete.canonical(field, data.get("autocomplete_typed") or "")
+    else:
+        value = autocomplete.choose(field, int(choice), data.get("autocomplete_typed"))
+    if not value:
+        await callback.answer("Введите значение ещё раз.", show_alert=True)
+        return
+    await _forget_typed(state)
+    await safe_edit(callback.message, f"✅ {html.escape(value)}", parse_mode="HTML")
+    await continue_with(callback.message, state, value)
+    await callback.answer()
+
 @router.callback_query(OrderState.work_type, F.data.startswith("work_type_"))
 async def process_work_type_choice(callback: CallbackQuery, state: FSMContext):
     work_type = callback.data
     
     if work_type == "Другое (ввести вручную)":
         await state.set_state(OrderState.work_type_other)
-        await callback.message.edit_text("Пожалуйста, введите тип работы вручную.", reply_markup=get_back_keyboard())
+        await safe_edit(callback.message, "Пожалуйста, введите тип работы вручную.", reply_markup=get_back_keyboard())
     else:
         await state.update_data(work_type=work_type)
         await state.set_state(OrderState.guidelines_choice)
-        await callback.message.edit_text("📄 У вас есть методичка?", reply_markup=get_yes_no_keyboard("guidelines"))
+        await safe_edit(callback.message, "📄 У вас есть методичка?", reply_markup=get_yes_no_keyboard("guidelines"))
     await callback.answer()
 
 @router.message(OrderState.work_type_other)
@@ -1519,61 +1647,74 @@ async def process_guidelines_choice(callback: CallbackQuery, state: FSMContext):
     if choice == "yes":
         await state.update_data(has_guidelines=True)
         await state.set_state(OrderState.guidelines_upload)
-        await callback.message.edit_text("Пожалуйста, загрузите файл с методичкой (pdf, docx, png, jpeg).", reply_markup=get_back_keyboard())
+        await safe_edit(callback.message, "Пожалуйста, загрузите файл с методичкой (pdf, docx, png, jpeg).", reply_markup=get_back_keyboard())
     else:
         await state.update_data(has_guidelines=False, guidelines_file=None)
         await state.set_state(OrderState.task_upload)
-        await callback.message.edit_text("Понял. Теперь, пожалуйста, загрузите файл с заданием (pdf, docx, png, jpeg) или просто опишите его текстом.", reply_markup=get_back_keyboard())
+        await safe_edit(callback.message, "Понял. Теперь, пожалуйста, загрузите файл с заданием (pdf, docx, png, jpeg) или просто опишите его текстом.", reply_markup=get_back_keyboard())
     await callback.answer()
 
 
-@router.message(OrderState.guidelines_upload, F.document | F.photo)
-async def process_guidelines_upload(message: Message, state: FSMContext):
-    # Проверка документа
+def check_upload(message: Message):
+    """Проверяет вложение; возвращает (файл, None) или (None, текст ошибки)."""
     if message.document:
-        ext = os.path.splitext(message.document.file_name)[-1][1:].lower()
+        ext = os.path.splitext(message.document.file_name or "")[-1][1:].lower()
         if ext not in ALLOWED_EXTENSIONS:
-            await message.answer("❌ Разрешены только файлы: pdf, docx, png, jpeg, jpg. Попробуйте еще раз.")
-            return
+            return None, "❌ Разрешены только файлы: pdf, docx, png, jpeg, jpg. Попробуйте еще раз."
         if message.document.file_size > MAX_FILE_SIZE:
-            await message.answer("❌ Файл слишком большой. Максимальный размер — 15 МБ.")
-            return
-        guidelines_file = {'id': message.document.file_id, 'type': 'document'}
-    else:
-        # Проверка фото
-        photo = message.photo[-1]
-        if photo.file_size > MAX_FILE_SIZE:
-            await message.answer("❌ Фото слишком большое. Максимальный размер — 15 МБ.")
-            return
-        guidelines_file = {'id': photo.file_id, 'type': 'photo'}
+            return None, "❌ Файл слишком большой. Максимальный размер — 15 МБ."
+        return {'id': message.document.file_id, 'type': 'document'}, None
+    photo = message.photo[-1]
+    if photo.file_size > MAX_FILE_SIZE:
+        return None, "❌ Фото слишком большое. Максимальный размер — 15 МБ."
+    return {'id': photo.file_id, 'type': 'photo'}, None
+
+async def collect_uploads(message: Message, album: list | None):
+    """Проверяет все файлы альбома (его собрал AlbumMiddleware) за один проход.
+
+    Возвращает (значение слота, примечание к ответу) или None, если ни один файл
+    не прошёл проверку (об этом уже сказано пользователю).
+    """
+    files, errors = [], []
+    for part in album or [message]:
+        file, error = check_upload(part)
+        if file:
+            files.append(file)
+        else:
+            errors.append(error)
+    if not files:
+        await message.answer(errors[0])
+        return None
+    note = ""
+    if errors:
+        note = f" Пропущено файлов: {len(errors)} — разрешены pdf, docx, png, jpeg, jpg до 15 МБ."
+    # Один файл храним словарём, как раньше, альбом — списком
+    return (files[0] if len(files) == 1 else files), note
+
+@router.message(OrderState.guidelines_upload, F.document | F.photo)
+async def process_guidelines_upload(message: Message, state: FSMContext, album: list | None = None):
+    uploads = await collect_uploads(message, album)
+    if uploads is None:
+        return
+    guidelines_file, note = uploads
     await state.update_data(guidelines_file=guidelines_file)
     await state.set_state(OrderState.task_upload)
-    await message.answer("✅ Методичка принята. Теперь, пожалуйста, загрузите файл с заданием (pdf, docx, png, jpeg) или просто опишите его текстом.", reply_markup=get_back_keyboard())
+    await message.answer(f"✅ Методичка принята.{note} Теперь, пожалуйста, загрузите файл с заданием (pdf, docx, png, jpeg) или просто опишите его текстом.", reply_markup=get_back_keyboard())
 
 
 @router.message(OrderState.task_upload, F.text | F.document | F.photo)
-async def process_task_upload(message: Message, state: FSMContext):
+async def process_task_upload(message: Message, state: FSMContext, album: list | None = None):
+    note = ""
     if message.text:
         await state.update_data(task_text=message.text, task_file=None)
     else:
-        if message.document:
-            ext = os.path.splitext(message.document.file_name)[-1][1:].lower()
-            if ext not in ALLOWED_EXTENSIONS:
-                await message.answer("❌ Разрешены только файлы: pdf, docx, png, jpeg, jpg. Попробуйте еще раз.")
-                return
-            if message.document.file_size > MAX_FILE_SIZE:
-                await message.answer("❌ Файл слишком большой. Максимальный размер — 15 МБ.")
-                return
-            task_file = {'id': message.document.file_id, 'type': 'document'}
-        else:
-            photo = message.photo[-1]
-            if photo.file_size > MAX_FILE_SIZE:
-                await message.answer("❌ Фото слишком большое. Максимальный размер — 15 МБ.")
-                return
-            task_file = {'id': photo.file_id, 'type': 'photo'}
+        uploads = await collect_uploads(message, album)
+        if uploads is None:
+            return
+        task_file, note = uploads
         await state.update_data(task_file=task_file, task_text=None)
     await state.set_state(OrderState.example_choice)
-    await message.answer("📑 Задание принято. У вас есть пример работы?", reply_markup=get_yes_no_keyboard("example"))
+    await message.answer(f"📑 Задание принято.{note} У вас есть пример работы?", reply_markup=get_yes_no_keyboard("example"))
 
 
 @router.callback_query(OrderState.example_choice, F.data.startswith("example_"))
@@ -1582,34 +1723,23 @@ async def process_example_choice(callback: CallbackQuery, state: FSMContext):
     if choice == "yes":
         await state.update_data(has_example=True)
         await state.set_state(OrderState.example_upload)
-        await callback.message.edit_text("Пожалуйста, загрузите файл с примером (pdf, docx, pgn, jpeg).", reply_markup=get_back_keyboard())
+        await safe_edit(callback.message, "Пожалуйста, загрузите файл с примером (pdf, docx, pgn, jpeg).", reply_markup=get_back_keyboard())
     else: 
         await state.update_data(has_example=False, example_file=None)
         await state.set_state(OrderState.deadline)
-        await callback.message.edit_text("🗓️ Укажите дату сдачи в формате ДД.ММ.ГГГГ.", reply_markup=get_back_keyboard())
+        await safe_edit(callback.message, "🗓️ Укажите дату сдачи в формате ДД.ММ.ГГГГ.", reply_markup=get_back_keyboard())
     await callback.answer()
 
 
 @router.message(OrderState.example_upload, F.document | F.photo)
-async def process_example_upload(message: Message, state: FSMContext):
-    if message.document:
-        ext = os.path.splitext(message.document.file_name)[-1][1:].lower()
-        if ext not in ALLOWED_EXTENSIONS:
-            await message.answer("❌ Разрешены только файлы: pdf, docx, png, jpeg, jpg. Попробуйте еще раз.")
-            return
-        if message.document.file_size > MAX_FILE_SIZE:
-            await message.answer("❌ Файл слишком большой. Максимальный размер — 15 МБ.")
-            return
-        example_file = {'id': message.document.file_id, 'type': 'document'}
-    else:
-        photo = message.photo[-1]
-        if photo.file_size > MAX_FILE_SIZE:
-            await message.answer("❌ Фото слишком большое. Максимальный размер — 15 МБ.")
-            return
-        example_file = {'id': photo.file_id, 'type': 'photo'}
+async def process_example_upload(message: Message, state: FSMContext, album: list | None = None):
+    uploads = await collect_uploads(message, album)
+    if uploads is None:
+        return
+    example_file, note = uploads
     await state.update_data(example_file=example_file)
     await state.set_state(OrderState.deadline)
-    await message.answer("✅ Пример принят. Укажите дату сдачи в формате ДД.ММ.ГГГГ.", reply_markup=get_back_keyboard())
+    await message.answer(f"✅ Пример принят.{note} Укажите дату сдачи в формате ДД.ММ.ГГГГ.", reply_markup=get_back_keyboard())
 
 @router.message(OrderState.deadline)
 async def process_deadline(message: Message, state: FSMContext):
@@ -1630,9 +1760,9 @@ async def skip_comment_handler(callback: CallbackQuery, state: FSMContext):
     await state.update_data(comments="Нет")
     data = await state.get_data()
     # Не сохраняем черновик! Просто показываем подтверждение
-    summary_text = await build_summary_text(data)
+    summary_text = await build_summary_text(data, cached=False)
     await state.set_state(OrderState.confirmation)
-    await callback.message.edit_text(summary_text, reply_markup=get_confirmation_keyboard(), parse_mode="HTML")
+    await safe_edit(callback.message, summary_text, reply_markup=get_confirmation_keyboard(), parse_mode="HTML")
     await callback.answer()
 
 @router.message(OrderState.comments)
@@ -1640,70 +1770,25 @@ async def process_comments(message: Message, state: FSMContext):
     await state.update_data(comments=message.text)
     data = await state.get_data()
     # Не сохраняем черновик! Просто показываем подтверждение
-    summary_text = await build_summary_text(data)
+    summary_text = await build_summary_text(data, cached=False)
     await state.set_state(OrderState.confirmation)
     await message.answer(text=summary_text, reply_markup=get_confirmation_keyboard(), parse_mode="HTML")
 
 
-async def build_summary_text(data: dict) -> str:
+async def build_summary_text(data: dict, cached: bool = True) -> str:
     """Строит текст с итоговой информацией о заявке."""
-    group = data.get("group_name", "Не указана")
-    university = data.get("university_name", "Не указан")
-    teacher = data.get("teacher_name", "Не указан")
-    gradebook = data.get("gradebook", "Не указан")
-    subject = data.get("subject", "Не указан")
-    work_type_key = data.get("work_type", "N/A").replace("work_type_", "")
-    
-    work_type_str = work_type_key if work_type_key != 'other' else data.get('work_type_other_name', 'Другое')
-    
-    guidelines = '✅ Да' if data.get('has_guidelines') else '❌ Нет'
-    task = '✅ Прикреплено' if data.get('task_file') or data.get('task_text') else '❌ Нет'
-    example = '✅ Да' if data.get('has_example') else '❌ Нет'
-    deadline = data.get('deadline', 'Не указана')
-    comments = data.get('comments', 'Нет')
-    return f"""
-
-<b>Группа:</b> {group}
-<b>ВУЗ:</b> {university}
-<b>Преподаватель:</b> {teacher}
-<b>Номер зачетки:</b> {gradebook}
-<b>Предмет:</b> {subject}
-<b>Тип работы:</b> {work_type_str}
-<b>Методичка:</b> {guidelines}
-<b>Задание:</b> {task}
-<b>Пример:</b> {example}
-<b>Дедлайн:</b> {deadline}
-"""
-    if comments:
-        return f"{summary_text}\n<b>Комментарии:</b> {comments}"
-    return summary_text
+    return render.render(render.SUMMARY, data, cached=cached)
 
 async def build_short_summary_text(data: dict) -> str:
     """Формирует короткий текст-сводку по заявке для админа/исполнителей."""
-    work_type = data.get("work_type", "Тип не указан").replace("type_", "").capitalize()
-    if work_type == "Other":
-        work_type = data.get("work_type_other_name", "Другое")
-
-    subject = data.get("subject", "Не указан")
-    deadline = data.get("deadline", "Не указан")
-    text = (f"<b>Тип работы:</b> {work_type}\n"
-            f"<b>Предмет:</b> {subject}\n"
-            f"<b>Срок:</b> до {deadline}")
-    return text
+    return render.render(render.SHORT_SUMMARY, data)
 
 # --- Подтверждение и сохранение заказа ---
 
 async def save_or_update_order(order_data: dict) -> int:
     """Сохраняет новую или обновляет существующую заявку в orders.json."""
-    file_path = "orders.json"
-    orders = []
-    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-        with open(file_path, "r", encoding="utf-8") as f:
-            try:
-                orders = json.load(f)
-            except json.JSONDecodeError:
-                orders = []
-    
+    orders = get_all_orders()
+
     order_id_to_process = order_data.get("order_id")
     user_id_to_process = order_data.get("user_id")
     status_to_process = order_data.get("status")
@@ -1730,8 +1815,7 @@ async def save_or_update_order(order_data: dict) -> int:
         order_data["order_id"] = order_id_to_process
         orders.append(order_data)
     
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
+    save_orders(orders)
     
     return order_id_to_process
 
@@ -1745,22 +1829,24 @@ async def process_confirm_order(callback: CallbackQuery, state: FSMContext):
     data['last_name'] = callback.from_user.last_name or ""
     data['creation_date'] = datetime.now().strftime("%d.%m.%Y %H:%M")
     order_id = await save_or_update_order(data)
+    autocomplete.add_order(data)
     # Формируем единое сообщение для админа с кнопками
-    summary = await build_summary_text(data)
-    full_name = f"{data.get('first_name', '')} {data.get('last_name', '')}".strip()
-    admin_text = f"🔥 Новая заявка {order_id} от клиента ({full_name})\n\n{summary}"
+    admin_text = render.render(render.ADMIN_NEW_ORDER, data)
     admin_keyboard = get_admin_order_keyboard(data, show_materials_button=True)
     await bot.send_message(ADMIN_ID, admin_text, parse_mode="HTML", reply_markup=admin_keyboard)
-    # Рассылка исполнителям (оставляем как было)
-    if EXECUTOR_IDS:
+    # Рассылка исполнителям, подписанным на предмет и тип работы
+    recipients = subscriptions.recipients(data.get('subject'), data.get('work_type'), fallback_ids=EXECUTOR_IDS)
+    if recipients:
         short_summary = await build_short_summary_text(data)
         notification_text = f"📢 Появился новый заказ {order_id}\n\n" + short_summary
-        for executor_id in EXECUTOR_IDS:
+        for executor_id in recipients:
             try:
                 await bot.send_message(executor_id, notification_text, parse_mode="HTML")
             except Exception as e:
-                print(f"Failed to send notification to executor {executor_id}: {e}")
-    await callback.message.edit_text("✅ Ваша заявка успешно отправлена, ожидайте отклика!", reply_markup=None)
+                logging.warning("Не удалось уведомить исполнителя %s о заказе %s: %s", executor_id, order_id, e)
+    await safe_edit(callback.message, "✅ Ваша заявка успешно отправлена, ожидайте отклика!", reply_markup=None)
+    if autoassign.is_enabled():
+        await auto_assign_order(order_id)
     await state.clear()
     await callback.answer()
 
@@ -1769,26 +1855,18 @@ async def process_cancel_order(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
     order_id = data.get("order_id")
     user_id = callback.from_user.id
-    file_path = "orders.json"
-    orders = []
-    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-        with open(file_path, "r", encoding="utf-8") as f:
-            try:
-                orders = json.load(f)
-            except json.JSONDecodeError:
-                orders = []
+    orders = get_all_orders()
     # Удаляем заявку пользователя с этим order_id
     new_orders = [o for o in orders if not (str(o.get("order_id")) == str(order_id) and o.get("user_id") == user_id)]
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(new_orders, f, ensure_ascii=False, indent=4)
+    save_orders(new_orders)
     await state.clear()
-    await callback.message.edit_text("❌ Заявка отменена и удалена.")
+    await safe_edit(callback.message, "❌ Заявка отменена и удалена.")
     await callback.answer()
 
 @router.callback_query(OrderState.confirmation, F.data == "contact_admin_in_order")
 async def process_contact_admin_in_order(callback: CallbackQuery, state: FSMContext):
     await state.set_state(AdminContact.waiting_for_message)
-    await callback.message.edit_text("✍️ Напишите ваше сообщение, и я отправлю его администратору.")
+    await safe_edit(callback.message, "✍️ Напишите ваше сообщение, и я отправлю его администратору.")
     await callback.answer()
 
 
@@ -1799,35 +1877,35 @@ async def process_back_button(callback: CallbackQuery, state: FSMContext):
 
     async def go_to_group_name(s: FSMContext):
         await s.set_state(OrderState.group_name)
-        await callback.message.edit_text("📝 Пожалуйста, укажите название вашей группы.")
+        await safe_edit(callback.message, "📝 Пожалуйста, укажите название вашей группы.")
     
     async def go_to_university_name(s: FSMContext):
         await s.set_state(OrderState.university_name)
-        await callback.message.edit_text("🏫 Введите название вашего университета.", reply_markup=get_back_keyboard())
+        await safe_edit(callback.message, "🏫 Введите название вашего университета.", reply_markup=get_back_keyboard())
 
     async def go_to_work_type(s: FSMContext):
         await s.set_state(OrderState.work_type)
-        await callback.message.edit_text("📘 Выберите тип работы:", reply_markup=get_work_type_keyboard())
+        await safe_edit(callback.message, "📘 Выберите тип работы:", reply_markup=get_work_type_keyboard())
 
     async def go_to_guidelines_choice(s: FSMContext):
         await s.set_state(OrderState.guidelines_choice)
-        await callback.message.edit_text("📄 У вас есть методичка?", reply_markup=get_yes_no_keyboard("guidelines"))
+        await safe_edit(callback.message, "📄 У вас есть методичка?", reply_markup=get_yes_no_keyboard("guidelines"))
     
     async def go_to_task_upload(s: FSMContext):
         await s.set_state(OrderState.task_upload)
-        await callback.message.edit_text("Понял. Теперь, пожалуйста, загрузите файл с заданием (pdf, docx, png, jpeg) или просто опишите его текстом.", reply_markup=get_back_keyboard())
+        await safe_edit(callback.message, "Понял. Теперь, пожалуйста, загрузите файл с заданием (pdf, docx, png, jpeg) или просто опишите его текстом.", reply_markup=get_back_keyboard())
 
     async def go_to_example_choice(s: FSMContext):
         await s.set_state(OrderState.example_choice)
-        await callback.message.edit_text("📑 Задание принято. У вас есть пример работы?", reply_markup=get_yes_no_keyboard("example"))
+        await safe_edit(callback.message, "📑 Задание принято. У вас есть пример работы?", reply_markup=get_yes_no_keyboard("example"))
 
     async def go_to_deadline(s: FSMContext):
         await s.set_state(OrderState.deadline)
-        await callback.message.edit_text("🗓️ Укажите дату сдачи в формате ДД.ММ.ГГГГ.", reply_markup=get_back_keyboard())
+        await safe_edit(callback.message, "🗓️ Укажите дату сдачи в формате ДД.ММ.ГГГГ.", reply_markup=get_back_keyboard())
 
     async def go_to_comments(s: FSMContext):
         await s.set_state(OrderState.comments)
-        await callback.message.edit_text("💬 Введите ваши комментарии по работе.", reply_markup=get_back_keyboard())
+        await safe_edit(callback.message, "💬 Введите ваши комментарии по работе.", reply_markup=get_back_keyboard())
 
     back_transitions = {
         OrderState.university_name: go_to_group_name,
@@ -1847,47 +1925,195 @@ async def process_back_button(callback: CallbackQuery, state: FSMContext):
         await back_transitions[current_state_str](state)
     else: # Если это первый шаг (group_name), то возвращаться некуда
         await state.clear()
-        await callback.message.edit_text("❌ Заявка отменена. Вы вернулись в главное меню.")
+        await safe_edit(callback.message, "❌ Заявка отменена. Вы вернулись в главное меню.")
 
     await callback.answer()
 
 
-async def send_offer_to_admin(user, fsm_data):
-    """Отправляет оффер от исполнителя админу с кнопками."""
+async def send_offer_to_admin(user, fsm_data) -> bool:
+    """Отправляет оффер от исполнителя админу с кнопками. False — заказ уже неактуален."""
     order_id = fsm_data['order_id']
     price = fsm_data['price']
     executor_comment = fsm_data.get('executor_comment', '')
+    offer = {
+        'price': price,
+        'deadline': fsm_data['deadline'],
+        'executor_id': user.id,
+        'executor_username': user.username,
+        'executor_full_name': get_full_name(user),
+        'executor_comment': executor_comment
+    }
+    if fsm_data.get('offer_round'):
+        return await submit_round_offer(order_id, user.id, offer)
     # Обновляем заказ в JSON
-    orders = get_all_orders()
-    subject = 'Не указан'
-    for order in orders:
-        if order.get("order_id") == order_id:
-            order['status'] = "Ожидает подтверждения" # Меняем статус
-            order['executor_offer'] = {
-                'price': price,
-                'deadline': fsm_data['deadline'],
-                'executor_id': user.id,
-                'executor_username': user.username,
-                'executor_full_name': get_full_name(user),
-                'executor_comment': executor_comment
-            }
-            subject = order.get('subject', 'Не указан')
-            break
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
-    admin_notification = f"""
-    ✅ Исполнитель {get_full_name(user)} (ID: {user.id}) готов взяться за заказ по предмету \"{subject}\"
-    <b>Предложенные условия:</b>
-    💰 <b>Цена:</b> {price} ₽
-    ⏳ <b>Срок:</b> {fsm_data['deadline']}
-    💬 <b>Комментарий исполнителя:</b> {executor_comment or 'Нет'}
-    """
+    target_order = fire(order_id, Event.EXECUTOR_OFFER, executor_offer=offer)
+    if target_order is None:
+        return False
+    admin_notification = render.render(render.ADMIN_OFFER, target_order)
     await bot.send_message(
         ADMIN_ID, 
         admin_notification, 
         parse_mode="HTML",
         reply_markup=get_admin_final_approval_keyboard(order_id, price)
     )
+    return True
+
+
+# --- Раунд предложений: заказ сразу нескольким исполнителям ---
+
+@order_keyboard
+def get_round_invite_keyboard(order_id):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="📎 Посмотреть материалы заказа", callback_data=f"executor_show_materials:{order_id}")],
+        [InlineKeyboardButton(text="✅ Готов взяться", callback_data=f"round_accept_{order_id}"),
+         InlineKeyboardButton(text="❌ Отказаться", callback_data=f"round_refuse_{order_id}")],
+    ])
+
+@order_keyboard
+def get_round_offer_keyboard(order_id, executor_id, price):
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=f"✅ Выбрать это предложение ({price} ₽)", callback_data=f"round_approve_{order_id}_{executor_id}")],
+    ])
+
+@static_keyboard
+def get_round_skip_price_keyboard():
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="➡️ Без автовыбора", callback_data="offer_round_skip_price")]
+    ])
+
+@admin_router.callback_query(F.data.startswith("offer_round_start_"))
+async def offer_round_start_handler(callback: CallbackQuery, state: FSMContext):
+    if callback.from_user.id != int(ADMIN_ID): return
+    order_id = int(callback.data.split("_")[-1])
+    await state.set_state(AdminOfferRound.waiting_for_max_price)
+    await state.update_data(order_id=order_id)
+    await safe_edit(callback.message,
+        f"📣 Заказ №{order_id} получат до {offer_rounds.MULTI_OFFER_SIZE} лучших исполнителей.\n\n"
+        "Введите максимальную цену: первое предложение не дороже неё будет выбрано автоматически. "
+        "Или пропустите — тогда выберете сами.",
+        reply_markup=get_round_skip_price_keyboard()
+    )
+    await callback.answer()
+
+@admin_router.message(AdminOfferRound.waiting_for_max_price)
+async def offer_round_max_price_handler(message: Message, state: FSMContext):
+    if not message.text or not message.text.isdigit():
+        await message.answer("Пожалуйста, введите только число.", reply_markup=get_round_skip_price_keyboard())
+        return
+    order_id = (await state.get_data()).get('order_id')
+    await state.clear()
+    await message.answer(await start_offer_round(order_id, int(message.text)))
+
+@admin_router.callback_query(F.data == "offer_round_skip_price", AdminOfferRound.waiting_for_max_price)
+async def offer_round_skip_price_handler(callback: CallbackQuery, state: FSMContext):
+    order_id = (await state.get_data()).get('order_id')
+    await state.clear()
+    await safe_edit(callback.message, await start_offer_round(order_id, None))
+    await callback.answer()
+
+async def start_offer_round(order_id: int, max_price: int | None) -> str:
+    """Открывает раунд и рассылает приглашения параллельно; возвращает отчёт для админа."""
+    order = get_order(order_id)
+    if order is None or order.status != OrderStatus.NEW:
+        return f"Заказ №{order_id} не найден или уже передан исполнителю."
+    executor_ids = [ex['id'] for ex in matching.rank(order, get_executors_list())[:offer_rounds.MULTI_OFFER_SIZE]]
+    if not executor_ids:
+        return "Список исполнителей пуст."
+    target_order = offer_rounds.open_round(order_id, executor_ids, max_price)
+    if target_order is None:
+        return f"Заказ №{order_id} не найден или уже передан исполнителю."
+    invite = render.render(render.EXECUTOR_INVITE, target_order)
+    keyboard = get_round_invite_keyboard(order_id)
+    results = await asyncio.gather(
+        *(bot.send_message(executor_id, invite, parse_mode="HTML", reply_markup=keyboard) for executor_id in executor_ids),
+        return_exceptions=True,
+    )
+    delivered = []
+    for executor_id, result in zip(executor_ids, results):
+        if isinstance(result, Exception):
+            logging.warning("Приглашение по заказу %s не доставлено исполнителю %s: %s", order_id, executor_id, result)
+            offer_rounds.decline(order_id, executor_id)
+        else:
+            delivered.append(str(executor_id))
+    if not delivered:
+        offer_rounds.cancel(order_id)
+        return f"⚠️ Не удалось доставить приглашения по заказу №{order_id}. Заказ снова в поиске."
+    text = f"📣 Заказ №{order_id} разослан исполнителям: {', '.join(delivered)}."
+    if max_price is not None:
+        text += f"\nПервое предложение не дороже {max_price} ₽ будет выбрано автоматически."
+    return text
+
+@executor_router.callback_query(F.data.startswith("round_accept_"))
+async def round_accept_handler(callback: CallbackQuery, state: FSMContext):
+    order_id = int(callback.data.split("_")[-1])
+    offer_round = offer_rounds.get_round(get_order(order_id))
+    user_id = callback.from_user.id
+    if (offer_round is None or user_id not in offer_round['executors']
+            or user_id in offer_round['declined'] or str(user_id) in offer_round['offers']):
+        await callback.answer("Это предложение уже неактуально.", show_alert=True)
+        return
+    await state.set_state(ExecutorResponse.waiting_for_price)
+    await state.update_data(order_id=order_id, offer_round=True)
+    await safe_edit(callback.message, "Отлично! Укажите вашу цену:", reply_markup=get_price_keyboard(order_id))
+    await callback.answer()
+
+@executor_router.callback_query(F.data.startswith("round_refuse_"))
+async def round_refuse_handler(callback: CallbackQuery, state: FSMContext):
+    order_id = int(callback.data.split("_")[-1])
+    offer_round = offer_rounds.decline(order_id, callback.from_user.id)
+    await safe_edit(callback.message, f"❗️ Вы отказались от заказа №{order_id}.")
+    await callback.answer()
+    if offer_round is not None and offer_rounds.is_exhausted(offer_round) and offer_rounds.cancel(order_id):
+        await bot.send_message(ADMIN_ID, f"❌ Все приглашённые исполнители отказались от заказа №{order_id}. Заказ снова в поиске.")
+
+async def submit_round_offer(order_id: int, executor_id: int, offer: dict) -> bool:
+    """Добавляет условия в раунд; если они не дороже max_price — сразу закрывает раунд ими."""
+    offer_round = offer_rounds.add_offer(order_id, executor_id, offer)
+    if offer_round is None:
+        return False
+    if offer_rounds.is_acceptable(offer_round, offer['price']):
+        report = await close_offer_round(order_id, executor_id)
+        if report:
+            await bot.send_message(ADMIN_ID, f"🤖 Автовыбор: {report}")
+        return True
+    order = get_order(order_id)
+    deadline = offer['deadline']
+    text = render.TEMPLATES[render.ADMIN_OFFER].format(
+        executor=offer['executor_full_name'],
+        subject=(order.subject if order else None) or 'Не указан',
+        offer_price=offer['price'],
+        offer_deadline=pluralize_days(deadline) if str(deadline).isdigit() else deadline,
+        offer_comment=offer['executor_comment'] or 'Нет',
+    )
+    text += f"\n\n📣 Предложение {len(offer_round['offers'])} из {len(offer_round['executors'])} по заказу №{order_id}"
+    await bot.send_message(ADMIN_ID, text, parse_mode="HTML",
+                           reply_markup=get_round_offer_keyboard(order_id, executor_id, offer['price']))
+    return True
+
+async def close_offer_round(order_id: int, executor_id: int) -> str | None:
+    """Закрывает раунд выбранным предложением и оповещает всех. None — раунд уже закрыт."""
+    target_order, offer_round = offer_rounds.close(order_id, executor_id)
+    if target_order is None:
+        return None
+    price = target_order.get('final_price')
+    warnings = await notify_offer_approved(target_order, price)
+    losers = [ex for ex in offer_round['executors'] if ex != executor_id and ex not in offer_round['declined']]
+    await asyncio.gather(
+        *(bot.send_message(ex, f"ℹ️ Заказ №{order_id} уже передан другому исполнителю. Спасибо за отклик!") for ex in losers),
+        return_exceptions=True,
+    )
+    return "\n".join([f"✅ Заказ №{order_id} передан исполнителю {executor_id} за {price} ₽. Ожидаем оплату...", *warnings])
+
+@admin_router.callback_query(F.data.startswith("round_approve_"))
+async def round_approve_handler(callback: CallbackQuery, state: FSMContext):
+    if callback.from_user.id != int(ADMIN_ID): return
+    _, _, order_id, executor_id = callback.data.split("_")
+    report = await close_offer_round(int(order_id), int(executor_id))
+    if report is None:
+        await callback.answer("Раунд по этому заказу уже закрыт.", show_alert=True)
+        return
+    await safe_edit(callback.message, report)
+    await callback.answer()
 
 
 @admin_router.callback_query(F.data.startswith("admin_show_materials:"))
@@ -1899,6 +2125,8 @@ async def admin_show_materials_handler(callback: CallbackQuery, state: FSMContex
         await callback.answer("Заказ не найден.", show_alert=True)
         return
     material_buttons = []
+    if has_materials(order):
+        material_buttons.append([InlineKeyboardButton(text="📦 Все материалы", callback_data=f"admin_material_all:{order_id}")])
     if order.get('guidelines_file'):
         material_buttons.append([InlineKeyboardButton(text="Методичка", callback_data=f"admin_material_guidelines:{order_id}")])
     if order.get('task_file') or order.get('task_text'):
@@ -1907,7 +2135,7 @@ async def admin_show_materials_handler(callback: CallbackQuery, state: FSMContex
         material_buttons.append([InlineKeyboardButton(text="Пример работы", callback_data=f"admin_material_example:{order_id}")])
     material_buttons.append([InlineKeyboardButton(text="⬅️ Скрыть материалы", callback_data=f"admin_hide_materials:{order_id}")])
     keyboard = InlineKeyboardMarkup(inline_keyboard=material_buttons)
-    await callback.message.edit_text("Выберите материал для просмотра:", reply_markup=keyboard)
+    await safe_edit(callback.message, "Выберите материал для просмотра:", reply_markup=keyboard)
     await callback.answer()
 
 @admin_router.callback_query(F.data.startswith("admin_hide_materials:"))
@@ -1918,12 +2146,24 @@ async def admin_hide_materials_handler(callback: CallbackQuery, state: FSMContex
     if not order:
         await callback.answer("Заказ не найден.", show_alert=True)
         return
-    details_text = await build_summary_text(order)
-    details_text = f"<b>Детали заказа {order_id} от {get_full_name(order)}</b>\n\n" + details_text
+    details_text = render.render(render.ADMIN_DETAIL, order)
     keyboard = get_admin_order_keyboard(order, show_materials_button=True)
-    await callback.message.edit_text(details_text, reply_markup=keyboard, parse_mode="HTML")
+    await safe_edit(callback.message, details_text, reply_markup=keyboard, parse_mode="HTML")
+    await callback.answer()
+
+async def send_all_materials_handler(callback: CallbackQuery):
+    order_id = callback.data.split(":", 1)[1]
+    order = next((o for o in get_all_orders() if str(o['order_id']) == str(order_id)), None)
+    if not order or not has_materials(order):
+        await callback.answer("Материалы не найдены.", show_alert=True)
+        return
+    await send_materials(bot, callback.from_user.id, order)
     await callback.answer()
 
+@admin_router.callback_query(F.data.startswith("admin_material_all:"))
+async def admin_material_all_handler(callback: CallbackQuery, state: FSMContext):
+    await send_all_materials_handler(callback)
+
 @admin_router.callback_query(F.data.startswith("admin_material_guidelines:"))
 async def admin_material_guidelines_handler(callback: CallbackQuery, state: FSMContext):
     order_id = callback.data.split(":", 1)[1]
@@ -1932,11 +2172,7 @@ async def admin_material_guidelines_handler(callback: CallbackQuery, state: FSMC
     if not order or not order.get('guidelines_file'):
         await callback.answer("Методичка не найдена.", show_alert=True)
         return
-    file = order['guidelines_file']
-    if file['type'] == 'photo':
-        await bot.send_photo(callback.from_user.id, file['id'], caption="Методичка")
-    else:
-        await bot.send_document(callback.from_user.id, file['id'], caption="Методичка")
+    await send_materials(bot, callback.from_user.id, order, slots=('guidelines_file',))
     await callback.answer()
 
 @admin_router.callback_query(F.data.startswith("admin_material_task:"))
@@ -1947,14 +2183,7 @@ async def admin_material_task_handler(callback: CallbackQuery, state: FSMContext
     if not order:
         await callback.answer("Задание не найдено.", show_alert=True)
         return
-    if order.get('task_file'):
-        file = order['task_file']
-        if file['type'] == 'photo':
-            await bot.send_photo(callback.from_user.id, file['id'], caption="Задание")
-        else:
-            await bot.send_document(callback.from_user.id, file['id'], caption="Задание")
-    elif order.get('task_text'):
-        await bot.send_message(callback.from_user.id, f"Текст задания:\n\n{order['task_text']}")
+    await send_materials(bot, callback.from_user.id, order, slots=('task_file',))
     await callback.answer()
 
 @admin_router.callback_query(F.data.startswith("admin_material_example:"))
@@ -1965,11 +2194,7 @@ async def admin_material_example_handler(callback: CallbackQuery, state: FSMCont
     if not order or not order.get('example_file'):
         await callback.answer("Пример работы не найден.", show_alert=True)
         return
-    file = order['example_file']
-    if file['type'] == 'photo':
-        await bot.send_photo(callback.from_user.id, file['id'], caption="Пример работы")
-    else:
-        await bot.send_document(callback.from_user.id, file['id'], caption="Пример работы")
+    await send_materials(bot, callback.from_user.id, order, slots=('example_file',))
     await callback.answer()
 
 @admin_router.callback_query(F.data.startswith("admin_delete_order:"))
@@ -1977,9 +2202,8 @@ async def admin_delete_order_handler(callback: CallbackQuery, state: FSMContext)
     order_id = callback.data.split(":", 1)[1]
     orders = get_all_orders()
     new_orders = [o for o in orders if str(o['order_id']) != str(order_id)]
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(new_orders, f, ensure_ascii=False, indent=4)
-    await callback.message.edit_text(f"❌ Заявка {order_id} удалена.")
+    save_orders(new_orders)
+    await safe_edit(callback.message, f"❌ Заявка {order_id} удалена.")
     await callback.answer()
 
 @admin_router.callback_query(F.data == "admin_orders_list")
@@ -1996,6 +2220,8 @@ async def executor_show_materials_handler(callback: CallbackQuery, state: FSMCon
         await callback.answer("Заказ не найден.", show_alert=True)
         return
     material_buttons = []
+    if has_materials(order):
+        material_buttons.append([InlineKeyboardButton(text="📦 Все материалы", callback_data=f"executor_material_all:{order_id}")])
     if order.get('guidelines_file'):
         material_buttons.append([InlineKeyboardButton(text="Методичка", callback_data=f"executor_material_guidelines:{order_id}")])
     if order.get('task_file') or order.get('task_text'):
@@ -2004,7 +2230,7 @@ async def executor_show_materials_handler(callback: CallbackQuery, state: FSMCon
         material_buttons.append([InlineKeyboardButton(text="Пример работы", callback_data=f"executor_material_example:{order_id}")])
     material_buttons.append([InlineKeyboardButton(text="⬅️ Назад", callback_data=f"executor_hide_materials:{order_id}")])
     keyboard = InlineKeyboardMarkup(inline_keyboard=material_buttons)
-    await callback.message.edit_text("Выберите материал для просмотра:", reply_markup=keyboard)
+    await safe_edit(callback.message, "Выберите материал для просмотра:", reply_markup=keyboard)
     await callback.answer()
 
 @executor_router.callback_query(F.data.startswith("executor_hide_materials:"))
@@ -2016,25 +2242,15 @@ async def executor_hide_materials_handler(callback: CallbackQuery, state: FSMCon
         await callback.answer("Заказ не найден.", show_alert=True)
         return
 
-    work_type = order.get('work_type', 'N/A').replace('work_type_', '')
-    subject = order.get('subject', 'Не указан')
-    deadline = order.get('deadline', 'Не указан')
-    executor_caption = (
-        f"📬 Вам предложен новый заказ по предмету <b>{subject}</b>\n\n"
-        f"📝 <b>Тип работы:</b> {work_type}\n"
-        f"🗓 <b>Срок сдачи:</b> {deadline}\n\n"
-        "Пожалуйста, ознакомьтесь с материалами заявки и примите решение."
-    )
-    executor_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📎 Посмотреть материалы заказа", callback_data=f"executor_show_materials:{order_id}")],
-        [
-            InlineKeyboardButton(text="✅ Готов взяться", callback_data=f"executor_accept_{order_id}"),
-            InlineKeyboardButton(text="❌ Отказаться", callback_data=f"executor_refuse_{order_id}")
-        ],
-    ])
-    await callback.message.edit_text(executor_caption, parse_mode="HTML", reply_markup=executor_keyboard)
+    executor_caption = render.render(render.EXECUTOR_INVITE, order)
+    executor_keyboard = get_executor_invite_keyboard(order_id)
+    await safe_edit(callback.message, executor_caption, parse_mode="HTML", reply_markup=executor_keyboard)
     await callback.answer()
 
+@executor_router.callback_query(F.data.startswith("executor_material_all:"))
+async def executor_material_all_handler(callback: CallbackQuery, state: FSMContext):
+    await send_all_materials_handler(callback)
+
 @executor_router.callback_query(F.data.startswith("executor_material_guidelines:"))
 async def executor_material_guidelines_handler(callback: CallbackQuery, state: FSMContext):
     order_id = callback.data.split(":", 1)[1]
@@ -2043,11 +2259,7 @@ async def executor_material_guidelines_handler(callback: CallbackQuery, state: F
     if not order or not order.get('guidelines_file'):
         await callback.answer("Методичка не найдена.", show_alert=True)
         return
-    file = order['guidelines_file']
-    if file['type'] == 'photo':
-        await bot.send_photo(callback.from_user.id, file['id'], caption="Методичка")
-    else:
-        await bot.send_document(callback.from_user.id, file['id'], caption="Методичка")
+    await send_materials(bot, callback.from_user.id, order, slots=('guidelines_file',))
     await callback.answer()
 
 @executor_router.callback_query(F.data.startswith("executor_material_task:"))
@@ -2058,14 +2270,7 @@ async def executor_material_task_handler(callback: CallbackQuery, state: FSMCont
     if not order:
         await callback.answer("Задание не найдено.", show_alert=True)
         return
-    if order.get('task_file'):
-        file = order['task_file']
-        if file['type'] == 'photo':
-            await bot.send_photo(callback.from_user.id, file['id'], caption="Задание")
-        else:
-            await bot.send_document(callback.from_user.id, file['id'], caption="Задание")
-    elif order.get('task_text'):
-        await bot.send_message(callback.from_user.id, f"Текст задания:\n\n{order['task_text']}")
+    await send_materials(bot, callback.from_user.id, order, slots=('task_file',))
     await callback.answer()
 
 @executor_router.callback_query(F.data.startswith("executor_material_example:"))
@@ -2076,11 +2281,7 @@ async def executor_material_example_handler(callback: CallbackQuery, state: FSMC
     if not order or not order.get('example_file'):
         await callback.answer("Пример работы не найден.", show_alert=True)
         return
-    file = order['example_file']
-    if file['type'] == 'photo':
-        await bot.send_photo(callback.from_user.id, file['id'], caption="Пример работы")
-    else:
-        await bot.send_document(callback.from_user.id, file['id'], caption="Пример работы")
+    await send_materials(bot, callback.from_user.id, order, slots=('example_file',))
     await callback.answer()
 
 # --- Админ отвечает пользователю ---
@@ -2090,7 +2291,7 @@ async def admin_reply_user_handler(callback: CallbackQuery, state: FSMContext):
     await state.clear()
     await state.update_data(reply_user_id=user_id, reply_msg_id=callback.message.message_id)
     await state.set_state(AdminContact.waiting_for_message)
-    await callback.message.edit_text("✍️ Введите ваш ответ пользователю:")
+    await safe_edit(callback.message, "✍️ Введите ваш ответ пользователю:")
     await callback.answer()
 
 @admin_router.callback_query(F.data == "admin_delete_user_msg")
@@ -2121,15 +2322,22 @@ async def admin_save_to_gsheet_handler(callback: CallbackQuery, state: FSMContex
         order.get("comments", "")
     ]
     try:
-        creds = Credentials.from_service_account_file("google-credentials.json", scopes=["https://www.googleapis.com/auth/spreadsheets"])
-        gc = gspread.authorize(creds)
-        sh = gc.open_by_key(GOOGLE_SHEET_ID)
-        worksheet = sh.sheet1
-        worksheet.append_row(row, value_input_option="USER_ENTERED")
+        # gspread синхронный — выполняем в потоке, чтобы не держать цикл событий
+        await run_blocking(append_row_to_gsheet, row)
         await callback.answer("Заявка сохранена в Google таблицу!", show_alert=True)
     except Exception as e:
         await callback.answer(f"Ошибка при сохранении: {e}", show_alert=True)
 
+def append_row_to_gsheet(row: list):
+    # Тяжёлые библиотеки Google подгружаем только при первом сохранении
+    gspread = require("gspread")
+    service_account = require("google.oauth2.service_account")
+    creds = service_account.Credentials.from_service_account_file("google-credentials.json", scopes=["https://www.googleapis.com/auth/spreadsheets"])
+    gc = gspread.authorize(creds)
+    sh = gc.open_by_key(GOOGLE_SHEET_ID)
+    worksheet = sh.sheet1
+    worksheet.append_row(row, value_input_option="USER_ENTERED")
+
 # FSM для отказа пользователя
 class UserCancelOrder(StatesGroup):
     waiting_for_confirm = State()
@@ -2143,18 +2351,21 @@ USER_CANCEL_REASONS = [
     "Другое (ввести вручную)"
 ]
 
+@order_keyboard
 def get_cancel_confirm_keyboard(order_id):
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="Да", callback_data=f"user_cancel_confirm:{order_id}"),
          InlineKeyboardButton(text="Нет", callback_data="user_cancel_abort")]
     ])
 
+@order_keyboard
 def get_cancel_reason_keyboard(order_id):
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text=reason, callback_data=f"user_cancel_reason:{order_id}:{i}")]
         for i, reason in enumerate(USER_CANCEL_REASONS)
     ])
 
+@order_keyboard
 def get_admin_cancel_accept_keyboard(order_id):
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="❇️ Принято", callback_data=f"admin_accept_cancel:{order_id}")]
@@ -2165,7 +2376,7 @@ async def user_cancel_order_start(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split(":")[1])
     await state.set_state(UserCancelOrder.waiting_for_confirm)
     await state.update_data(cancel_order_id=order_id)
-    await callback.message.edit_text(
+    await safe_edit(callback.message,
         "❗️ Вы уверены, что хотите отказаться от заявки?",
         reply_markup=get_cancel_confirm_keyboard(order_id)
     )
@@ -2176,7 +2387,7 @@ async def user_cancel_confirm(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split(":")[1])
     await state.update_data(cancel_order_id=order_id)
     await state.set_state(UserCancelOrder.waiting_for_reason)
-    await callback.message.edit_text(
+    await safe_edit(callback.message,
         "💬 Пожалуйста, выберите причину отказа:",
         reply_markup=get_cancel_reason_keyboard(order_id)
     )
@@ -2194,7 +2405,7 @@ async def user_cancel_reason(callback: CallbackQuery, state: FSMContext):
     idx = int(idx)
     if USER_CANCEL_REASONS[idx].startswith("Другое"):
         await state.set_state(UserCancelOrder.waiting_for_custom_reason)
-        await callback.message.edit_text("✍️ Пожалуйста, введите причину отказа:")
+        await safe_edit(callback.message, "✍️ Пожалуйста, введите причину отказа:")
         await callback.answer()
         return
     await finish_user_cancel_order(callback, state, order_id, USER_CANCEL_REASONS[idx])
@@ -2207,40 +2418,25 @@ async def user_cancel_custom_reason(message: Message, state: FSMContext):
 
 async def finish_user_cancel_order(message_or_callback, state, order_id, reason):
     user_id = message_or_callback.from_user.id
-    orders = get_user_orders(user_id)
-    updated = False
-    target_order = None # Для получения имени
-    for order in orders:
-        if str(order['order_id']) == str(order_id):
-            order['status'] = "Ожидает удаления"
-            order['cancel_reason'] = reason
-            updated = True
-            target_order = order # Сохраняем заказ
-            break
-    # Обновляем orders.json полностью
-    all_orders = []
-    file_path = "orders.json"
-    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-        with open(file_path, "r", encoding="utf-8") as f:
-            try:
-                all_orders = json.load(f)
-            except json.JSONDecodeError:
-                all_orders = []
-    
+    order_id = int(order_id)
+    order = get_order(order_id)
     found_order = None
-    for i, o in enumerate(all_orders):
-        if str(o.get('order_id')) == str(order_id) and o.get('user_id') == user_id:
-            all_orders[i]['status'] = "Ожидает удаления"
-            all_orders[i]['cancel_reason'] = reason
-            found_order = all_orders[i] # Находим заказ для получения имени
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(all_orders, f, ensure_ascii=False, indent=4)
+    if order and order.user_id == user_id:
+        found_order = fire(order_id, Event.CLIENT_CANCEL, cancel_reason=reason)
     await state.clear()
+    if not found_order:
+        text = "Заявка не найдена или уже отправлена на отмену."
+        if isinstance(message_or_callback, Message):
+            await message_or_callback.answer(text)
+        else:
+            await safe_edit(message_or_callback.message, text)
+            await message_or_callback.answer()
+        return
     # Уведомляем пользователя
     if isinstance(message_or_callback, Message):
         await message_or_callback.answer("⏳ Ваша заявка отправлена на отмену. Ожидайте решения администратора.")
     else:
-        await message_or_callback.message.edit_text("⏳ Ваша заявка отправлена на отмену. Ожидайте решения администратора.")
+        await safe_edit(message_or_callback.message, "⏳ Ваша заявка отправлена на отмену. Ожидайте решения администратора.")
         await message_or_callback.answer()
     
     # Уведомляем администратора, используя полное имя
@@ -2261,23 +2457,15 @@ async def finish_user_cancel_order(message_or_callback, state, order_id, reason)
 async def admin_accept_cancel_handler(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split(":")[1])
     # Удаляем заявку из orders.json
-    file_path = "orders.json"
-    orders = []
-    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-        with open(file_path, "r", encoding="utf-8") as f:
-            try:
-                orders = json.load(f)
-            except json.JSONDecodeError:
-                orders = []
+    orders = get_all_orders()
     # Найти заявку для уведомления клиента
     target_order = next((o for o in orders if str(o.get("order_id")) == str(order_id)), None)
     user_id = target_order.get("user_id") if target_order else None
     work_type = target_order.get("work_type", "") if target_order else ""
     # Удаляем заявку
     new_orders = [o for o in orders if str(o.get("order_id")) != str(order_id)]
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(new_orders, f, ensure_ascii=False, indent=4)
-    await callback.message.edit_text(f"✅ Заявка №{order_id} отменена и удалена.")
+    save_orders(new_orders)
+    await safe_edit(callback.message, f"✅ Заявка №{order_id} отменена и удалена.")
     # Уведомляем клиента
     if user_id:
         emoji = "❌"
@@ -2293,6 +2481,7 @@ class AdminSelfTake(StatesGroup):
     waiting_for_confirm = State()
 
 # --- Клавиатуры для вариантов цены и срока ---
+@static_keyboard
 def get_admin_price_keyboard():
     buttons = [
         [InlineKeyboardButton(text=f"{i} ₽", callback_data=f"admin_price_{i}") for i in range(500, 2501, 500)],
@@ -2301,6 +2490,7 @@ def get_admin_price_keyboard():
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@static_keyboard
 def get_admin_deadline_keyboard():
     buttons = [
         [InlineKeyboardButton(text="1 день", callback_data="admin_deadline_1 день"),
@@ -2310,11 +2500,13 @@ def get_admin_deadline_keyboard():
     ]
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
+@static_keyboard
 def get_admin_skip_comment_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➡️ Пропустить", callback_data="admin_skip_comment")]
     ])
 
+@static_keyboard
 def get_admin_self_confirm_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="💳 Отправить на оплату", callback_data="admin_self_send_to_pay")]
@@ -2327,7 +2519,7 @@ async def admin_self_take_start(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split("_")[-1])
     await state.update_data(order_id=order_id)
     await state.set_state(AdminSelfTake.waiting_for_price)
-    await callback.message.edit_text("💰 Выберите или введите цену для клиента, или напишите вручную(только число):", reply_markup=get_admin_price_keyboard())
+    await safe_edit(callback.message, "💰 Выберите или введите цену для клиента, или напишите вручную(только число):", reply_markup=get_admin_price_keyboard())
     await callback.answer()
 
 @admin_router.callback_query(F.data.startswith("admin_price_"), AdminSelfTake.waiting_for_price)
@@ -2335,19 +2527,19 @@ async def admin_self_take_price_choice(callback: CallbackQuery, state: FSMContex
     price = callback.data.split("_")[-1]
     await state.update_data(price=price)
     await state.set_state(AdminSelfTake.waiting_for_deadline)
-    await callback.message.edit_text("⏳ Выберите или введите срок выполнения, или напишите вручную(колл-во дней) :", reply_markup=get_admin_deadline_keyboard())
+    await safe_edit(callback.message, "⏳ Выберите или введите срок выполнения, или напишите вручную(колл-во дней) :", reply_markup=get_admin_deadline_keyboard())
     await callback.answer()
 
 @admin_router.callback_query(F.data == "admin_price_manual", AdminSelfTake.waiting_for_price)
 async def admin_self_take_price_manual(callback: CallbackQuery, state: FSMContext):
-    await callback.message.edit_text("💰 Введите цену вручную (только число):")
+    await safe_edit(callback.message, "💰 Введите цену вручную (только число):")
     # Не обязательно снова ставить состояние, если оно уже стоит
     await state.set_state(AdminSelfTake.waiting_for_price)
     await callback.answer()
 
 @admin_router.message(AdminSelfTake.waiting_for_price)
 async def admin_self_take_price_manual_input(message: Message, state: FSMContext):
-    print("Ввод вручную цены:", message.text)
+    logging.debug("Ввод вручную цены: %s", message.text)
     if not message.text.isdigit():
         await message.answer("Пожалуйста, введите только число.")
         return
@@ -2360,12 +2552,12 @@ async def admin_self_take_deadline_choice(callback: CallbackQuery, state: FSMCon
     deadline = callback.data.split("_", 2)[-1]
     await state.update_data(deadline=deadline)
     await state.set_state(AdminSelfTake.waiting_for_comment)
-    await callback.message.edit_text("💬 Добавьте комментарий к заказу (или пропустите этот шаг):", reply_markup=get_admin_skip_comment_keyboard())
+    await safe_edit(callback.message, "💬 Добавьте комментарий к заказу (или пропустите этот шаг):", reply_markup=get_admin_skip_comment_keyboard())
     await callback.answer()
 
 @admin_router.callback_query(F.data == "admin_deadline_manual", AdminSelfTake.waiting_for_deadline)
 async def admin_self_take_deadline_manual(callback: CallbackQuery, state: FSMContext):
-    await callback.message.edit_text("⏳ Введите срок вручную:")
+    await safe_edit(callback.message, "⏳ Введите срок вручную:")
     await state.set_state(AdminSelfTake.waiting_for_deadline)
     await callback.answer()
 
@@ -2424,30 +2616,24 @@ async def admin_self_take_send_to_pay(callback: CallbackQuery, state: FSMContext
     deadline = data.get("deadline")
     comment = data.get("comment", "")
     # Обновляем заказ в JSON
-    orders = get_all_orders()
-    target_order = None
-    for order in orders:
-        if order.get("order_id") == order_id:
-            order['executor_offer'] = {
-                'price': price,
-                'deadline': deadline,
-                'executor_id': int(ADMIN_ID),
-                'executor_username': 'admin',
-                'executor_full_name': get_full_name(callback.from_user),
-                'executor_comment': comment
-            }
-            order['status'] = "Ожидает оплаты"
-            target_order = order
-            break
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
+    target_order = fire(order_id, Event.ADMIN_SELF_TAKE, executor_offer={
+        'price': price,
+        'deadline': deadline,
+        'executor_id': int(ADMIN_ID),
+        'executor_username': 'admin',
+        'executor_full_name': get_full_name(callback.from_user),
+        'executor_comment': comment
+    })
+    if not target_order:
+        await state.clear()
+        await callback.answer("Заказ не найден или уже передан в работу.", show_alert=True)
+        return
     # Уведомление клиенту
     customer_id = target_order.get('user_id')
     if customer_id:
         deadline_str = pluralize_days(deadline) if isinstance(deadline, str) and deadline.isdigit() else deadline
-        work_type = target_order.get('work_type', 'N/A').replace('work_type_', '')
         customer_text = f"""
-✅ Исполнитель найден! Ваша заявка на тему: {work_type} готова к оплате!
+✅ Исполнитель найден! Ваша заявка на тему: {Order.from_dict(target_order).work_type_title} готова к оплате!
 
 <b>Итоговая стоимость:</b> {price} ₽.
 <b>Срок:</b> {deadline_str}
@@ -2461,7 +2647,7 @@ async def admin_self_take_send_to_pay(callback: CallbackQuery, state: FSMContext
             await bot.send_message(customer_id, customer_text, parse_mode="HTML", reply_markup=keyboard)
         except Exception:
             await callback.message.answer(f"⚠️ Не удалось уведомить клиента {customer_id}")
-    await callback.message.edit_text(f"✅ Ваше предложение по заказу №{order_id} отправлено клиенту. Ожидаем оплату.")
+    await safe_edit(callback.message, f"✅ Ваше предложение по заказу №{order_id} отправлено клиенту. Ожидаем оплату.")
     await state.clear()
 
 @executor_router.callback_query(F.data.startswith("executor_back_to_materials:"))
@@ -2490,32 +2676,20 @@ async def executor_back_to_invite_handler(callback: CallbackQuery, state: FSMCon
     if not order:
         await callback.answer("Заказ не найден.", show_alert=True)
         return
-    work_type = order.get('work_type', 'N/A').replace('work_type_', '')
-    subject = order.get('subject', 'Не указан')
-    deadline = order.get('deadline', 'Не указан')
-    executor_caption = (
-        f"📬 Вам предложен новый заказ по предмету <b>{subject}</b>\n\n"
-        f"📝 <b>Тип работы:</b> {work_type}\n"
-        f"🗓 <b>Срок сдачи:</b> {deadline}\n\n"
-        "Пожалуйста, ознакомьтесь с материалами заявки и примите решение."
-    )
-    executor_keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text="📎 Посмотреть материалы заказа", callback_data=f"executor_show_materials:{order_id}")],
-        [
-            InlineKeyboardButton(text="✅ Готов взяться", callback_data=f"executor_accept_{order_id}"),
-            InlineKeyboardButton(text="❌ Отказаться", callback_data=f"executor_refuse_{order_id}")
-        ],
-    ])
-    await callback.message.edit_text(executor_caption, parse_mode="HTML", reply_markup=executor_keyboard)
+    executor_caption = render.render(render.EXECUTOR_INVITE, order)
+    executor_keyboard = get_executor_invite_keyboard(order_id)
+    await safe_edit(callback.message, executor_caption, parse_mode="HTML", reply_markup=executor_keyboard)
     await callback.answer()
 
 # --- Клавиатура подтверждения для исполнителя ---
+@order_keyboard
 def get_executor_final_confirm_keyboard(order_id):
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Отправить", callback_data=f"executor_send_offer:{order_id}"),
          InlineKeyboardButton(text="❌ Отказаться", callback_data=f"executor_refuse_{order_id}")]
     ])
 
+@order_keyboard
 def get_client_work_approval_keyboard(order_id):
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Принять работу", callback_data=f"client_accept_work:{order_id}")],
@@ -2523,6 +2697,13 @@ def get_client_work_approval_keyboard(order_id):
     ])
 
 async def main():
+    check_optional_dependencies()
+    file_mirror.start(bot)
+    offer_timeouts.start(expire_offer)
+    await backup.start()
+    dashboard.start()
+    matching.start()
+    search.start()
     await dp.start_polling(bot)
    
 if __name__ == "__main__":
@@ -2531,17 +2712,12 @@ if __name__ == "__main__":
 @router.callback_query(F.data.startswith("client_accept_work:"))
 async def client_accept_work(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split(':')[-1])
-    orders = get_all_orders()
-    target_order = next((o for o in orders if o.get('order_id') == order_id), None)
+    target_order = fire(order_id, Event.CLIENT_ACCEPT)
     if not target_order:
-        await callback.answer("Заказ не найден", show_alert=True)
+        await callback.answer("Заказ не найден или работа уже принята.", show_alert=True)
         return
-    
-    target_order['status'] = "Выполнена"
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
 
-    await callback.message.edit_text("🎉 Спасибо, что приняли работу! Рады были помочь.")
+    await safe_edit(callback.message, "🎉 Спасибо, что приняли работу! Рады были помочь.")
     
     # Уведомления
     if target_order.get('executor_id'):
@@ -2559,7 +2735,7 @@ async def client_request_revision(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split(':')[-1])
     await state.set_state(ClientRevision.waiting_for_revision_comment)
     await state.update_data(revision_order_id=order_id)
-    await callback.message.edit_text("✍️ Пожалуйста, подробно опишите, какие доработки требуются. Ваше сообщение будет передано исполнителю.")
+    await safe_edit(callback.message, "✍️ Пожалуйста, подробно опишите, какие доработки требуются. Ваше сообщение будет передано исполнителю.")
     await callback.answer()
 
 @router.message(ClientRevision.waiting_for_revision_comment)
@@ -2568,17 +2744,11 @@ async def process_revision_comment(message: Message, state: FSMContext):
     order_id = data.get('revision_order_id')
     comment = message.text
     
-    orders = get_all_orders()
-    target_order = next((o for o in orders if o.get('order_id') == order_id), None)
+    target_order = fire(order_id, Event.CLIENT_REVISION, revision_comment=comment)
     if not target_order:
         await message.answer("Не удалось найти заказ для отправки на доработку.")
         await state.clear()
         return
-
-    target_order['status'] = "На доработке"
-    target_order['revision_comment'] = comment
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
         
     await message.answer("✅ Замечания отправлены исполнителю. Ожидайте исправления.")
     
@@ -0,0 +1,260 @@
+"""Подбор исполнителя для заявки.
+
+По каждому исполнителю ведётся статистика, которая обновляется на переходах
+заявок (transitions.add_transition_listener), а не пересчитывается по всему
+orders.json: сколько заказов ему предлагали, сколько он принял и от скольких
+отказался, какие предметы и типы работ выполнил, сколько заказов у него сейчас
+в работе и за сколько в среднем он сдаёт работу после оплаты.
+
+rank() оценивает исполнителей для конкретной заявки по этой статистике —
+несколько словарных обращений на исполнителя, без чтения файлов — и отдаёт их
+от лучшего к худшему; в таком порядке они показываются в клавиатуре назначения.
+
+Статистика сохраняется в EXECUTOR_STATS_FILE раз в EXECUTOR_STATS_SAVE_INTERVAL
+секунд и при остановке бота вместе с отметкой orders.json. Если при запуске
+отметка не совпала (бот упал или заявки правили в обход него), всё, что
+выводится из заявок — выполненные заказы, предметы, типы работ, заказы в
+работе, — пересчитывается по ним; из файла берутся только счётчики
+предложений, принятий, отказов и время сдачи — этих данных в заявках нет.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+
+import storage
+from models import Order, OrderStatus as S
+from transitions import Event, add_transition_listener
+
+EXECUTOR_STATS_FILE = os.getenv("EXECUTOR_STATS_FILE", "executor_stats.json")
+EXECUTOR_STATS_SAVE_INTERVAL = int(os.getenv("EXECUTOR_STATS_SAVE_INTERVAL", "600"))  # сек
+
+# Вес признаков в оценке исполнителя
+SUBJECT_WEIGHT = 2.0
+WORK_TYPE_WEIGHT = 1.0
+ACCEPT_WEIGHT = 1.0
+REFUSE_WEIGHT = 1.5
+LOAD_PENALTY = 0.3  # за каждый заказ в работе
+SPEED_WEIGHT = 0.5
+
+_IN_PROGRESS = (S.EXECUTOR_FOUND, S.WAITING_PAYMENT, S.ACCEPTED, S.IN_WORK, S.SUBMITTED, S.APPROVED, S.REVISION)
+
+
+class ExecutorStats:
+    __slots__ = ("offers", "accepts", "refusals", "completed", "subjects", "work_types",
+                 "active", "started", "turnaround_sum", "turnaround_count")
+
+    def __init__(self):
+        self.offers = 0
+        self.accepts = 0
+        self.refusals = 0
+        self.completed = 0
+        self.subjects = Counter()
+        self.work_types = Counter()
+        self.active = set()   # заказы в работе у исполнителя
+        self.started = {}     # order_id -> время подтверждения оплаты
+        self.turnaround_sum = 0.0  # сек от оплаты до сдачи работы
+        self.turnaround_count = 0
+
+    @property
+    def accept_rate(self) -> float:
+        # сглаживание: у нового исполнителя 50%, а не 0 или 100
+        return (self.accepts + 1) / (self.offers + 2)
+
+    @property
+    def refuse_rate(self) -> float:
+        return self.refusals / (self.offers + 2)
+
+    @property
+    def avg_turnaround_days(self) -> float | None:
+        if not self.turnaround_count:
+            return None
+        return self.turnaround_sum / self.turnaround_count / 86400
+
+    def to_dict(self) -> dict:
+        return {
+            "offers": self.offers,
+            "accepts": self.accepts,
+            "refusals": self.refusals,
+            "completed": self.completed,
+            "subjects": dict(self.subjects),
+            "work_types": dict(self.work_types),
+            "active": sorted(self.active),
+            "started": {str(k): v for k, v in self.started.items()},
+            "turnaround_sum": self.turnaround_sum,
+            "turnaround_count": self.turnaround_count,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "ExecutorStats":
+        stats = cls()
+        stats.offers = d.get("offers", 0)
+        stats.accepts = d.get("accepts", 0)
+        stats.refusals = d.get("refusals", 0)
+        stats.completed = d.get("completed", 0)
+        stats.subjects = Counter(d.get("subjects") or {})
+        stats.work_types = Counter(d.get("work_types") or {})
+        stats.active = set(d.get("active") or ())
+        stats.started = {int(k): v for k, v in (d.get("started") or {}).items()}
+        stats.turnaround_sum = d.get("turnaround_sum", 0.0)
+        stats.turnaround_count = d.get("turnaround_count", 0)
+        return stats
+
+
+_stats = {}  # executor_id -> ExecutorStats
+_loaded = False
+_task = None
+
+
+def _ensure_stats():
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    saved = storage.read_json(EXECUTOR_STATS_FILE)
+    if isinstance(saved, dict) and isinstance(saved.get("executors"), dict):
+        for executor_id, d in saved["executors"].items():
+            _stats[int(executor_id)] = ExecutorStats.from_dict(d)
+        if saved.get("stamp") is not None and saved["stamp"] == storage.orders_stamp():
+            return
+        logging.info("Статистика исполнителей устарела, пересчитываем по заявкам")
+    _rebuild(entry[2] for entry in storage.snapshot_index())
+
+
+def _rebuild(orders):
+    """Пересчитывает по заявкам то, что из них выводится; счётчики предложений не трогает."""
+    for stats in _stats.values():
+        stats.completed = 0
+        stats.subjects.clear()
+        stats.work_types.clear()
+        stats.active.clear()
+    paid = set()
+    for order in orders:
+        if not order.executor_id:
+            continue
+        stats = get_stats(order.executor_id)
+        if order.status == S.DONE:
+            _complete(stats, order)
+        elif order.status in _IN_PROGRESS:
+            stats.active.add(order.order_id)
+            if order.status in (S.ACCEPTED, S.IN_WORK):
+                paid.add(order.order_id)
+    for stats in _stats.values():
+        stats.started = {k: v for k, v in stats.started.items() if k in paid}
+
+
+def get_stats(executor_id) -> ExecutorStats:
+    _ensure_stats()
+    executor_id = int(executor_id)
+    stats = _stats.get(executor_id)
+    if stats is None:
+        stats = _stats[executor_id] = ExecutorStats()
+    return stats
+
+
+def _complete(stats: ExecutorStats, order: Order):
+    stats.completed += 1
+    if order.subject:
+        stats.subjects[order.subject] += 1
+    if order.work_type:
+        stats.work_types[str(order.work_type)] += 1
+    stats.active.discard(order.order_id)
+
+
+@add_transition_listener
+def _on_transition(event: Event, old: Order, new: Order | None):
+    offer_round = old.extra.get('offer_round') if old.extra else None
+    if offer_round is not None and not (new is not None and new.extra and new.extra.get('offer_round')):
+        # предложение из раунда засчитывается, когда раунд закрыт: те, кому
+        # приглашение не доставлено или кто отказался, в offers не попадают
+        for invited in offer_round['executors']:
+            if invited not in offer_round['declined']:
+                get_stats(invited).offers += 1
+    executor_id = old.executor_id or (new.executor_id if new else None)
+    if not executor_id:
+        return
+    stats = get_stats(executor_id)
+    order_id = old.order_id
+    if event is Event.OFFER_TO_EXECUTOR:
+        stats.offers += 1
+    elif event is Event.OFFER_UNDELIVERED:
+        stats.offers -= 1
+    elif event in (Event.EXECUTOR_ACCEPT, Event.OFFER_ROUND_CLOSE):
+        stats.accepts += 1
+        stats.active.add(order_id)
+    elif event is Event.EXECUTOR_REFUSE:
+        stats.refusals += 1
+        stats.active.discard(order_id)
+        stats.started.pop(order_id, None)
+    elif event is Event.PAYMENT_CONFIRMED:
+        stats.started[order_id] = time.time()
+    elif event is Event.WORK_SUBMITTED:
+        started = stats.started.pop(order_id, None)
+        if started is not None:
+            stats.turnaround_sum += time.time() - started
+            stats.turnaround_count += 1
+    elif event is Event.CLIENT_ACCEPT and new is not None:
+        _complete(stats, new)
+    elif event in (Event.ADMIN_REJECT_OFFER, Event.CLIENT_CANCEL):
+        stats.active.discard(order_id)
+        stats.started.pop(order_id, None)
+
+
+def score(stats: ExecutorStats, order: Order) -> float:
+    result = ACCEPT_WEIGHT * stats.accept_rate - REFUSE_WEIGHT * stats.refuse_rate
+    result -= LOAD_PENALTY * len(stats.active)
+    if stats.completed:
+        if order.subject:
+            result += SUBJECT_WEIGHT * stats.subjects.get(order.subject, 0) / stats.completed
+        if order.work_type:
+            result += WORK_TYPE_WEIGHT * stats.work_types.get(str(order.work_type), 0) / stats.completed
+    days = stats.avg_turnaround_days
+    if days is not None:
+        result += SPEED_WEIGHT / (1 + days)
+    return result
+
+
+def rank(order: Order | None, executors: list) -> list:
+    """Исполнители (словари из executors.json) от лучшего к худшему для заявки."""
+    if order is None:
+        return list(executors)
+    return sorted(executors, key=lambda ex: score(get_stats(ex['id']), order), reverse=True)
+
+
+def describe(stats: ExecutorStats, order: Order) -> str:
+    """Короткая сводка для кнопки: опыт по предмету, загрузка, доля принятых предложений."""
+    parts = []
+    if order.subject and stats.subjects.get(order.subject):
+        parts.append(f"📚{stats.subjects[order.subject]}")
+    parts.append(f"🛠{len(stats.active)}")
+    if stats.offers:
+        parts.append(f"👍{round(stats.accept_rate * 100)}%")
+    return " ".join(parts)
+
+
+async def _run():
+    while True:
+        await asyncio.sleep(EXECUTOR_STATS_SAVE_INTERVAL)
+        save()
+
+
+def start() -> bool:
+    global _task
+    if _task is not None:
+        return False
+    _ensure_stats()
+    _task = asyncio.create_task(_run())
+    return True
+
+
+def save():
+    if not _loaded:
+        return
+    try:
+        storage.write_json(EXECUTOR_STATS_FILE, {
+            "stamp": storage.orders_stamp(),
+            "executors": {str(k): v.to_dict() for k, v in _stats.items()},
+        })
+    except OSError:
+        logging.exception("Не удалось сохранить статистику исполнителей")
@@ -0,0 +1,75 @@
+"""Отправка материалов заказа.
+
+Методичка, задание и пример (в каждом слоте — один файл или альбом) отправляются
+через sendMediaGroup вместо отдельного запроса на каждый файл. По правилам
+Telegram фото и документы в одном альбоме не смешиваются, поэтому файлы делятся
+на альбом фото и альбом документов (не больше MEDIA_GROUP_LIMIT в каждом). Одиночный файл уходит обычным
+sendPhoto/sendDocument, текст задания — отдельным сообщением.
+"""
+from aiogram.types import InputMediaDocument, InputMediaPhoto
+
+MEDIA_GROUP_LIMIT = 10
+
+# Поле заявки -> подпись к файлу
+MATERIAL_SLOTS = (
+    ('guidelines_file', "📄 Методичка"),
+    ('task_file', "📑 Задание"),
+    ('example_file', "📄 Пример работы"),
+)
+
+
+def slot_files(value) -> list:
+    """Файлы слота списком: в orders.json один файл хранится словарём, альбом — списком."""
+    if not value:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def collect_materials(order: dict, slots=None) -> list:
+    """Список (подпись, файл) для приложенных к заявке файлов."""
+    result = []
+    for slot, caption in MATERIAL_SLOTS:
+        if slots is not None and slot not in slots:
+            continue
+        files = slot_files(order.get(slot))
+        for i, file in enumerate(files, 1):
+            result.append((f"{caption} {i}/{len(files)}" if len(files) > 1 else caption, file))
+    return result
+
+
+def has_materials(order: dict) -> bool:
+    return bool(collect_materials(order) or order.get('task_text'))
+
+
+def build_media_groups(files: list) -> list:
+    """Делит файлы на группы, которые можно отправить одним запросом."""
+    photos, documents = [], []
+    for caption, file in files:
+        if file.get('type') == 'photo':
+            photos.append(InputMediaPhoto(media=file['id'], caption=caption))
+        else:
+            documents.append(InputMediaDocument(media=file['id'], caption=caption))
+    groups = []
+    for media in (photos, documents):
+        for i in range(0, len(media), MEDIA_GROUP_LIMIT):
+            groups.append(media[i:i + MEDIA_GROUP_LIMIT])
+    return groups
+
+
+async def send_materials(bot, chat_id: int, order: dict, slots=None) -> int:
+    """Отправляет материалы заказа (все или только из slots); возвращает число запросов к API."""
+    calls = 0
+    for group in build_media_groups(collect_materials(order, slots)):
+        if len(group) == 1:
+            item = group[0]
+            if isinstance(item, InputMediaPhoto):
+                await bot.send_photo(chat_id, item.media, caption=item.caption)
+            else:
+                await bot.send_document(chat_id, item.media, caption=item.caption)
+        else:
+            await bot.send_media_group(chat_id, group)
+        calls += 1
+    if (slots is None or 'task_file' in slots) and order.get('task_text') and not order.get('task_file'):
+        await bot.send_message(chat_id, f"📑 Текст задания:\n\n{order['task_text']}")
+        calls += 1
+    return calls
@@ -0,0 +1,109 @@
+"""Редактирование сообщений без лишних запросов.
+
+safe_edit() заменяет message.edit_text():
+- помнит отпечаток последнего текста и разметки для (чат, сообщение) и не
+  отправляет правку, которая ничего не меняет;
+- пока правка сообщения в полёте, следующие правки того же сообщения не уходят
+  сразу: остаётся только последняя, и она отправляется, когда первая завершится;
+- разбирает ошибки API: «message is not modified» — не ошибка, при
+  RetryAfter правка повторяется после паузы, удалённое или нередактируемое
+  сообщение заменяется новым, у сообщения с файлом правится подпись.
+  Остальные ошибки пробрасываются как есть.
+"""
+import asyncio
+import logging
+from collections import Counter, OrderedDict
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+EDIT_CACHE_SIZE = 5000
+MAX_RETRY_AFTER = 5  # сек; дольше ждать ради правки не имеет смысла
+
+_last = OrderedDict()  # (chat_id, message_id) -> отпечаток
+_inflight = {}         # (chat_id, message_id) -> _Pending
+stats = Counter()
+
+
+class _Pending:
+    __slots__ = ("args", "done")
+
+    def __init__(self):
+        self.args = None
+        self.done = asyncio.Event()
+
+
+def _fingerprint(text, reply_markup, parse_mode) -> int:
+    markup = reply_markup.model_dump_json(exclude_none=True) if reply_markup is not None else None
+    return hash((text, markup, parse_mode))
+
+
+def _remember(key, fingerprint):
+    _last[key] = fingerprint
+    _last.move_to_end(key)
+    if len(_last) > EDIT_CACHE_SIZE:
+        _last.popitem(last=False)
+
+
+def forget(chat_id: int, message_id: int):
+    """Сбрасывает отпечаток, если сообщение правили в обход safe_edit."""
+    _last.pop((chat_id, message_id), None)
+
+
+async def _edit(message, key, text, reply_markup, parse_mode, kwargs):
+    fingerprint = _fingerprint(text, reply_markup, parse_mode)
+    if _last.get(key) == fingerprint:
+        stats["skipped"] += 1
+        return message
+    for attempt in range(2):
+        try:
+            result = await message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode, **kwargs)
+            stats["sent"] += 1
+            _remember(key, fingerprint)
+            return result
+        except TelegramRetryAfter as e:
+            if attempt or e.retry_after > MAX_RETRY_AFTER:
+                raise
+            stats["retry_after"] += 1
+            await asyncio.sleep(e.retry_after)
+        except TelegramBadRequest as e:
+            error = e.message.lower()
+            if "message is not modified" in error:
+                stats["not_modified"] += 1
+                _remember(key, fingerprint)
+                return message
+            if "there is no text in the message" in error:
+                stats["caption"] += 1
+                result = await message.edit_caption(caption=text, reply_markup=reply_markup, parse_mode=parse_mode)
+                _remember(key, fingerprint)
+                return result
+            if "message to edit not found" in error or "message can't be edited" in error:
+                stats["replaced"] += 1
+                _last.pop(key, None)
+                return await message.answer(text, reply_markup=reply_markup, parse_mode=parse_mode, **kwargs)
+            raise
+
+
+async def safe_edit(message, text: str, reply_markup=None, parse_mode=None, **kwargs):
+    key = (message.chat.id, message.message_id)
+    pending = _inflight.get(key)
+    if pending is not None:
+        if pending.args is not None:
+            stats["coalesced"] += 1
+        pending.args = (text, reply_markup, parse_mode, kwargs)
+        await pending.done.wait()
+        return message
+
+    pending = _inflight[key] = _Pending()
+    try:
+        result = await _edit(message, key, text, reply_markup, parse_mode, kwargs)
+        # Пока шла правка, могли прийти новые: отправляем только последнюю
+        while pending.args is not None:
+            args, pending.args = pending.args, None
+            try:
+                await _edit(message, key, *args)
+            except Exception:
+                logging.exception("Не удалось применить отложенную правку сообщения %s", key)
+        return result
+    finally:
+        del _inflight[key]
+        pending.done.set()
@@ -0,0 +1,232 @@
+"""Middleware диспетчера.
+
+IdempotencyMiddleware отбрасывает повторы до того, как отработает обработчик:
+- то же update_id (Telegram повторно доставляет апдейт после таймаута);
+- то же нажатие (чат, сообщение, callback_data): для одноразовых действий
+  (подтверждение оплаты, утверждение условий, отправка работы) повтор
+  отбрасывается долго, для остальных кнопок — только двойное нажатие.
+
+Ключи живут в ограниченном TTL-кэше в памяти. Если задан IDEMPOTENCY_FILE,
+кэш сохраняется при остановке бота и подгружается при старте.
+
+ThrottlingMiddleware ограничивает частоту запросов одного пользователя:
+токен-бакет на пару (пользователь, класс запроса). Пользователь, упёршийся в
+лимит, получает одно вежливое сообщение, дальше запросы молча отбрасываются.
+"""
+import logging
+import os
+import time
+from collections import Counter, OrderedDict
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+import storage
+
+IDEMPOTENCY_FILE = os.getenv("IDEMPOTENCY_FILE")
+IDEMPOTENCY_CACHE_SIZE = 10000
+UPDATE_TTL = 3600          # сек, повторная доставка апдейта
+ONE_SHOT_TTL = 3600        # сек, повтор одноразового действия
+DOUBLE_TAP_TTL = 1.5       # сек, двойное нажатие любой другой кнопки
+
+# Кнопки, которые должны сработать ровно один раз на сообщение
+ONE_SHOT_CALLBACK_PREFIXES = (
+    "admin_payment_accept:", "admin_payment_reject:",
+    "admin_confirm_payment:", "admin_reject_payment:",
+    "final_approve_", "final_reject_",
+    "admin_approve_work_", "admin_accept_cancel:",
+    "admin_self_send_to_pay",
+    "executor_accept_", "executor_send_offer:", "executor_send_work_",
+    "client_accept_work:", "confirm_order",
+)
+
+
+class TTLCache:
+    """Ограниченный кэш ключей со сроком жизни; вытесняет самые старые."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data = OrderedDict()  # ключ -> время истечения (time.time())
+
+    def __len__(self):
+        return len(self._data)
+
+    def add(self, key, ttl: float) -> bool:
+        """Добавляет ключ; False, если он уже есть и не истёк."""
+        now = time.time()
+        expires = self._data.get(key)
+        if expires is not None and expires > now:
+            return False
+        self._data[key] = now + ttl
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+        return True
+
+    def discard(self, key):
+        self._data.pop(key, None)
+
+    def dump(self) -> list:
+        now = time.time()
+        return [[list(key), expires] for key, expires in self._data.items() if expires > now]
+
+    def load(self, items: list):
+        now = time.time()
+        for key, expires in items:
+            if expires > now:
+                self._data[tuple(key)] = expires
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+
+class IdempotencyMiddleware(BaseMiddleware):
+    def __init__(self, maxsize: int = IDEMPOTENCY_CACHE_SIZE, path: str | None = IDEMPOTENCY_FILE):
+        self.cache = TTLCache(maxsize)
+        self.path = path
+        self.duplicates = 0
+        if path:
+            self.cache.load(storage.read_json(path, []))
+
+    def save(self):
+        if self.path:
+            storage.write_json(self.path, self.cache.dump())
+
+    async def __call__(self, handler, event: Update, data: dict):
+        keys = [("update", event.update_id)]
+        ttls = [UPDATE_TTL]
+        callback = event.callback_query
+        if callback and callback.message and callback.data:
+            keys.append(("callback", callback.message.chat.id, callback.message.message_id, callback.data))
+            ttls.append(ONE_SHOT_TTL if callback.data.startswith(ONE_SHOT_CALLBACK_PREFIXES) else DOUBLE_TAP_TTL)
+
+        added = []
+        for key, ttl in zip(keys, ttls):
+            if not self.cache.add(key, ttl):
+                for done in added:
+                    self.cache.discard(done)
+                self.duplicates += 1
+                logging.info("Повтор %s отброшен", key)
+                if callback:
+                    try:
+                        await callback.answer()
+                    except Exception:
+                        pass
+                return None
+            added.append(key)
+
+        try:
+            return await handler(event, data)
+        except Exception:
+            # Обработчик упал — повторная попытка должна пройти
+            for key in added:
+                self.cache.discard(key)
+            raise
+
+
+# Класс запроса -> (ёмкость бакета, пополнение токенов в секунду)
+THROTTLE_RATES = {
+    "heavy": (3, 0.2),      # кнопки, которые перечитывают orders.json
+    "command": (5, 0.5),
+    "callback": (10, 2.0),
+    "message": (10, 1.0),
+}
+# Тексты кнопок меню, которые дороже прочих
+HEAVY_TEXTS = frozenset({"📂 Мои заявки", "🆕 Новая заявка", "📂 Мои заказы", "📦 Все заказы"})
+THROTTLE_SWEEP_EVERY = 1000  # как часто чистить простаивающие бакеты, в запросах
+ALBUM_TTL = 60  # сек, сколько помнить решение по альбому (media_group_id)
+THROTTLED_TEXT = "⏳ Слишком много запросов. Подождите немного и попробуйте снова."
+
+
+def classify(event: Update) -> str | None:
+    if event.message and event.message.from_user:
+        text = event.message.text or ""
+        if text in HEAVY_TEXTS:
+            return "heavy"
+        return "command" if text.startswith("/") else "message"
+    if event.callback_query:
+        return "callback"
+    return None
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, rates: dict = THROTTLE_RATES, exempt_ids=()):
+        self.rates = rates
+        self.exempt_ids = frozenset(exempt_ids)
+        # (user_id, класс) -> [токены, время последнего пополнения, уже предупреждён]
+        self._buckets = {}
+        self._albums = {}  # media_group_id -> (время первой части, пропущен ли)
+        self._calls = 0
+        self.passed = Counter()
+        self.throttled = Counter()
+
+    def _take(self, key, capacity: float, rate: float, now: float) -> list | None:
+        """Забирает токен; возвращает бакет, если токена не хватило."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._buckets[key] = [capacity - 1, now, False]
+            return None
+        tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            bucket[2] = False
+            return None
+        bucket[0] = tokens
+        return bucket
+
+    def _sweep(self, now: float):
+        # Бакет, который успел наполниться до краёв, ничем не отличается от отсутствующего
+        for key in [k for k, (tokens, ts, _) in self._buckets.items()
+                    if tokens + (now - ts) * self.rates[k[1]][1] >= self.rates[k[1]][0]]:
+            del self._buckets[key]
+        for group in [g for g, (ts, _) in self._albums.items() if now - ts > ALBUM_TTL]:
+            del self._albums[group]
+
+    async def __call__(self, handler, event: Update, data: dict):
+        kind = classify(event)
+        user = event.message.from_user if event.message else (
+            event.callback_query.from_user if event.callback_query else None)
+        if kind is None or user is None or user.id in self.exempt_ids:
+            return await handler(event, data)
+
+        now = time.monotonic()
+        self._calls += 1
+        if self._calls % THROTTLE_SWEEP_EVERY == 0:
+            self._sweep(now)
+
+        # Альбом — одно сообщение: токен берёт первая часть, остальные получают то же
+        # решение. Иначе альбом из 10 фото с подписью обрезался бы ещё до albums.py
+        group = event.message.media_group_id if event.message else None
+        if group and group in self._albums:
+            if self._albums[group][1]:
+                self.passed[kind] += 1
+                return await handler(event, data)
+            self.throttled[kind] += 1
+            return None
+
+        capacity, rate = self.rates[kind]
+        bucket = self._take((user.id, kind), capacity, rate, now)
+        if group:
+            self._albums[group] = (now, bucket is None)
+        if bucket is None:
+            self.passed[kind] += 1
+            return await handler(event, data)
+
+        self.throttled[kind] += 1
+        warned, bucket[2] = bucket[2], True
+        try:
+            if event.callback_query:
+                await event.callback_query.answer(None if warned else THROTTLED_TEXT)
+            elif not warned:
+                await event.message.answer(THROTTLED_TEXT)
+        except Exception:
+            pass
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "buckets": len(self._buckets),
+            "passed": dict(self.passed),
+            "throttled": dict(self.throttled),
+            "throttled_users": len({uid for (uid, _), b in self._buckets.items() if b[2]}),
+        }
@@ -0,0 +1,343 @@
+"""Типизированная модель заявки.
+
+Заявки хранятся в orders.json как обычные словари. Здесь описано их компактное
+представление в памяти (dataclass со __slots__, статусы и типы работ — enum,
+повторяющиеся строки интернируются) и быстрые кодеки dict <-> Order.
+"""
+import sys
+from dataclasses import dataclass
+from enum import Enum
+
+
+class OrderStatus(str, Enum):
+    DRAFT = "Редактируется"
+    NEW = "Рассматривается"
+    WAITING_CONFIRMATION = "Ожидает подтверждения"
+    EXECUTOR_FOUND = "Исполнитель найден"
+    WAITING_PAYMENT = "Ожидает оплаты"
+    ACCEPTED = "Принята"
+    IN_WORK = "В работе"
+    SUBMITTED = "Отправлен на проверку"
+    APPROVED = "Утверждено администратором"
+    REVISION = "На доработке"
+    DONE = "Выполнена"
+    CANCEL_REQUESTED = "Ожидает удаления"
+    CANCELLED = "Отменена"
+
+    # Ведём себя как обычная строка: в f-строках, str() и как ключ словаря
+    __str__ = str.__str__
+    __format__ = str.__format__
+    __hash__ = str.__hash__
+
+
+WORK_TYPE_PREFIX = "work_type_"
+
+
+class WorkType(str, Enum):
+    CONTROL = "work_type_Контрольная"
+    CALC_GRAPHIC = "work_type_Расчётно-графическая"
+    COURSEWORK = "work_type_Курсовая"
+    TEST = "work_type_Тест"
+    REPORT = "work_type_Отчёт"
+    DIPLOMA = "work_type_Диплом"
+    OTHER = "work_type_other"
+
+    __str__ = str.__str__
+    __format__ = str.__format__
+    __hash__ = str.__hash__
+
+    @property
+    def title(self) -> str:
+        return self.value[len(WORK_TYPE_PREFIX):]
+
+
+# Предметы из клавиатуры выбора: (подпись кнопки, название предмета)
+SUBJECTS = (
+    ("Мат. анализ", "Математический анализ"),
+    ("Алгебра", "Алгебра и геометрия"),
+    ("Программирование", "Программирование"),
+    ("История", "История России"),
+    ("Философия", "Философия"),
+    ("Английский язык", "Английский язык"),
+    ("Экономика", "Экономическая теория"),
+    ("Русский язык", "Русский язык и культура речи"),
+)
+
+_STATUS_BY_VALUE = {s.value: s for s in OrderStatus}
+_WORK_TYPE_BY_VALUE = {w.value: w for w in WorkType}
+
+
+def parse_status(value):
+    """Возвращает OrderStatus или интернированную строку для неизвестных статусов."""
+    if value is None or isinstance(value, OrderStatus):
+        return value
+    return _STATUS_BY_VALUE.get(value) or sys.intern(value)
+
+
+def parse_work_type(value):
+    """Возвращает WorkType или интернированную строку для введённых вручную типов."""
+    if value is None or isinstance(value, WorkType):
+        return value
+    return _WORK_TYPE_BY_VALUE.get(value) or sys.intern(value)
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+@dataclass(slots=True)
+class FileRef:
+    id: str
+    type: str = "document"
+    sha256: str | None = None  # хэш локальной копии (file_mirror), если она есть
+
+    @classmethod
+    def from_dict(cls, d):
+        if not d:
+            return None
+        return cls(d['id'], sys.intern(d.get('type', 'document')), d.get('sha256'))
+
+    def to_dict(self) -> dict:
+        d = {'id': self.id, 'type': self.type}
+        if self.sha256:
+            d['sha256'] = self.sha256
+        return d
+
+
+def parse_files(value):
+    """Слот с файлами: один файл хранится словарём, альбом — списком словарей."""
+    if not value:
+        return None
+    if isinstance(value, list):
+        return [FileRef.from_dict(d) for d in value if d]
+    return FileRef.from_dict(value)
+
+
+def dump_files(value):
+    if not value:
+        return None
+    if isinstance(value, list):
+        return [f.to_dict() for f in value]
+    return value.to_dict()
+
+
+@dataclass(slots=True)
+class ExecutorOffer:
+    price: object = None
+    deadline: str | None = None
+    executor_id: int | None = None
+    executor_username: str | None = None
+    executor_full_name: str | None = None
+    executor_comment: str = ""
+
+    @classmethod
+    def from_dict(cls, d):
+        if not d:
+            return None
+        return cls(
+            d.get('price'),
+            _intern(d.get('deadline')),
+            d.get('executor_id'),
+            d.get('executor_username'),
+            d.get('executor_full_name'),
+            d.get('executor_comment', ""),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            'price': self.price,
+            'deadline': self.deadline,
+            'executor_id': self.executor_id,
+            'executor_username': self.executor_username,
+            'executor_full_name': self.executor_full_name,
+            'executor_comment': self.executor_comment,
+        }
+
+
+@dataclass(slots=True)
+class SubmittedWork:
+    file_id: str
+    file_name: str | None = None
+
+    @classmethod
+    def from_dict(cls, d):
+        if not d:
+            return None
+        return cls(d.get('file_id'), d.get('file_name'))
+
+    def to_dict(self) -> dict:
+        return {'file_id': self.file_id, 'file_name': self.file_name}
+
+
+# Ключи анкеты, которые всегда пишутся в orders.json (в том числе со значением null)
+_FORM_KEYS = (
+    'group_name', 'university_name', 'teacher_name', 'gradebook', 'subject',
+    'work_type', 'has_guidelines', 'guidelines_file', 'task_file', 'task_text',
+    'has_example', 'example_file', 'deadline', 'comments',
+)
+# Ключи, которые появляются по ходу жизни заявки и не пишутся, если не заданы
+_OPTIONAL_KEYS = (
+    'work_type_other_name', 'status', 'user_id', 'username', 'first_name', 'last_name',
+    'creation_date', 'order_id', 'final_price', 'cancel_reason',
+    'executor_cancel_reason', 'executor_cancel_comment', 'executor_id',
+    'executor_offer', 'submitted_work', 'submitted_at', 'revision_comment',
+)
+_KNOWN_KEYS = frozenset(_FORM_KEYS + _OPTIONAL_KEYS)
+
+
+@dataclass(slots=True)
+class Order:
+    order_id: int | None = None
+    status: OrderStatus | str | None = None
+    user_id: int | None = None
+    username: str | None = None
+    first_name: str | None = None
+    last_name: str | None = None
+    creation_date: str | None = None
+    group_name: str | None = None
+    university_name: str | None = None
+    teacher_name: str | None = None
+    gradebook: str | None = None
+    subject: str | None = None
+    work_type: WorkType | str | None = None
+    work_type_other_name: str | None = None
+    has_guidelines: bool | None = None
+    guidelines_file: FileRef | list[FileRef] | None = None
+    task_file: FileRef | list[FileRef] | None = None
+    task_text: str | None = None
+    has_example: bool | None = None
+    example_file: FileRef | list[FileRef] | None = None
+    deadline: str | None = None
+    comments: str | None = None
+    final_price: object = None
+    cancel_reason: str | None = None
+    executor_cancel_reason: str | None = None
+    executor_cancel_comment: str | None = None
+    executor_id: int | None = None
+    executor_offer: ExecutorOffer | None = None
+    submitted_work: SubmittedWork | None = None
+    submitted_at: str | None = None
+    revision_comment: str | None = None
+    # Ключи, о которых модель не знает: сохраняем как есть, чтобы ничего не терять
+    extra: dict | None = None
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "Order":
+        extra = None
+        if not _KNOWN_KEYS.issuperset(d):
+            extra = {k: v for k, v in d.items() if k not in _KNOWN_KEYS}
+        return cls(
+            order_id=d.get('order_id'),
+            status=parse_status(d.get('status')),
+            user_id=d.get('user_id'),
+            username=d.get('username'),
+            first_name=d.get('first_name'),
+            last_name=d.get('last_name'),
+            creation_date=d.get('creation_date'),
+            group_name=_intern(d.get('group_name')),
+            university_name=_intern(d.get('university_name')),
+            teacher_name=_intern(d.get('teacher_name')),
+            gradebook=d.get('gradebook'),
+            subject=_intern(d.get('subject')),
+            work_type=parse_work_type(d.get('work_type')),
+            work_type_other_name=d.get('work_type_other_name'),
+            has_guidelines=d.get('has_guidelines'),
+            guidelines_file=parse_files(d.get('guidelines_file')),
+            task_file=parse_files(d.get('task_file')),
+            task_text=d.get('task_text'),
+            has_example=d.get('has_example'),
+            example_file=parse_files(d.get('example_file')),
+            deadline=_intern(d.get('deadline')),
+            comments=d.get('comments'),
+            final_price=d.get('final_price'),
+            cancel_reason=d.get('cancel_reason'),
+            executor_cancel_reason=_intern(d.get('executor_cancel_reason')),
+            executor_cancel_comment=d.get('executor_cancel_comment'),
+            executor_id=d.get('executor_id'),
+            executor_offer=ExecutorOffer.from_dict(d.get('executor_offer')),
+            submitted_work=SubmittedWork.from_dict(d.get('submitted_work')),
+            submitted_at=d.get('submitted_at'),
+            revision_comment=d.get('revision_comment'),
+            extra=extra,
+        )
+
+    def to_dict(self) -> dict:
+        """Словарь в том же формате, что хранится в orders.json."""
+        d = {
+            'group_name': self.group_name,
+            'university_name': self.university_name,
+            'teacher_name': self.teacher_name,
+            'gradebook': self.gradebook,
+            'subject': self.subject,
+            'work_type': self.work_type.value if isinstance(self.work_type, WorkType) else self.work_type,
+            'has_guidelines': self.has_guidelines,
+            'guidelines_file': dump_files(self.guidelines_file),
+            'task_file': dump_files(self.task_file),
+            'task_text': self.task_text,
+            'has_example': self.has_example,
+            'example_file': dump_files(self.example_file),
+            'deadline': self.deadline,
+            'comments': self.comments,
+        }
+        for key in _OPTIONAL_KEYS:
+            value = getattr(self, key)
+            if value is None:
+                continue
+            if isinstance(value, Enum):
+                value = value.value
+            elif isinstance(value, (ExecutorOffer, SubmittedWork)):
+                value = value.to_dict()
+            d[key] = value
+        if self.extra:
+            d.update(self.extra)
+        return d
+
+    # --- Удобные представления для текстов сообщений ---
+
+    @property
+    def work_type_title(self) -> str:
+        """Тип работы без префикса work_type_ (для 'other' — введённое название)."""
+        if self.work_type is None:
+            return "Не указан"
+        if self.work_type is WorkType.OTHER:
+            return self.work_type_other_name or "Другое"
+        if isinstance(self.work_type, WorkType):
+            return self.work_type.title
+        return self.work_type.replace(WORK_TYPE_PREFIX, "")
+
+    @property
+    def full_name(self) -> str:
+        full = f"{self.first_name or ''} {self.last_name or ''}".strip()
+        return full if full else "Без имени"
+
+    @property
+    def has_task(self) -> bool:
+        return bool(self.task_file or self.task_text)
+
+    @property
+    def has_materials(self) -> bool:
+        return bool(self.guidelines_file or self.task_file or self.task_text or self.example_file)
+
+    @property
+    def offered_deadline(self):
+        """Срок исполнителя, а если оффера нет — дедлайн клиента."""
+        if self.executor_offer and self.executor_offer.deadline:
+            return self.executor_offer.deadline
+        return self.deadline or ''
+
+    @property
+    def price(self):
+        """Итоговая цена, а если её ещё нет — цена из оффера исполнителя."""
+        if self.final_price:
+            return self.final_price
+        if self.executor_offer and self.executor_offer.price is not None:
+            return self.executor_offer.price
+        return '—'
+
+
+def orders_from_dicts(items) -> list:
+    return [Order.from_dict(d) for d in items if isinstance(d, dict)]
+
+
+def orders_to_dicts(orders) -> list:
+    return [o.to_dict() for o in orders]
@@ -0,0 +1,102 @@
+"""Раунды предложений: заказ рассылается сразу нескольким исполнителям.
+
+Вместо того чтобы ждать ответа одного исполнителя, админ рассылает заказ
+MULTI_OFFER_SIZE лучшим (по matching.rank) исполнителям. Пока раунд открыт,
+заявка в статусе «Ожидает подтверждения» и хранит его в поле offer_round:
+
+    {"executors": [id, ...], "offers": {"id": {price, deadline, ...}},
+     "declined": [id, ...], "max_price": 5000 | null}
+
+Условия каждого исполнителя добавляются в offers. Раунд закрывается
+событием OFFER_ROUND_CLOSE через transitions.fire, то есть compare-and-set по
+статусу: из двух одновременных закрытий (админ выбрал предложение и пришло
+предложение не дороже max_price) выполняется только первое. Если отказались
+все приглашённые, заявка возвращается в «Рассматривается».
+
+Раунд открыт, только пока заявка в «Ожидает подтверждения»: изменения раунда
+тоже идут compare-and-set по этому статусу, а любой переход из него (в том
+числе отмена клиентом) удаляет offer_round.
+"""
+import os
+
+import storage
+from models import Order, OrderStatus as S
+from offer_timeouts import due_time
+from transitions import Event, fire
+
+MULTI_OFFER_SIZE = int(os.getenv("MULTI_OFFER_SIZE", "3"))
+
+
+def get_round(order: Order | None) -> dict | None:
+    """Открытый раунд заявки; None, если заявка уже не ждёт подтверждения."""
+    if order is None or order.status != S.WAITING_CONFIRMATION or not order.extra:
+        return None
+    return order.extra.get('offer_round')
+
+
+def open_round(order_id, executor_ids: list, max_price: int | None = None) -> dict | None:
+    return fire(order_id, Event.OFFER_ROUND_OPEN, offer_due=due_time(), offer_round={
+        'executors': list(executor_ids),
+        'offers': {},
+        'declined': [],
+        'max_price': max_price,
+    })
+
+
+def _update_round(order_id, change) -> dict | None:
+    """Меняет открытый раунд; возвращает раунд после изменения или None, если он закрыт."""
+    def apply(order: dict):
+        offer_round = order.get('offer_round')
+        if offer_round is not None:
+            change(offer_round)
+    updated = storage.compare_and_set(order_id, S.WAITING_CONFIRMATION, apply)
+    return updated.get('offer_round') if updated else None
+
+
+def add_offer(order_id, executor_id: int, offer: dict) -> dict | None:
+    """Добавляет условия исполнителя; None — раунд уже закрыт или исполнителя в нём нет."""
+    def change(offer_round):
+        if executor_id in offer_round['executors'] and executor_id not in offer_round['declined']:
+            offer_round['offers'][str(executor_id)] = offer
+    offer_round = _update_round(order_id, change)
+    if offer_round is None or str(executor_id) not in offer_round['offers']:
+        return None
+    return offer_round
+
+
+def decline(order_id, executor_id: int) -> dict | None:
+    def change(offer_round):
+        if executor_id in offer_round['executors'] and executor_id not in offer_round['declined']:
+            offer_round['declined'].append(executor_id)
+            offer_round['offers'].pop(str(executor_id), None)
+    return _update_round(order_id, change)
+
+
+def is_exhausted(offer_round: dict) -> bool:
+    """Все приглашённые отказались, предложений нет."""
+    return not offer_round['offers'] and set(offer_round['declined']) >= set(offer_round['executors'])
+
+
+def is_acceptable(offer_round: dict, price) -> bool:
+    max_price = offer_round.get('max_price')
+    try:
+        return max_price is not None and int(price) <= max_price
+    except (TypeError, ValueError):
+        return False
+
+
+def close(order_id, executor_id: int):
+    """Закрывает раунд предложением executor_id. Возвращает (заявка или None, раунд)."""
+    offer_round = get_round(storage.get_order(order_id))
+    if offer_round is None:
+        return None, None
+    offer = offer_round['offers'].get(str(executor_id))
+    if offer is None:
+        return None, offer_round
+    target = fire(order_id, Event.OFFER_ROUND_CLOSE, executor_id=executor_id,
+                  executor_offer=offer, final_price=int(offer['price']))
+    return target, offer_round
+
+
+def cancel(order_id) -> dict | None:
+    return fire(order_id, Event.OFFER_ROUND_CANCEL)
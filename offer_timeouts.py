@@ -0,0 +1,94 @@
+"""Истечение приглашений, на которые исполнитель не ответил.
+
+При предложении заказа (OFFER_TO_EXECUTOR или раунд предложений) в заявку
+записывается срок ответа offer_due (unix-время), и заявка попадает в кучу
+(срок, order_id). Один фоновый цикл спит до ближайшего срока — список заявок
+не опрашивается, тысячи ожидающих приглашений стоят O(log n) на добавление.
+Новый более ранний срок будит цикл.
+
+Отменять записи в куче не нужно: когда срок наступает, заявка сверяется с
+памятью storage, и запись просто пропускается, если исполнитель уже ответил
+или заявке назначен другой срок. Поскольку срок хранится в самой заявке, после
+перезапуска куча восстанавливается одним проходом по заявкам.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import time
+
+import storage
+from models import OrderStatus as S
+from transitions import Event, add_transition_listener
+
+OFFER_TIMEOUT = int(os.getenv("OFFER_TIMEOUT", str(4 * 3600)))  # сек на ответ исполнителя
+OFFER_REOFFER_LIMIT = int(os.getenv("OFFER_REOFFER_LIMIT", "2"))  # сколько раз передать заказ следующему
+
+_heap = []  # (срок, order_id)
+_wakeup = None
+_task = None
+
+
+def due_time() -> int:
+    return int(time.time()) + OFFER_TIMEOUT
+
+
+def schedule(order_id, due):
+    heapq.heappush(_heap, (due, order_id))
+    if _wakeup is not None and _heap[0] == (due, order_id):
+        _wakeup.set()
+
+
+def offer_due(order):
+    return order.extra.get('offer_due') if order is not None and order.extra else None
+
+
+def is_pending(order, due) -> bool:
+    """Приглашение с этим сроком всё ещё ждёт ответа."""
+    return (order is not None and order.status == S.WAITING_CONFIRMATION
+            and order.executor_offer is None and offer_due(order) == due)
+
+
+@add_transition_listener
+def _on_transition(event: Event, old, new):
+    if event in (Event.OFFER_TO_EXECUTOR, Event.OFFER_ROUND_OPEN) and offer_due(new):
+        schedule(new.order_id, offer_due(new))
+
+
+async def _run(on_expire):
+    while True:
+        _wakeup.clear()
+        while _heap and _heap[0][0] <= time.time():
+            due, order_id = heapq.heappop(_heap)
+            order = storage.get_order(order_id)
+            if not is_pending(order, due):
+                continue
+            try:
+                await on_expire(order)
+            except Exception:
+                logging.exception("Ошибка при истечении приглашения по заказу %s", order_id)
+        timeout = _heap[0][0] - time.time() if _heap else None
+        try:
+            await asyncio.wait_for(_wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start(on_expire) -> bool:
+    """Восстанавливает сроки из заявок и запускает цикл; on_expire(order) — корутина."""
+    global _task, _wakeup
+    if _task is not None:
+        return False
+    for _, _, order in storage.snapshot_index():
+        due = offer_due(order)
+        if due and is_pending(order, due):
+            _heap.append((due, order.order_id))
+    heapq.heapify(_heap)
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(_run(on_expire))
+    logging.info("Ожидают ответа исполнителя: %d приглашений", len(_heap))
+    return True
+
+
+def pending_count() -> int:
+    return len(_heap)
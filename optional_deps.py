@@ -0,0 +1,113 @@
+"""Ленивая загрузка тяжёлых необязательных зависимостей.
+
+gspread, google-auth, qrcode (с Pillow), numpy, openpyxl и pyarrow нужны только
+в паре обработчиков, а их
+импорт занимает заметную часть времени старта. Модули подгружаются при первом
+обращении через require(), а при запуске бота check_optional_dependencies()
+только ищет их (importlib.util.find_spec, без импорта) и сразу падает с понятным
+сообщением, если чего-то не хватает. Без пакетов из NON_FATAL бот стартует:
+обработчик, которому они нужны, сам отвечает, что пакет не установлен.
+
+Замер стоимости импорта каждой зависимости:
+
+    python optional_deps.py
+"""
+import functools
+import importlib
+import importlib.util
+import logging
+import os
+import re
+import subprocess
+import sys
+
+# модуль -> (пакет для pip, для чего нужен)
+OPTIONAL_DEPENDENCIES = {
+    "gspread": ("gspread", "сохранения заявок в Google таблицу"),
+    "google.oauth2.service_account": ("google-auth", "авторизации в Google таблицах"),
+    "qrcode": ("qrcode", "QR-кода для оплаты"),
+    "PIL": ("pillow", "картинки с QR-кодом"),
+    "numpy": ("numpy", "аналитики по заявкам"),
+    "openpyxl": ("openpyxl", "выгрузки заявок в XLSX"),
+    "pyarrow": ("pyarrow", "выгрузки заявок в Parquet"),
+}
+# без них недоступны только /analytics и форматы /export — в лог, но не повод не стартовать
+NON_FATAL = frozenset({"numpy", "openpyxl", "pyarrow"})
+
+
+class MissingDependencyError(RuntimeError):
+    pass
+
+
+def _missing_message(module_name: str) -> str:
+    package, purpose = OPTIONAL_DEPENDENCIES.get(module_name, (module_name, module_name))
+    return f"Для {purpose} нужен пакет {package}: pip install {package}"
+
+
+@functools.cache
+def require(module_name: str):
+    """Импортирует модуль при первом обращении; дальше отдаёт его из кэша."""
+    try:
+        return importlib.import_module(module_name)
+    except ImportError as e:
+        raise MissingDependencyError(_missing_message(module_name)) from e
+
+
+def _is_installed(module_name: str) -> bool:
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def check_optional_dependencies(strict: bool | None = None) -> list:
+    """Проверяет наличие зависимостей без их импорта.
+
+    По умолчанию (OPTIONAL_DEPS_STRICT=1) при нехватке пакета бот не стартует,
+    с OPTIONAL_DEPS_STRICT=0 только пишет предупреждение в лог. Пакеты из
+    NON_FATAL в любом случае только попадают в предупреждение.
+    """
+    if strict is None:
+        strict = os.getenv("OPTIONAL_DEPS_STRICT", "1") != "0"
+    missing = [name for name in OPTIONAL_DEPENDENCIES if not _is_installed(name)]
+    if missing:
+        message = "Не установлены зависимости:\n" + "\n".join(_missing_message(name) for name in missing)
+        if strict and any(name not in NON_FATAL for name in missing):
+            raise SystemExit(message)
+        logging.warning(message)
+    return missing
+
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+\d+\s+\|\s+(\d+)\s+\|\s*(\S+)")
+
+
+def measure_import_time(module_name: str) -> float | None:
+    """Кумулятивное время импорта модуля в отдельном процессе (python -X importtime), мс."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return None
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match and match.group(2) == module_name:
+            return int(match.group(1)) / 1000
+    return None
+
+
+def main():
+    total = 0.0
+    for name, (package, _) in OPTIONAL_DEPENDENCIES.items():
+        elapsed = measure_import_time(name)
+        if elapsed is None:
+            print(f"{name:<32}не установлен ({package})")
+            continue
+        total += elapsed
+        print(f"{name:<32}{elapsed:>8.1f} мс")
+    # google-auth входит и в gspread, поэтому сумма — оценка сверху
+    print(f"{'сумма (оценка сверху)':<32}{total:>8.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
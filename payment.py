@@ -4,10 +4,15 @@ from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKe
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from datetime import datetime, timedelta
-import qrcode
-from shared import get_all_orders, ADMIN_ID, bot, STATUS_EMOJI_MAP, get_full_name, pluralize_days
+from shared import ADMIN_ID, bot, STATUS_EMOJI_MAP, pluralize_days
 from aiogram.types import BufferedInputFile
-import json
+from models import Order, OrderStatus
+from storage import get_all_orders, get_order, compare_and_set
+from optional_deps import require
+from keyboards import static_keyboard, order_keyboard
+from transitions import Event, fire
+from scheduler import run_blocking
+from message_editor import safe_edit
 
 payment_router = Router()
 
@@ -32,12 +37,14 @@ EXECUTOR_CANCEL_REASONS = [
 ]
 
 # --- Клавиатуры ---
+@order_keyboard
 def get_payment_keyboard(order_id):
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Я оплатил", callback_data=f"payment_paid:{order_id}")],
         [InlineKeyboardButton(text="❌ Отменить оплату", callback_data=f"payment_cancel:{order_id}")]
     ])
 
+@order_keyboard
 def get_admin_payment_check_keyboard(order_id):
     return InlineKeyboardMarkup(inline_keyboard=[
         [
@@ -46,30 +53,35 @@ def get_admin_payment_check_keyboard(order_id):
         ]
     ])
 
+@order_keyboard
 def get_executor_work_keyboard(order_id):
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="🚀 Начинаю работу", callback_data=f"executor_start_work:{order_id}")],
         [InlineKeyboardButton(text="❌ Отказаться", callback_data=f"executor_refuse_work:{order_id}")]
     ])
 
+@order_keyboard
 def get_executor_cancel_confirm_keyboard(order_id):
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Да", callback_data=f"executor_cancel_confirm:{order_id}"),
          InlineKeyboardButton(text="❌ Нет", callback_data="executor_cancel_abort")]
     ])
 
+@order_keyboard
 def get_executor_cancel_reason_keyboard(order_id):
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text=reason, callback_data=f"executor_cancel_reason:{order_id}:{i}")]
         for i, reason in enumerate(EXECUTOR_CANCEL_REASONS)
     ])
 
+@static_keyboard
 def get_executor_skip_comment_keyboard():
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="➡️ Пропустить", callback_data="executor_skip_comment")]
     ])
 
 def generate_qr_code(payment_url: str) -> BufferedInputFile:
+    qrcode = require("qrcode")  # вместе с Pillow грузится только при первой оплате
     img = qrcode.make(payment_url)
     buf = io.BytesIO()
     img.save(buf, format='PNG')
@@ -83,16 +95,15 @@ async def start_payment(callback: CallbackQuery, state: FSMContext):
     # Здесь можно получить сумму заказа из orders.json
     # Для примера:
     orders = get_all_orders()
-    order = next((o for o in orders if o['order_id'] == order_id), None)
+    order = next((Order.from_dict(o) for o in orders if o['order_id'] == order_id), None)
     if not order:
         await callback.answer("Заказ не найден.", show_alert=True)
         return
-    price = order.get('final_price') or order.get('executor_offer', {}).get('price', '—')
-    subject = order.get('subject', 'Не указан')
-    work_type = order.get('work_type', 'Не указан').replace('work_type_', '')
+    price = order.price
+    subject = order.subject or 'Не указан'
     # Генерируем ссылку для оплаты (заглушка)
     payment_url = f"https://qr.nspk.ru/FAKE-SBP-ORDER-{order_id}-{price}"
-    qr = generate_qr_code(payment_url)
+    qr = await run_blocking(generate_qr_code, payment_url)
     # Сохраняем время старта сессии
     await state.set_state(PaymentState.waiting_for_payment)
     await state.update_data(payment_order_id=order_id, payment_start=datetime.now().isoformat())
@@ -116,20 +127,21 @@ async def payment_screenshot(message: Message, state: FSMContext):
     data = await state.get_data()
     order_id = data.get('payment_order_id')
     orders = get_all_orders()
-    order = next((o for o in orders if o['order_id'] == order_id), None)
+    order = next((Order.from_dict(o) for o in orders if o['order_id'] == order_id), None)
     if not order:
         await message.answer("Заказ не найден.")
         await state.clear()
         return
-    price = order.get('final_price') or order.get('executor_offer', {}).get('price', '—')
-    subject = order.get('subject', 'Не указан')
-    work_type = order.get('work_type', 'Не указан').replace('work_type_', '')
-    full_name = get_full_name(order)
+    # Скриншот ждёт проверки: по этому флагу отклонение оплаты срабатывает один раз
+    if not compare_and_set(order_id, OrderStatus.WAITING_PAYMENT, lambda o: o.update(payment_pending=True)):
+        await message.answer("Заказ уже не ожидает оплаты.")
+        await state.clear()
+        return
     # Пересылаем админу
-    caption = f"💸 Новый скриншот оплаты по заказу \"{work_type}\"\n" \
-              f"👤 Клиент: <b>{full_name}</b>\n" \
-              f"📚 Предмет: <b>{subject}</b>\n" \
-              f"Сумма: <b>{price} ₽</b>\n\n" \
+    caption = f"💸 Новый скриншот оплаты по заказу \"{order.work_type_title}\"\n" \
+              f"👤 Клиент: <b>{order.full_name}</b>\n" \
+              f"📚 Предмет: <b>{order.subject or 'Не указан'}</b>\n" \
+              f"Сумма: <b>{order.price} ₽</b>\n\n" \
               "Проверьте и подтвердите оплату."
     if message.photo:
         file_id = message.photo[-1].file_id
@@ -140,23 +152,26 @@ async def payment_screenshot(message: Message, state: FSMContext):
     await state.clear()
 
 # --- Админ подтверждает или отклоняет оплату ---
+def reject_payment(order_id: int) -> dict | None:
+    """Отклоняет присланный скриншот; None — заявки нет или скриншот уже рассмотрен."""
+    order = get_order(order_id)
+    if order is None or not (order.extra or {}).get('payment_pending'):
+        return None
+    return fire(order_id, Event.PAYMENT_REJECTED)
+
 @payment_router.callback_query(F.data.startswith("admin_payment_accept:"))
 async def admin_payment_accept(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split(":")[1])
-    orders = get_all_orders()
-    order = next((o for o in orders if o['order_id'] == order_id), None)
+    order = fire(order_id, Event.PAYMENT_CONFIRMED)
     if not order:
-        await callback.answer("Заказ не найден.", show_alert=True)
+        await callback.answer("Заказ не найден или оплата уже подтверждена.", show_alert=True)
         return
-    order['status'] = "В работе"
-    # Сохраняем orders.json
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
     # Уведомляем клиента
-    user_id = order.get('user_id')
+    model = Order.from_dict(order)
+    user_id = model.user_id
     emoji = STATUS_EMOJI_MAP.get('В работе', '⏳')
+    deadline_executor = model.offered_deadline
     if user_id:
-        deadline_executor = order.get('executor_offer', {}).get('deadline') or order.get('deadline', '')
         deadline_executor_str = pluralize_days(deadline_executor) if isinstance(deadline_executor, str) and deadline_executor.isdigit() else deadline_executor
         await bot.send_message(
             user_id,
@@ -165,11 +180,10 @@ async def admin_payment_accept(callback: CallbackQuery, state: FSMContext):
             parse_mode="HTML"
         )
     # Уведомляем исполнителя
-    executor_id = order.get('executor_offer', {}).get('executor_id')
-    deadline_executor = order.get('executor_offer', {}).get('deadline') or order.get('deadline', '')
-    deadline_client = order.get('deadline', 'Не указан')
-    subject = order.get('subject', 'Не указан')
-    work_type = order.get('work_type', 'Не указан').replace('work_type_', '')
+    executor_id = model.executor_offer.executor_id if model.executor_offer else None
+    deadline_client = model.deadline or 'Не указан'
+    subject = model.subject or 'Не указан'
+    work_type = model.work_type_title
     deadline_executor_str = pluralize_days(deadline_executor) if isinstance(deadline_executor, str) and deadline_executor.isdigit() else deadline_executor
     if executor_id:
         keyboard = InlineKeyboardMarkup(inline_keyboard=[
@@ -196,37 +210,32 @@ async def admin_payment_accept(callback: CallbackQuery, state: FSMContext):
 @payment_router.callback_query(F.data.startswith("admin_payment_reject:"))
 async def admin_payment_reject(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split(":")[1])
-    orders = get_all_orders()
-    order = next((o for o in orders if o['order_id'] == order_id), None)
+    # Статус остаётся 'Ожидает оплаты'
+    order = reject_payment(order_id)
     if not order:
-        await callback.answer("Заказ не найден.", show_alert=True)
+        await callback.answer("Заказ не найден или оплата уже рассмотрена.", show_alert=True)
         return
     user_id = order.get('user_id')
-    # Меняем статус на 'Ожидает оплаты'
-    order['status'] = "Ожидает оплаты"
-    # Сохраняем orders.json
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
     if user_id:
         await bot.send_message(user_id, "❌ Оплата не подтверждена. Пожалуйста, попробуйте ещё раз или обратитесь к администратору.")
     try:
         await callback.message.delete()
     except Exception:
         pass
-    await callback.message.edit_text("Оплата отменена.")
+    await safe_edit(callback.message, "Оплата отменена.")
     await callback.answer()
 
 # --- Отмена оплаты пользователем ---
 @payment_router.callback_query(F.data.startswith("payment_cancel:"), PaymentState)
 async def payment_cancel(callback: CallbackQuery, state: FSMContext):
     await state.clear()
-    await callback.message.edit_text("Оплата отменена.")
+    await safe_edit(callback.message, "Оплата отменена.")
     await callback.answer()
 
 # --- Обработка кнопки 'Начинаю работу' ---
 @payment_router.callback_query(F.data.startswith("executor_start_work:"))
 async def executor_start_work(callback: CallbackQuery, state: FSMContext):
-    await callback.message.edit_text("Заказ успешно перешел в работу ⏳")
+    await safe_edit(callback.message, "Заказ успешно перешел в работу ⏳")
     await callback.answer()
 
 # --- Обработка кнопки 'Отказаться' ---
@@ -235,7 +244,7 @@ async def executor_refuse_work(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split(":")[-1])
     await state.set_state(ExecutorCancelOrder.waiting_for_confirm)
     await state.update_data(cancel_order_id=order_id)
-    await callback.message.edit_text(
+    await safe_edit(callback.message,
         "❗️ Вы уверены что хотите отказаться от заказа?",
         reply_markup=get_executor_cancel_confirm_keyboard(order_id)
     )
@@ -245,7 +254,7 @@ async def executor_refuse_work(callback: CallbackQuery, state: FSMContext):
 async def executor_cancel_confirm(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split(":")[-1])
     await state.set_state(ExecutorCancelOrder.waiting_for_reason)
-    await callback.message.edit_text(
+    await safe_edit(callback.message,
         "📃 Пожалуйста, выберите причину отказа:",
         reply_markup=get_executor_cancel_reason_keyboard(order_id)
     )
@@ -263,7 +272,7 @@ async def executor_cancel_reason(callback: CallbackQuery, state: FSMContext):
     idx = int(idx)
     if EXECUTOR_CANCEL_REASONS[idx].startswith("Другое"):
         await state.set_state(ExecutorCancelOrder.waiting_for_custom_reason)
-        await callback.message.edit_text("✍️ Пожалуйста, введите причину отказа:", reply_markup=get_executor_skip_comment_keyboard())
+        await safe_edit(callback.message, "✍️ Пожалуйста, введите причину отказа:", reply_markup=get_executor_skip_comment_keyboard())
         await callback.answer()
         return
     await finish_executor_cancel_order(callback, state, order_id, EXECUTOR_CANCEL_REASONS[idx], "")
@@ -281,27 +290,20 @@ async def executor_skip_comment(callback: CallbackQuery, state: FSMContext):
     await finish_executor_cancel_order(callback, state, order_id, "Другое", "")
 
 async def finish_executor_cancel_order(message_or_callback, state, order_id, reason, comment):
-    # Обновляем заказ
-    orders = get_all_orders()
-    updated = False
-    for order in orders:
-        if str(order['order_id']) == str(order_id):
-            order['status'] = "Рассматривается"
-            order['executor_cancel_reason'] = reason
-            order['executor_cancel_comment'] = comment
-            order.pop('executor_offer', None)
-            order.pop('executor_id', None)  # Удаляем исполнителя
-            updated = True
-            break
-    # Сохраняем orders.json
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
+    # Обновляем заказ, исполнитель снимается в переходе
+    target_order = fire(int(order_id), Event.EXECUTOR_REFUSE, executor_cancel_reason=reason, executor_cancel_comment=comment)
     await state.clear()
+    if not target_order:
+        if isinstance(message_or_callback, Message):
+            await message_or_callback.answer("Заказ уже не актуален.")
+        else:
+            await message_or_callback.answer("Заказ уже не актуален.", show_alert=True)
+        return
     # Уведомляем исполнителя
     if isinstance(message_or_callback, Message):
         await message_or_callback.answer("❎ Заказ отменен, администратор получит уведомление")
     else:
-        await message_or_callback.message.edit_text("❎ Заказ отменен, администратор получит уведомление")
+        await safe_edit(message_or_callback.message, "❎ Заказ отменен, администратор получит уведомление")
         await message_or_callback.answer()
     # Уведомляем администратора
     admin_text = f"""
@@ -315,17 +317,11 @@ async def finish_executor_cancel_order(message_or_callback, state, order_id, rea
 async def admin_confirm_payment(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split(":")[-1])
 
-    all_orders = get_all_orders()
-    target_order = next((o for o in all_orders if o.get("order_id") == order_id), None)
-
+    # Меняем статус
+    target_order = fire(order_id, Event.PAYMENT_CONFIRMED)
     if not target_order:
-        await callback.answer("Заказ не найден.", show_alert=True)
+        await callback.answer("Заказ не найден или оплата уже подтверждена.", show_alert=True)
         return
-    
-    # Меняем статус
-    target_order['status'] = "В работе"
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(all_orders, f, ensure_ascii=False, indent=4)
 
     # Уведомления
     customer_id = target_order.get("user_id")
@@ -341,7 +337,7 @@ async def admin_confirm_payment(callback: CallbackQuery, state: FSMContext):
         f"<b>Исполнитель:</b> {executor_full_name}\n"
         f"<b>Срок сдачи работы:</b> {deadline_str}"
     )
-    await callback.message.edit_text(admin_text, parse_mode="HTML")
+    await safe_edit(callback.message, admin_text, parse_mode="HTML")
 
     # Уведомление клиенту
     if customer_id:
@@ -358,9 +354,10 @@ async def admin_confirm_payment(callback: CallbackQuery, state: FSMContext):
     # Уведомление исполнителю
     if executor_id:
         try:
-            deadline_client = target_order.get("deadline", "не указан")
-            subject = target_order.get("subject", "не указан")
-            work_type = target_order.get("work_type", "").replace("work_type_", "")
+            order = Order.from_dict(target_order)
+            deadline_client = order.deadline or "не указан"
+            subject = order.subject or "не указан"
+            work_type = order.work_type_title
             executor_text = (
                 f"✅ Клиент оплатил заказ! Можно приступать к работе.\n\n"
                 f"<b>Предмет:</b> {subject}\n"
@@ -378,18 +375,11 @@ async def admin_confirm_payment(callback: CallbackQuery, state: FSMContext):
 async def admin_reject_payment(callback: CallbackQuery, state: FSMContext):
     order_id = int(callback.data.split(":")[-1])
 
-    orders = get_all_orders()
-    target_order = next((o for o in orders if o.get("order_id") == order_id), None)
-    
+    target_order = reject_payment(order_id)
     if not target_order:
-        await callback.answer("Заказ не найден.", show_alert=True)
+        await callback.answer("Заказ не найден или оплата уже рассмотрена.", show_alert=True)
         return
         
-    target_order["status"] = "Ожидает оплаты"
-    
-    with open("orders.json", "w", encoding="utf-8") as f:
-        json.dump(orders, f, ensure_ascii=False, indent=4)
-        
     customer_id = target_order.get("user_id")
     if customer_id:
         try:
@@ -398,5 +388,5 @@ async def admin_reject_payment(callback: CallbackQuery, state: FSMContext):
         except Exception as e:
             await bot.send_message(ADMIN_ID, f"Не удалось уведомить клиента {customer_id} об отклонении оплаты. Ошибка: {e}")
             
-    await callback.message.edit_text("Вы отклонили оплату.")
+    await safe_edit(callback.message, "Вы отклонили оплату.")
     await callback.answer() 
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""Тексты сообщений по заявкам.
+
+Каждому виду сообщения (карточка клиента, карточка админа, приглашение
+исполнителя, короткая сводка и т.д.) соответствует один шаблон. Шаблоны
+разбираются один раз при импорте, поля для подстановки считаются из модели Order.
+
+Готовый текст кэшируется по (order_id, версия, вид): версию ведёт storage, и при
+сохранении изменившейся заявки её записи в кэше сбрасываются. Повторный просмотр
+неизменённой заявки обходится без форматирования.
+"""
+from collections import OrderedDict
+
+from models import Order
+from shared import STATUS_EMOJI_MAP, pluralize_days
+import storage
+
+RENDER_CACHE_SIZE = 4096
+
+# --- Виды сообщений ---
+SUMMARY = "summary"
+SHORT_SUMMARY = "short_summary"
+CLIENT_DETAIL = "client_detail"
+ADMIN_DETAIL = "admin_detail"
+ADMIN_APPROVED = "admin_approved"
+ADMIN_NEW_ORDER = "admin_new_order"
+ADMIN_OFFER = "admin_offer"
+EXECUTOR_INVITE = "executor_invite"
+
+_SUMMARY = """
+
+<b>Группа:</b> {group_name}
+<b>ВУЗ:</b> {university_name}
+<b>Преподаватель:</b> {teacher_name}
+<b>Номер зачетки:</b> {gradebook}
+<b>Предмет:</b> {subject}
+<b>Тип работы:</b> {work_type}
+<b>Методичка:</b> {guidelines}
+<b>Задание:</b> {task}
+<b>Пример:</b> {example}
+<b>Дедлайн:</b> {deadline}
+"""
+
+TEMPLATES = {
+    SUMMARY: _SUMMARY,
+    SHORT_SUMMARY: (
+        "<b>Тип работы:</b> {work_type}\n"
+        "<b>Предмет:</b> {subject}\n"
+        "<b>Срок:</b> до {deadline_short}"
+    ),
+    CLIENT_DETAIL: """
+<b>Детали заявки №{order_id}</b>
+
+<b>Статус:</b> {status_emoji} {status}
+
+<b>Группа:</b> {group_name}
+<b>Университет:</b> {university_name}
+<b>Тип работы:</b> {work_type}
+<b>Методичка:</b> {guidelines}
+<b>Задание:</b> {task}
+<b>Пример работы:</b> {example}
+<b>Дата сдачи:</b> {deadline}
+<b>Комментарий:</b> {comments}
+    """,
+    ADMIN_DETAIL: "\n<b>Детали заказа №{order_id} от клиента ({full_name})</b>\n{creation_line}\n" + _SUMMARY,
+    ADMIN_APPROVED: """Детали заказа №{order_id} от клиента ({full_name})
+{creation_line_plain}
+Группа: {group_name}
+ВУЗ: {university_name}
+Преподаватель: {teacher_name}
+Номер зачетки: {gradebook}
+Предмет: {subject}
+Тип работы: {work_type}
+Методичка: {guidelines}
+Задание: {task}
+Пример: {example}
+Дедлайн: {deadline}""",
+    ADMIN_NEW_ORDER: "🔥 Новая заявка {order_id} от клиента ({full_name})\n\n" + _SUMMARY,
+    ADMIN_OFFER: """✅ Исполнитель {executor} готов взяться за заказ по предмету "{subject}"
+
+<b>Предложенные условия:</b>
+💰 <b>Цена:</b> {offer_price} ₽
+⏳ <b>Срок:</b> {offer_deadline}
+💬 <b>Комментарий исполнителя:</b> {offer_comment}""",
+    EXECUTOR_INVITE: (
+        "📬 Вам предложен новый заказ по предмету <b>{subject}</b>\n\n"
+        "📝 <b>Тип работы:</b> {work_type}\n"
+        "🗓 <b>Срок сдачи:</b> {deadline_short}\n\n"
+        "Пожалуйста, ознакомьтесь с материалами заявки и примите решение."
+    ),
+}
+
+# Шаблоны «компилируются» один раз: дальше вызывается готовый format_map
+_COMPILED = {view: template.format_map for view, template in TEMPLATES.items()}
+
+
+def _fields(order: Order) -> dict:
+    status = order.status or 'Не определен'
+    offer = order.executor_offer
+    executor = '—'
+    if offer:
+        executor = offer.executor_full_name or 'Без имени'
+        if offer.executor_id:
+            executor += f" (ID: {offer.executor_id})"
+    return {
+        'order_id': order.order_id,
+        'status': status,
+        'status_emoji': STATUS_EMOJI_MAP.get(status, '📄'),
+        'full_name': order.full_name,
+        'creation_line': f"<b>Дата создания:</b> {order.creation_date}\n" if order.creation_date else "",
+        'creation_line_plain': f"Дата создания: {order.creation_date}\n" if order.creation_date else "",
+        'group_name': order.group_name or 'Не указана',
+        'university_name': order.university_name or 'Не указан',
+        'teacher_name': order.teacher_name or 'Не указан',
+        'gradebook': order.gradebook or 'Не указан',
+        'subject': order.subject or 'Не указан',
+        'work_type': order.work_type_title,
+        'guidelines': '✅ Да' if order.has_guidelines else '❌ Нет',
+        'task': '✅ Прикреплено' if order.has_task else '❌ Нет',
+        'example': '✅ Да' if order.has_example else '❌ Нет',
+        'deadline': order.deadline or 'Не указана',
+        'deadline_short': order.deadline or 'Не указан',
+        'comments': order.comments or 'Нет',
+        'executor': executor,
+        'offer_price': offer.price if offer else '—',
+        'offer_deadline': pluralize_days(offer.deadline or 'N/A') if offer else 'N/A',
+        'offer_comment': (offer.executor_comment if offer else '') or 'Нет',
+    }
+
+
+_cache = OrderedDict()  # (order_id, view) -> (версия, текст)
+_stats = {'hits': 0, 'misses': 0}
+
+
+def render(view: str, order, cached: bool = True) -> str:
+    """Текст вида view для заявки (dict из orders.json или Order).
+
+    cached=False — для данных, которые ещё не сохранены или могут отличаться от
+    сохранённой версии (анкета в FSM, черновик).
+    """
+    order_id = order.order_id if isinstance(order, Order) else order.get('order_id')
+    version = storage.order_version(order_id) if cached and order_id is not None else 0
+    if version:
+        key = (order_id, view)
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == version:
+            _cache.move_to_end(key)
+            _stats['hits'] += 1
+            return entry[1]
+    model = order if isinstance(order, Order) else Order.from_dict(order)
+    text = _COMPILED[view](_fields(model))
+    if version:
+        _stats['misses'] += 1
+        _cache[key] = (version, text)
+        if len(_cache) > RENDER_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return text
+
+
+@storage.add_orders_listener
+def _invalidate(changes):
+    for change in changes:
+        for view in TEMPLATES:
+            _cache.pop((change.order_id, view), None)
+
+
+def render_cache_info() -> dict:
+    return {**_stats, 'size': len(_cache), 'maxsize': RENDER_CACHE_SIZE}
+
+
+def clear_render_cache():
+    _cache.clear()
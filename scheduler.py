@@ -0,0 +1,147 @@
+"""Планировщик обработки апдейтов.
+
+aiogram запускает каждый апдейт отдельной задачей без ограничения. Здесь
+обработчики выполняются не более чем в UPDATE_WORKERS слотах одновременно, а
+ожидающие апдейты получают слот по приоритету: действия админа и оплата идут
+раньше обычных кнопок, а просмотр списков — последним.
+
+Блокирующие операции (Google таблицы, генерация QR) выносятся в потоки через
+run_blocking, чтобы не останавливать цикл событий.
+
+Метрики (глубина очереди, время ожидания слота) — SchedulerMiddleware.stats().
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from collections import deque
+
+from aiogram import BaseMiddleware
+from aiogram.types import Update
+
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", "16"))
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", "2"))
+WAIT_SAMPLES = 512  # сколько последних ожиданий хранить для перцентилей
+
+CRITICAL, NORMAL, BROWSE = 0, 1, 2
+PRIORITY_NAMES = {CRITICAL: "critical", NORMAL: "normal", BROWSE: "browse"}
+
+CRITICAL_CALLBACK_PREFIXES = (
+    "admin_payment_", "admin_confirm_payment:", "admin_reject_payment:",
+    "final_approve_", "final_reject_", "pay_", "executor_send_work_",
+    "client_accept_work:",
+)
+BROWSE_CALLBACK_PREFIXES = (
+    "view_order_", "my_orders_list", "admin_view_order_", "executor_view_order_",
+    "admin_back", "admin_show_materials:", "admin_hide_materials:",
+)
+BROWSE_TEXTS = frozenset({"📂 Мои заявки", "📦 Все заказы", "📂 Мои заказы"})
+
+
+class PriorityLimiter:
+    """Семафор на workers слотов; освободившийся слот отдаётся самому приоритетному."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.busy = 0
+        self._waiters = []  # куча (приоритет, порядковый номер, future)
+        self._seq = itertools.count()
+        self.waiting = {p: 0 for p in PRIORITY_NAMES}
+
+    async def acquire(self, priority: int):
+        if self.busy < self.workers and not self.waiting_total():
+            self.busy += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.waiting[priority] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # слот уже был передан этой задаче — возвращаем его
+                self.release()
+            else:
+                self.waiting[priority] -= 1
+            raise
+
+    def release(self):
+        while self._waiters:
+            priority, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.waiting[priority] -= 1
+            future.set_result(None)  # слот переходит к ожидающему, busy не меняется
+            return
+        self.busy -= 1
+
+    def waiting_total(self) -> int:
+        return sum(self.waiting.values())
+
+
+def classify(event: Update, admin_ids: frozenset) -> int:
+    if event.callback_query:
+        user, data = event.callback_query.from_user, event.callback_query.data or ""
+        if user.id in admin_ids or data.startswith(CRITICAL_CALLBACK_PREFIXES):
+            return CRITICAL
+        if data.startswith(BROWSE_CALLBACK_PREFIXES):
+            return BROWSE
+        return NORMAL
+    if event.message and event.message.from_user:
+        if event.message.from_user.id in admin_ids:
+            return CRITICAL
+        # скриншот оплаты и файлы работ приходят вложениями
+        if event.message.photo or event.message.document:
+            return CRITICAL
+        if event.message.text in BROWSE_TEXTS:
+            return BROWSE
+    return NORMAL
+
+
+class SchedulerMiddleware(BaseMiddleware):
+    def __init__(self, workers: int = UPDATE_WORKERS, admin_ids=()):
+        self.limiter = PriorityLimiter(workers)
+        self.admin_ids = frozenset(admin_ids)
+        self.served = {p: 0 for p in PRIORITY_NAMES}
+        self.max_wait = {p: 0.0 for p in PRIORITY_NAMES}
+        self.waits = {p: deque(maxlen=WAIT_SAMPLES) for p in PRIORITY_NAMES}
+
+    async def __call__(self, handler, event: Update, data: dict):
+        priority = classify(event, self.admin_ids)
+        start = time.perf_counter()
+        await self.limiter.acquire(priority)
+        waited = time.perf_counter() - start
+        self.served[priority] += 1
+        self.waits[priority].append(waited)
+        if waited > self.max_wait[priority]:
+            self.max_wait[priority] = waited
+        try:
+            return await handler(event, data)
+        finally:
+            self.limiter.release()
+
+    def stats(self) -> dict:
+        result = {"workers": self.limiter.workers, "busy": self.limiter.busy, "classes": {}}
+        for priority, name in PRIORITY_NAMES.items():
+            samples = sorted(self.waits[priority])
+            p95 = samples[int(len(samples) * 0.95)] if samples else 0.0
+            result["classes"][name] = {
+                "queued": self.limiter.waiting[priority],
+                "served": self.served[priority],
+                "p95_wait_ms": round(p95 * 1000, 1),
+                "max_wait_ms": round(self.max_wait[priority] * 1000, 1),
+            }
+        return result
+
+
+_blocking_slots = None
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Выполняет блокирующую функцию в потоке; одновременно не больше BLOCKING_WORKERS."""
+    global _blocking_slots
+    if _blocking_slots is None:
+        _blocking_slots = asyncio.Semaphore(BLOCKING_WORKERS)
+    async with _blocking_slots:
+        return await asyncio.to_thread(fn, *args, **kwargs)
@@ -0,0 +1,348 @@
+"""Полнотекстовый поиск по содержимому заявок.
+
+Индексируются тексты, которые иначе не найти: task_text, comments,
+revision_comment и комментарий исполнителя в executor_offer. Слова
+приводятся к основе (стеммер Портера для русского из Snowball), и строится
+обратный индекс основа -> {order_id: частота}. Индекс обновляется подпиской
+на storage при каждой записи заявок (только если у заявки поменялся текст) и
+не читает orders.json: запрос — пересечение списков заявок по словам
+запроса (начиная с самого короткого) и ранжирование BM25.
+
+Индекс строится при запуске бота в потоке (start); изменения заявок за время
+построения накапливаются и применяются после, а поиск до готовности индекса
+ждёт это построение. Ранжирование тоже идёт в потоке: на цикле событий
+только копируются списки заявок по словам запроса. Ранжированный список
+запоминается для SEARCH_CACHE_SIZE последних запросов, и листание страниц
+его не пересчитывает; любое изменение индекса этот кэш сбрасывает.
+"""
+import asyncio
+import logging
+import math
+import re
+import sys
+from collections import Counter, OrderedDict
+
+import storage
+from models import Order
+from scheduler import run_blocking
+
+PAGE_SIZE = 5
+SEARCH_CACHE_SIZE = 32  # запросов с готовым ранжированием
+SNIPPET_CHARS = 60
+# Параметры BM25
+K1 = 1.2
+B = 0.75
+
+_WORD_RE = re.compile(r"\w+")
+STOP_WORDS = frozenset(
+    "и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне "
+    "было вот от меня еще нет о из ему теперь когда даже ну ли если уже или ни быть был него до вас "
+    "нибудь опять уж вам ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их "
+    "чем была сам чтоб без будто чего раз тоже себе под будет ж тогда кто этот того потому этого какой "
+    "совсем ним здесь этом один почти мой тем чтобы нее были куда зачем всех никогда можно при наконец "
+    "два об другой хоть после над больше тот через эти нас про всего них какая много разве три эту моя "
+    "впрочем хорошо свою этой перед иногда лучше чуть том нельзя такой им более всегда конечно всю между".split()
+)
+
+
+# --- Стеммер (Snowball, russian) ---
+
+_VOWELS = "аеиоуыэюя"
+
+
+def _endings(words: str) -> tuple:
+    return tuple(sorted(words.split(), key=len, reverse=True))
+
+
+_PERFECTIVE_GERUND_1 = _endings("в вши вшись")
+_PERFECTIVE_GERUND_2 = _endings("ив ивши ившись ыв ывши ывшись")
+_ADJECTIVE = _endings("ее ие ые ое ими ыми ей ий ый ой ем им ым ом его ого ему ому их ых ую юю ая яя ою ею")
+_PARTICIPLE_1 = _endings("ем нн вш ющ щ")
+_PARTICIPLE_2 = _endings("ивш ывш ующ")
+_REFLEXIVE = _endings("ся сь")
+_VERB_1 = _endings("ла на ете йте ли й л ем н ло но ет ют ны ть ешь нно")
+_VERB_2 = _endings("ила ыла ена ейте уйте ите или ыли ей уй ил ыл им ым ен ило ыло ено ят ует уют ит ыт ены ить ыть ишь ую ю")
+_NOUN = _endings("а ев ов ие ье е иями ями ами еи ии и ией ей ой ий й иям ям ием ем ам ом о у ах иях ях ы ь ию ью ю ия ья я")
+_SUPERLATIVE = _endings("ейш ейше")
+_DERIVATIONAL = _endings("ост ость")
+
+
+def _match(word: str, group_1=(), group_2=()) -> int:
+    """Длина самого длинного окончания; окончания group_1 — только после «а» или «я».
+
+    0 — окончания нет (или оно из group_1, но без «а»/«я» перед ним).
+    """
+    best, conditional = 0, False
+    for ending in group_1:
+        if len(ending) > best and word.endswith(ending):
+            best, conditional = len(ending), True
+            break
+    for ending in group_2:
+        if len(ending) > best and word.endswith(ending):
+            best, conditional = len(ending), False
+            break
+    if conditional and (len(word) <= best or word[-best - 1] not in "ая"):
+        return 0
+    return best
+
+
+def _regions(word: str) -> tuple:
+    """Начало RV и R2 (индексы в слове)."""
+    def after_vowel_consonant(start):
+        for i in range(start + 1, len(word)):
+            if word[i] not in _VOWELS and word[i - 1] in _VOWELS:
+                return i + 1
+        return len(word)
+    rv = next((i + 1 for i, ch in enumerate(word) if ch in _VOWELS), len(word))
+    r1 = after_vowel_consonant(0)
+    return rv, after_vowel_consonant(r1)
+
+
+def stem(word: str) -> str:
+    word = word.lower().replace("ё", "е")
+    rv_start, r2_start = _regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+    # Шаг 1
+    cut = _match(rv, _PERFECTIVE_GERUND_1, _PERFECTIVE_GERUND_2)
+    if cut:
+        rv = rv[:-cut]
+    else:
+        cut = _match(rv, (), _REFLEXIVE)
+        if cut:
+            rv = rv[:-cut]
+        cut = _match(rv, (), _ADJECTIVE)
+        if cut:
+            rv = rv[:-cut]
+            cut = _match(rv, _PARTICIPLE_1, _PARTICIPLE_2)
+            if cut:
+                rv = rv[:-cut]
+        else:
+            cut = _match(rv, _VERB_1, _VERB_2) or _match(rv, (), _NOUN)
+            if cut:
+                rv = rv[:-cut]
+    # Шаг 2
+    if rv.endswith("и"):
+        rv = rv[:-1]
+    # Шаг 3: словообразовательное окончание только в R2
+    cut = _match(rv, (), _DERIVATIONAL)
+    if cut and rv_start + len(rv) - cut >= r2_start:
+        rv = rv[:-cut]
+    # Шаг 4
+    if rv.endswith("нн"):
+        rv = rv[:-1]
+    else:
+        cut = _match(rv, (), _SUPERLATIVE)
+        if cut:
+            rv = rv[:-cut]
+            if rv.endswith("нн"):
+                rv = rv[:-1]
+        elif rv.endswith("ь"):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+_stems = {}  # слово -> основа (словарь предметной области невелик, кэш окупается)
+
+
+def _term(word: str) -> str:
+    term = _stems.get(word)
+    if term is None:
+        term = _stems[word] = sys.intern(stem(word) if word.isalpha() else word)
+    return term
+
+
+def terms(text: str) -> list:
+    return [_term(word) for word in _WORD_RE.findall(text.lower()) if word not in STOP_WORDS]
+
+
+# --- Индекс ---
+
+def order_text(order: Order) -> str:
+    parts = [order.task_text, order.comments, order.revision_comment]
+    if order.executor_offer:
+        parts.append(order.executor_offer.executor_comment)
+    return "\n".join(p for p in parts if p)
+
+
+class Index:
+    __slots__ = ("postings", "lengths", "doc_terms", "total_length")
+
+    def __init__(self):
+        self.postings = {}   # основа -> {order_id: частота}
+        self.lengths = {}    # order_id -> число слов
+        self.doc_terms = {}  # order_id -> основы заявки (для удаления)
+        self.total_length = 0
+
+    def add(self, order_id, text: str):
+        self.remove(order_id)
+        if not text:
+            return
+        counts = Counter(terms(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[order_id] = tf
+        length = sum(counts.values())
+        self.lengths[order_id] = length
+        self.doc_terms[order_id] = tuple(counts)
+        self.total_length += length
+
+    def remove(self, order_id):
+        doc_terms = self.doc_terms.pop(order_id, None)
+        if doc_terms is None:
+            return
+        self.total_length -= self.lengths.pop(order_id)
+        for term in doc_terms:
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(order_id, None)
+                if not docs:
+                    del self.postings[term]
+
+    def prepare(self, query_terms) -> tuple | None:
+        """Копии списков заявок по словам запроса — с ними rank можно звать из потока.
+
+        None — запрос пустой или какого-то слова нет ни в одной заявке.
+        """
+        lists = [self.postings.get(term) for term in query_terms]
+        if not lists or not all(lists):
+            return None
+        total = len(self.lengths)
+        return [dict(docs) for docs in lists], total, self.total_length / total if total else 1
+
+    def rank(self, prepared: tuple) -> list:
+        """[(order_id, оценка)] всех заявок со всеми словами запроса, лучшие первыми."""
+        lists, total, avg_length = prepared
+        lists.sort(key=len)
+        first, rest = lists[0], lists[1:]
+        candidates = first.keys()
+        for docs in rest:
+            candidates = candidates & docs.keys()
+        weighted = [(math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5)) * (K1 + 1), docs)
+                    for docs in lists]
+        # norm = K1 * (1 - B + B * длина / средняя длина)
+        base, per_word = K1 * (1 - B), K1 * B / avg_length
+        lengths = self.lengths
+        scored = []
+        for order_id in candidates:
+            length = lengths.get(order_id)
+            if length is None:
+                continue  # заявку удалили, пока шло ранжирование
+            norm = base + per_word * length
+            score = 0.0
+            for weight, docs in weighted:
+                tf = docs[order_id]
+                score += weight * tf / (tf + norm)
+            scored.append((score, order_id))
+        scored.sort(reverse=True)
+        return [(order_id, score) for score, order_id in scored]
+
+
+def _build(orders) -> Index:
+    index = Index()
+    for order in orders:
+        index.add(order.order_id, order_text(order))
+    return index
+
+
+_index = None
+_backlog = None  # изменения заявок, пришедшие во время построения индекса
+_task = None
+_ranked = OrderedDict()  # основы запроса -> ранжированные заявки
+_generation = 0  # растёт при каждом изменении индекса
+
+
+@storage.add_orders_listener
+def _on_orders_changed(changes):
+    if _backlog is not None:
+        _backlog.extend(changes)
+        return
+    if _index is None:
+        return  # построится по заявкам при первом поиске
+    _apply(changes)
+
+
+def _apply(changes):
+    global _generation
+    changed = False
+    for change in changes:
+        if change.new is None:
+            _index.remove(change.order_id)
+            changed = True
+            continue
+        # большинство записей меняют только статус — текст не переиндексируем
+        text = order_text(change.new)
+        if change.old is None or order_text(change.old) != text:
+            _index.add(change.order_id, text)
+            changed = True
+    if changed:
+        _generation += 1
+        _ranked.clear()
+
+
+async def _build_in_background():
+    global _index, _backlog
+    _backlog = []
+    try:
+        orders = [entry[2] for entry in storage.snapshot_index()]
+        _index = await run_blocking(_build, orders)
+        _apply(_backlog)
+    except Exception:
+        logging.exception("Не удалось построить поисковый индекс")
+    finally:
+        _backlog = None
+    if _index is not None:
+        logging.info("Поисковый индекс: %d заявок, %d основ", len(_index.lengths), len(_index.postings))
+
+
+def start() -> bool:
+    """Строит индекс в потоке; search() до готовности ждёт это построение."""
+    global _task
+    if _index is not None or (_task is not None and not _task.done()):
+        return False
+    _task = asyncio.create_task(_build_in_background())
+    return True
+
+
+async def _ranking(query: str) -> list:
+    key = tuple(dict.fromkeys(terms(query)))
+    ranked = _ranked.get(key)
+    if ranked is not None:
+        _ranked.move_to_end(key)
+        return ranked
+    prepared = _index.prepare(key)
+    generation = _generation
+    ranked = await run_blocking(_index.rank, prepared) if prepared else []
+    if generation == _generation:  # индекс не менялся, пока считали
+        _ranked[key] = ranked
+        while len(_ranked) > SEARCH_CACHE_SIZE:
+            _ranked.popitem(last=False)
+    return ranked
+
+
+async def search(query: str, page: int = 0, page_size: int = PAGE_SIZE) -> tuple:
+    """(число найденных, [(Order, оценка)] на странице page)."""
+    if _index is None:
+        start()
+        await asyncio.shield(_task)
+        if _index is None:
+            raise RuntimeError("Поисковый индекс не построен")
+    ranked = await _ranking(query)
+    results = []
+    for order_id, score in ranked[page * page_size:(page + 1) * page_size]:
+        order = storage.get_order(order_id)
+        if order is not None:
+            results.append((order, score))
+    return len(ranked), results
+
+
+def snippet(order: Order, query: str, width: int = SNIPPET_CHARS) -> str:
+    """Фрагмент текста вокруг первого найденного слова запроса."""
+    text = order_text(order)
+    wanted = set(terms(query))
+    for match in _WORD_RE.finditer(text):
+        word = match.group().lower()
+        if word not in STOP_WORDS and _term(word) in wanted:
+            start = max(0, match.start() - width // 2)
+            end = min(len(text), match.end() + width // 2)
+            fragment = text[start:end].replace("\n", " ")
+            return ("…" if start else "") + fragment + ("…" if end < len(text) else "")
+    return text[:width].replace("\n", " ")
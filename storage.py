@@ -0,0 +1,417 @@
+"""Хранилище заявок и исполнителей.
+
+Все чтения и записи orders.json / executors.json проходят через этот модуль.
+Сериализатор подключаемый: по умолчанию orjson (если установлен), иначе stdlib json.
+Для машины данные пишутся компактно, без отступов; человекочитаемая выгрузка
+делается явно командой export:
+
+    python storage.py export orders_pretty.json
+    python storage.py bench --count 10000
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import NamedTuple
+
+from models import Order
+
+ORDERS_FILE = "orders.json"
+EXECUTORS_FILE = "executors.json"
+
+
+class JsonSerializer:
+    """Сериализатор на stdlib json: UTF-8 без экранирования кириллицы и без пробелов."""
+    name = "json"
+
+    def dumps(self, obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def loads(self, data: bytes):
+        return json.loads(data)
+
+
+class OrjsonSerializer:
+    """Сериализатор на orjson: в разы быстрее stdlib и сразу отдаёт UTF-8 байты."""
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, obj) -> bytes:
+        return self._orjson.dumps(obj)
+
+    def loads(self, data: bytes):
+        return self._orjson.loads(data)
+
+
+SERIALIZERS = {
+    "orjson": OrjsonSerializer,
+    "json": JsonSerializer,
+}
+
+_serializer = None
+
+
+def get_serializer(name: str | None = None):
+    """Возвращает сериализатор по имени (или из ORDERS_SERIALIZER), с откатом на json."""
+    global _serializer
+    if name is None and _serializer is not None:
+        return _serializer
+    requested = name or os.getenv("ORDERS_SERIALIZER", "orjson")
+    try:
+        serializer = SERIALIZERS[requested]()
+    except KeyError:
+        raise ValueError(f"Неизвестный сериализатор: {requested}") from None
+    except ImportError:
+        logging.info("orjson не установлен, используется стандартный json")
+        serializer = JsonSerializer()
+    if name is None:
+        _serializer = serializer
+    return serializer
+
+
+def set_serializer(name: str):
+    global _serializer
+    _serializer = get_serializer(name)
+    return _serializer
+
+
+# --- Низкоуровневые чтение/запись ---
+
+def read_json(path: str, default=None):
+    """Читает JSON-файл; при отсутствии, пустом или битом файле возвращает default."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return default
+    if not data.strip():
+        return default
+    try:
+        return get_serializer().loads(data)
+    except ValueError:
+        logging.exception("Не удалось разобрать %s", path)
+        return default
+
+
+def write_json(path: str, obj):
+    """Атомарно записывает obj: сначала во временный файл, затем os.replace."""
+    write_bytes(path, get_serializer().dumps(obj))
+
+
+def write_bytes(path: str, data: bytes):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# --- Заявки ---
+#
+# Для каждой заявки в памяти хранится отпечаток её сериализованного вида, номер
+# версии и компактная модель Order. При save_orders заявки сериализуются по одной
+# (это столько же работы, сколько один dumps всего списка), поэтому изменившиеся
+# заявки находятся без лишних затрат: у них растёт версия, а подписчики
+# (кэши, счётчики, индексы) получают список OrderChange.
+
+class OrderChange(NamedTuple):
+    order_id: int
+    old: Order | None  # None — заявка новая
+    new: Order | None  # None — заявка удалена
+    version: int
+
+
+_index = {}  # order_id -> (отпечаток, версия, Order)
+_index_ready = False
+_listeners = []
+
+
+def add_orders_listener(listener):
+    """Подписка на изменения заявок: listener(changes: list[OrderChange])."""
+    _listeners.append(listener)
+    return listener
+
+
+def _ensure_index(orders: list | None = None):
+    global _index_ready
+    if _index_ready:
+        return
+    if orders is None:
+        orders = get_all_orders()
+    serializer = get_serializer()
+    for order in orders:
+        order_id = order.get("order_id") if isinstance(order, dict) else None
+        if order_id is not None:
+            _index[order_id] = (hash(serializer.dumps(order)), 1, Order.from_dict(order))
+    _index_ready = True
+
+
+def order_version(order_id) -> int:
+    """Версия заявки в этом процессе (0 — заявка неизвестна)."""
+    _ensure_index()
+    entry = _index.get(order_id)
+    return entry[1] if entry else 0
+
+
+def get_order(order_id) -> Order | None:
+    """Последняя сохранённая версия заявки из памяти, без чтения файла."""
+    _ensure_index()
+    entry = _index.get(order_id)
+    return entry[2] if entry else None
+
+
+def snapshot_index() -> list:
+    """Согласованный снимок всех заявок: копия записей индекса (отпечаток, версия, Order).
+
+    Записи и модели в памяти не меняются, а заменяются целиком при save_orders,
+    поэтому копия списка ссылок и есть снимок: дальнейшие записи его не затрагивают.
+    """
+    _ensure_index()
+    return list(_index.values())
+
+
+def get_all_orders() -> list:
+    orders = read_json(ORDERS_FILE, [])
+    return orders if isinstance(orders, list) else []
+
+
+def orders_stamp() -> list | None:
+    """Отметка orders.json (размер и время изменения) для сверки сохранённых кэшей."""
+    try:
+        st = os.stat(ORDERS_FILE)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def save_orders(orders: list):
+    _ensure_index()
+    serializer = get_serializer()
+    parts = []
+    changes = []
+    seen = set()
+    for order in orders:
+        data = serializer.dumps(order)
+        parts.append(data)
+        order_id = order.get("order_id") if isinstance(order, dict) else None
+        if order_id is None:
+            continue
+        seen.add(order_id)
+        digest = hash(data)
+        entry = _index.get(order_id)
+        if entry is not None and entry[0] == digest:
+            continue
+        version = entry[1] + 1 if entry else 1
+        model = Order.from_dict(order)
+        _index[order_id] = (digest, version, model)
+        changes.append(OrderChange(order_id, entry[2] if entry else None, model, version))
+    for order_id in [oid for oid in _index if oid not in seen]:
+        _, version, model = _index.pop(order_id)
+        changes.append(OrderChange(order_id, model, None, version + 1))
+    write_bytes(ORDERS_FILE, b"[" + b",".join(parts) + b"]")
+    _notify(changes)
+
+
+def compare_and_set(order_id, expected_status, mutate) -> dict | None:
+    """Условное обновление одной заявки.
+
+    mutate(order) применяется и заявка сохраняется, только если её статус всё ещё
+    expected_status. Сначала статус сверяется с памятью, поэтому отклонённая
+    попытка не читает и не пишет файл. Возвращает обновлённую заявку или None.
+    """
+    _ensure_index()
+    entry = _index.get(order_id)
+    if entry is None or entry[2].status != expected_status:
+        return None
+    orders = get_all_orders()
+    target = next((o for o in orders if o.get("order_id") == order_id), None)
+    if target is None or target.get("status") != expected_status:
+        return None
+    if _mutated(target, mutate):
+        save_orders(orders)
+    return target
+
+
+def _mutated(order: dict, mutate) -> bool:
+    # сравниваем сериализованный вид, а не копию словаря: mutate может менять
+    # вложенные словари (например sha256 в слоте с файлами), и поверхностная
+    # копия такое изменение не заметит
+    serializer = get_serializer()
+    before = serializer.dumps(order)
+    mutate(order)
+    return serializer.dumps(order) != before
+
+
+def update_orders(mutations: dict) -> int:
+    """Пакетное изменение полей нескольких заявок (order_id -> mutate) одной записью файла.
+
+    Статус не сверяется — mutate не должен его менять. Возвращает число изменённых заявок.
+    """
+    if not mutations:
+        return 0
+    orders = get_all_orders()
+    changed = 0
+    for order in orders:
+        mutate = mutations.get(order.get("order_id"))
+        if mutate is not None and _mutated(order, mutate):
+            changed += 1
+    if changed:
+        save_orders(orders)
+    return changed
+
+
+def update_order(order_id, mutate) -> dict | None:
+    """Изменение полей заявки без смены статуса (поверх compare_and_set)."""
+    for _ in range(3):
+        order = get_order(order_id)
+        if order is None:
+            return None
+        updated = compare_and_set(order_id, order.status, mutate)
+        if updated is not None:
+            return updated
+    return None
+
+
+def _notify(changes: list):
+    if not changes:
+        return
+    for listener in _listeners:
+        try:
+            listener(changes)
+        except Exception:
+            logging.exception("Ошибка в подписчике на изменения заявок")
+
+
+def export_orders(path: str, orders: list | None = None):
+    """Человекочитаемая выгрузка заявок (с отступами) — только по явной команде."""
+    if orders is None:
+        orders = get_all_orders()
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(orders, f, ensure_ascii=False, indent=4)
+
+
+# --- Исполнители ---
+
+_executors_version = 0
+
+
+def executors_version() -> int:
+    """Растёт при каждой записи executors.json — по нему перестраиваются индексы."""
+    return _executors_version
+
+
+def get_executors_list() -> list:
+    executors = read_json(EXECUTORS_FILE, [])
+    return executors if isinstance(executors, list) else []
+
+
+def save_executors_list(executors: list):
+    global _executors_version
+    write_json(EXECUTORS_FILE, executors)
+    _executors_version += 1
+
+
+# --- CLI ---
+
+def _sample_order(i: int) -> dict:
+    return {
+        "group_name": f"АТОПТ-{i % 40}",
+        "university_name": "АПЭТ",
+        "teacher_name": "Березин Данил Андреевич",
+        "gradebook": f"{21321321 + i}",
+        "subject": "История России",
+        "work_type": "work_type_Курсовая",
+        "has_guidelines": True,
+        "guidelines_file": {"id": "BQACAgIAAxkBAAIPN2hg3g5Bn7nHt_Hwh_naggv8vUHkAALZhQAChiUAAUsEjint6KGpJDYE", "type": "document"},
+        "task_file": None,
+        "task_text": "Написать реферат по теме «Реформы Петра I» объёмом 15 страниц, оформление по ГОСТ",
+        "has_example": False,
+        "example_file": None,
+        "deadline": "09.07.2025",
+        "comments": "Преподаватель строго проверяет оформление списка литературы",
+        "status": "Ожидает подтверждения",
+        "user_id": 7352968223 + i,
+        "username": "N/A",
+        "first_name": "Артем",
+        "last_name": "Усов",
+        "creation_date": "29.06.2025 14:32",
+        "order_id": i + 1,
+        "executor_id": 8030752676,
+        "executor_offer": {
+            "price": 8000,
+            "deadline": "3 дня",
+            "executor_id": 8030752676,
+            "executor_username": None,
+            "executor_full_name": "Team Snax",
+            "executor_comment": "",
+        },
+    }
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench(count: int, repeat: int = 5):
+    """Сравнивает старый путь (json, indent=4) с компактными сериализаторами."""
+    orders = [_sample_order(i) for i in range(count)]
+    legacy = json.dumps(orders, ensure_ascii=False, indent=4).encode("utf-8")
+    rows = [(
+        "json indent=4 (старый)",
+        _best_of(lambda: json.dumps(orders, ensure_ascii=False, indent=4).encode("utf-8"), repeat),
+        _best_of(lambda: json.loads(legacy), repeat),
+        len(legacy),
+    )]
+    for name in SERIALIZERS:
+        try:
+            serializer = SERIALIZERS[name]()
+        except ImportError:
+            continue
+        data = serializer.dumps(orders)
+        rows.append((
+            f"{name} compact",
+            _best_of(lambda: serializer.dumps(orders), repeat),
+            _best_of(lambda: serializer.loads(data), repeat),
+            len(data),
+        ))
+    print(f"{count} заявок, лучшее из {repeat} прогонов")
+    print(f"{'вариант':<24}{'dumps, мс':>12}{'loads, мс':>12}{'размер, КБ':>13}")
+    for name, dump_t, load_t, size in rows:
+        print(f"{name:<24}{dump_t * 1000:>12.1f}{load_t * 1000:>12.1f}{size / 1024:>13.0f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Утилиты хранилища заявок")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_cmd = sub.add_parser("export", help="человекочитаемая выгрузка orders.json")
+    export_cmd.add_argument("path")
+    bench_cmd = sub.add_parser("bench", help="замер loads/dumps")
+    bench_cmd.add_argument("--count", type=int, default=10000)
+    bench_cmd.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+    if args.command == "export":
+        export_orders(args.path)
+        print(f"Заявки выгружены в {args.path}")
+    elif args.command == "bench":
+        bench(args.count, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Подписки исполнителей на предметы и типы работ.
+
+Исполнитель выбирает в меню «🔔 Подписки» предметы (из клавиатуры выбора
+предмета, плюс «Другое» — всё, чего в ней нет) и типы работ. Подписки хранятся
+в executors.json у исполнителя:
+
+    {"id": 123, "name": "...", "subscriptions": {"subjects": ["Философия"], "work_types": ["work_type_Курсовая"]}}
+
+Пустой список означает «любые». По executors.json строится обратный индекс
+(предмет -> исполнители, тип работы -> исполнители), и о новой заявке узнают
+только подходящие исполнители: поиск — пересечение двух множеств, без
+просмотра всех исполнителей. Индекс перестраивается, когда executors.json
+перезаписывается (storage.executors_version).
+"""
+import storage
+from models import SUBJECTS, WorkType
+
+OTHER_SUBJECT = "other"  # предмет, введённый вручную
+ANY = None               # ключ для исполнителей без ограничения
+
+SUBJECT_NAMES = tuple(name for _, name in SUBJECTS)
+WORK_TYPE_VALUES = tuple(w.value for w in WorkType)
+
+_subjects = {}    # предмет (или ANY) -> {executor_id}
+_work_types = {}  # тип работы (или ANY) -> {executor_id}
+_registered = set()
+_version = -1
+
+
+def _ensure_index():
+    global _version
+    version = storage.executors_version()
+    if version == _version:
+        return
+    _subjects.clear()
+    _work_types.clear()
+    _registered.clear()
+    for executor in storage.get_executors_list():
+        executor_id = executor['id']
+        _registered.add(executor_id)
+        subs = executor.get('subscriptions') or {}
+        for key in subs.get('subjects') or [ANY]:
+            _subjects.setdefault(key, set()).add(executor_id)
+        for key in subs.get('work_types') or [ANY]:
+            _work_types.setdefault(key, set()).add(executor_id)
+    _version = version
+
+
+def subject_key(subject: str | None):
+    return subject if subject in SUBJECT_NAMES else OTHER_SUBJECT
+
+
+def recipients(subject, work_type, fallback_ids=()) -> set:
+    """Исполнители, подписанные на предмет и тип работы заявки.
+
+    fallback_ids (EXECUTOR_IDS из окружения), которых нет в executors.json,
+    подписаться не могут и получают все заявки, как раньше.
+    """
+    _ensure_index()
+    work_type = getattr(work_type, 'value', work_type)
+    by_subject = _subjects.get(subject_key(subject), set()) | _subjects.get(ANY, set())
+    by_work_type = _work_types.get(work_type, set()) | _work_types.get(ANY, set())
+    if len(by_subject) > len(by_work_type):
+        by_subject, by_work_type = by_work_type, by_subject
+    result = by_subject & by_work_type
+    result.update(i for i in fallback_ids if i not in _registered)
+    return result
+
+
+def matches(executor: dict, subject, work_type) -> bool:
+    """Подходит ли заявка под подписки одного исполнителя (словарь из executors.json)."""
+    subs = executor.get('subscriptions') or {}
+    subjects, work_types = subs.get('subjects'), subs.get('work_types')
+    if subjects and subject_key(subject) not in subjects:
+        return False
+    return not work_types or getattr(work_type, 'value', work_type) in work_types
+
+
+def get_subscriptions(executor_id) -> dict:
+    for executor in storage.get_executors_list():
+        if str(executor['id']) == str(executor_id):
+            subs = executor.get('subscriptions') or {}
+            return {'subjects': list(subs.get('subjects') or []), 'work_types': list(subs.get('work_types') or [])}
+    return {'subjects': [], 'work_types': []}
+
+
+def toggle(executor_id, kind: str, value: str) -> dict | None:
+    """Включает или выключает подписку (kind — 'subjects' или 'work_types'); None — исполнитель не найден."""
+    executors = storage.get_executors_list()
+    for executor in executors:
+        if str(executor['id']) == str(executor_id):
+            subs = executor.setdefault('subscriptions', {})
+            values = subs.setdefault(kind, [])
+            if value in values:
+                values.remove(value)
+            else:
+                values.append(value)
+            storage.save_executors_list(executors)
+            return subs
+    return None
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+# модули бота лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """storage с пустым orders.json во временной папке и сброшенным индексом."""
+    import storage
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "_index", {})
+    monkeypatch.setattr(storage, "_index_ready", False)
+    return storage
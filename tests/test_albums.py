@@ -0,0 +1,38 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+from albums import LATE_PART_TEXT, AlbumCollector, AlbumMiddleware
+from scheduler import SchedulerMiddleware
+
+
+def _part(message_id, answers):
+    async def answer(text):
+        answers.append(text)
+    message = SimpleNamespace(message_id=message_id, media_group_id="g1", from_user=SimpleNamespace(id=1),
+                              photo=[object()], document=None, text=None, answer=answer)
+    return SimpleNamespace(message=message, callback_query=None)
+
+
+def test_album_is_collected_before_scheduler_slots():
+    albums = AlbumMiddleware(AlbumCollector(debounce=0.05))
+    scheduler = SchedulerMiddleware(workers=1)
+    handled, answers = [], []
+
+    async def handler(event, data):
+        handled.append([m.message_id for m in data["album"]])
+
+    async def feed(event):
+        return await albums(lambda e, d: scheduler(handler, e, d), event, {})
+
+    async def main():
+        await asyncio.gather(*(feed(_part(i, answers)) for i in range(10)))
+        await feed(_part(10, answers))  # опоздавшая часть
+        await feed(_part(11, answers))
+
+    asyncio.run(main())
+    assert handled == [list(range(10))]
+    assert answers == [LATE_PART_TEXT]
@@ -0,0 +1,21 @@
+import pytest
+
+pytest.importorskip("aiogram")
+
+import autoassign
+from models import OrderStatus as S
+from transitions import Event, fire
+
+
+@pytest.fixture(autouse=True)
+def fresh_inflight(monkeypatch):
+    monkeypatch.setattr(autoassign, "_inflight", None)
+
+
+def test_expired_offer_releases_slot(storage):
+    storage.save_orders([{"order_id": 1, "status": S.NEW.value}])
+    assert autoassign.inflight(7) == 0
+    fire(1, Event.OFFER_TO_EXECUTOR, executor_id=7)
+    assert autoassign.inflight(7) == 1
+    fire(1, Event.OFFER_EXPIRED)
+    assert autoassign.inflight(7) == 0
@@ -0,0 +1,40 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+import middlewares
+from middlewares import IdempotencyMiddleware, ThrottlingMiddleware
+
+
+def _callback(update_id, data):
+    async def answer(*args, **kwargs):
+        pass
+    message = SimpleNamespace(chat=SimpleNamespace(id=1), message_id=10)
+    callback = SimpleNamespace(data=data, message=message, from_user=SimpleNamespace(id=5), answer=answer)
+    return SimpleNamespace(update_id=update_id, message=None, callback_query=callback)
+
+
+def test_throttled_one_shot_callback_can_be_retried(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(middlewares.time, "monotonic", lambda: now[0])
+    # порядок как в main.py: ограничение частоты снаружи идемпотентности
+    throttling = ThrottlingMiddleware(rates={"callback": (1, 1.0)})
+    idempotency = IdempotencyMiddleware(path=None)
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.update_id)
+
+    async def feed(event):
+        return await throttling(lambda e, d: idempotency(handler, e, d), event, {})
+
+    async def main():
+        await feed(_callback(1, "other_button"))        # забирает единственный токен
+        await feed(_callback(2, "final_approve_7"))     # отброшено ограничением
+        now[0] += 2                                     # бакет наполнился
+        await feed(_callback(3, "final_approve_7"))     # повтор той же кнопки
+    asyncio.run(main())
+    assert handled == [1, 3]
@@ -0,0 +1,168 @@
+"""Переходы статусов заявки.
+
+Все смены статуса описаны одной таблицей: (текущий статус, событие) -> новый
+статус и побочные изменения полей. fire() применяет событие через
+storage.compare_and_set: переход выполняется, только если заявка всё ещё в том
+статусе, из которого он разрешён. Повторное нажатие кнопки или гонка двух
+админов отклоняется по состоянию в памяти, без чтения и перезаписи orders.json.
+"""
+import logging
+from enum import Enum
+from typing import Callable, NamedTuple
+
+import storage
+from logs import bind
+from models import OrderStatus as S
+
+
+class Event(str, Enum):
+    OFFER_TO_EXECUTOR = "offer_to_executor"      # админ предложил заказ исполнителю
+    OFFER_UNDELIVERED = "offer_undelivered"      # предложение не удалось доставить
+    EXECUTOR_ACCEPT = "executor_accept"          # исполнитель готов взяться
+    EXECUTOR_OFFER = "executor_offer"            # исполнитель прислал цену и срок
+    EXECUTOR_REFUSE = "executor_refuse"          # исполнитель отказался от заказа
+    ADMIN_APPROVE_OFFER = "admin_approve_offer"  # админ утвердил условия исполнителя
+    ADMIN_REJECT_OFFER = "admin_reject_offer"    # админ отклонил условия исполнителя
+    ADMIN_SELF_TAKE = "admin_self_take"          # админ взял заказ сам
+    PAYMENT_CONFIRMED = "payment_confirmed"
+    PAYMENT_REJECTED = "payment_rejected"
+    WORK_SUBMITTED = "work_submitted"
+    WORK_APPROVED = "work_approved"
+    CLIENT_ACCEPT = "client_accept"
+    CLIENT_REVISION = "client_revision"
+    CLIENT_CANCEL = "client_cancel"
+    OFFER_ROUND_OPEN = "offer_round_open"        # заказ разослан нескольким исполнителям
+    OFFER_ROUND_CLOSE = "offer_round_close"      # выбрано одно из собранных предложений
+    OFFER_ROUND_CANCEL = "offer_round_cancel"    # все приглашённые отказались
+    OFFER_EXPIRED = "offer_expired"              # исполнитель не ответил на приглашение вовремя
+
+    __str__ = str.__str__
+    __format__ = str.__format__
+    __hash__ = str.__hash__
+
+
+class Transition(NamedTuple):
+    to: S
+    effect: Callable[[dict], None] | None = None
+
+
+def _clear_offer_due(order: dict):
+    order.pop('offer_due', None)
+
+
+def _clear_executor(order: dict):
+    order.pop('executor_id', None)
+    order.pop('executor_offer', None)
+    order.pop('offer_due', None)
+
+
+def _clear_executor_id(order: dict):
+    order.pop('executor_id', None)
+    order.pop('offer_due', None)
+
+
+def _expire_offer(order: dict):
+    # запоминаем, кто не ответил, чтобы не предлагать ему заказ повторно
+    expired = order.setdefault('expired_executors', [])
+    if order.get('executor_id') not in expired:
+        expired.append(order.get('executor_id'))
+    _clear_executor_id(order)
+
+
+def _refuse(order: dict):
+    # запоминаем отказавшихся исполнителей — по ним считается доля отказов (analytics)
+    order.setdefault('refused_executors', []).append(order.get('executor_id'))
+    _clear_executor(order)
+
+
+def _clear_offer(order: dict):
+    order.pop('executor_offer', None)
+
+
+def _clear_round(order: dict):
+    order.pop('offer_round', None)
+    order.pop('offer_due', None)
+
+
+def _close_payment_check(order: dict):
+    order.pop('payment_pending', None)
+
+
+_ACTIVE = (S.NEW, S.WAITING_CONFIRMATION, S.EXECUTOR_FOUND, S.WAITING_PAYMENT, S.ACCEPTED,
+           S.IN_WORK, S.SUBMITTED, S.APPROVED, S.REVISION, S.DRAFT)
+
+TRANSITIONS = {
+    (S.NEW, Event.OFFER_TO_EXECUTOR): Transition(S.WAITING_CONFIRMATION),
+    (S.WAITING_CONFIRMATION, Event.OFFER_UNDELIVERED): Transition(S.NEW, _clear_executor_id),
+    (S.WAITING_CONFIRMATION, Event.EXECUTOR_ACCEPT): Transition(S.EXECUTOR_FOUND, _clear_offer_due),
+    (S.WAITING_CONFIRMATION, Event.OFFER_EXPIRED): Transition(S.NEW, _expire_offer),
+    (S.EXECUTOR_FOUND, Event.EXECUTOR_OFFER): Transition(S.WAITING_CONFIRMATION),
+    (S.WAITING_CONFIRMATION, Event.ADMIN_APPROVE_OFFER): Transition(S.WAITING_PAYMENT),
+    (S.WAITING_CONFIRMATION, Event.ADMIN_REJECT_OFFER): Transition(S.NEW, _clear_offer),
+    (S.NEW, Event.ADMIN_SELF_TAKE): Transition(S.WAITING_PAYMENT),
+    (S.WAITING_CONFIRMATION, Event.ADMIN_SELF_TAKE): Transition(S.WAITING_PAYMENT, _clear_round),
+    (S.NEW, Event.OFFER_ROUND_OPEN): Transition(S.WAITING_CONFIRMATION),
+    (S.WAITING_CONFIRMATION, Event.OFFER_ROUND_CLOSE): Transition(S.WAITING_PAYMENT, _clear_round),
+    (S.WAITING_CONFIRMATION, Event.OFFER_ROUND_CANCEL): Transition(S.NEW, _clear_round),
+    (S.WAITING_PAYMENT, Event.PAYMENT_CONFIRMED): Transition(S.IN_WORK, _close_payment_check),
+    # статус при отклонении не меняется: повторное отклонение отсекает
+    # payment.reject_payment по флагу payment_pending, а не этот переход
+    (S.WAITING_PAYMENT, Event.PAYMENT_REJECTED): Transition(S.WAITING_PAYMENT, _close_payment_check),
+    (S.IN_WORK, Event.WORK_SUBMITTED): Transition(S.SUBMITTED),
+    (S.REVISION, Event.WORK_SUBMITTED): Transition(S.SUBMITTED),
+    (S.SUBMITTED, Event.WORK_APPROVED): Transition(S.APPROVED),
+    (S.APPROVED, Event.CLIENT_ACCEPT): Transition(S.DONE),
+    (S.APPROVED, Event.CLIENT_REVISION): Transition(S.REVISION),
+}
+for _status in (S.WAITING_CONFIRMATION, S.EXECUTOR_FOUND, S.WAITING_PAYMENT, S.IN_WORK, S.REVISION):
+    TRANSITIONS[(_status, Event.EXECUTOR_REFUSE)] = Transition(S.NEW, _refuse)
+for _status in _ACTIVE:
+    TRANSITIONS[(_status, Event.CLIENT_CANCEL)] = Transition(S.CANCEL_REQUESTED)
+# отмена во время раунда предложений закрывает и раунд
+TRANSITIONS[(S.WAITING_CONFIRMATION, Event.CLIENT_CANCEL)] = Transition(S.CANCEL_REQUESTED, _clear_round)
+
+
+_listeners = []
+
+
+def add_transition_listener(listener):
+    """Подписка на выполненные переходы: listener(event, old: Order, new: Order)."""
+    _listeners.append(listener)
+    return listener
+
+
+def can_fire(order_id, event: Event) -> bool:
+    order = storage.get_order(order_id)
+    return order is not None and (order.status, event) in TRANSITIONS
+
+
+def fire(order_id, event: Event, **updates) -> dict | None:
+    """Применяет событие к заявке.
+
+    updates — поля, которые меняются вместе со статусом. Возвращает обновлённую
+    заявку или None, если заявки нет либо переход из её статуса не разрешён.
+    """
+    bind(order_id=order_id)
+    order = storage.get_order(order_id)
+    if order is None:
+        return None
+    transition = TRANSITIONS.get((order.status, event))
+    if transition is None:
+        logging.info("Переход %s из статуса «%s» для заявки %s отклонён", event, order.status, order_id)
+        return None
+
+    def apply(target: dict):
+        target.update(updates)
+        if transition.effect:
+            transition.effect(target)
+        target['status'] = transition.to.value
+
+    updated = storage.compare_and_set(order_id, order.status, apply)
+    if updated is not None:
+        new = storage.get_order(order_id)
+        for listener in _listeners:
+            try:
+                listener(event, order, new)
+            except Exception:
+                logging.exception("Ошибка в подписчике на переходы заявок")
+    return updated